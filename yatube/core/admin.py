@@ -0,0 +1,22 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'status', 'progress', 'created', 'finished')
+    list_filter = ('status', 'name')
+    readonly_fields = (
+        'name', 'params', 'status', 'total', 'done', 'checkpoint', 'error',
+        'finished', 'heartbeat',
+    )
+
+    def progress(self, job):
+        return f'{job.done}/{job.total}'
+    progress.short_description = 'Прогресс'
+
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(Job, JobAdmin)
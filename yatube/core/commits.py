@@ -0,0 +1,37 @@
+"""Отметки, которые сохраняются пачкой после коммита.
+
+transaction.on_commit вызывает колбэк на каждую регистрацию. collect()
+копит элементы одной пачкой на транзакцию и после коммита передаёт их
+flush одним вызовом. Пачка хранится в списке колбэков соединения
+(connection.run_on_commit) с точками сохранения, в которых её начали:
+при откате транзакции или точки сохранения Django выбрасывает её вместе
+со всем накопленным, так что в следующую транзакцию ничего не попадёт.
+Вне транзакции flush вызывается сразу.
+"""
+from django.db import transaction
+
+
+class _Batch:
+    def __init__(self, flush):
+        self.flush = flush
+        self.items = set()
+
+    def __call__(self):
+        self.flush(self.items)
+
+
+def collect(flush, items, using=None):
+    """Передаёт items в flush(set) после коммита, вместе с соседями."""
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        flush(set(items))
+        return
+    savepoints = set(connection.savepoint_ids)
+    for started, func in connection.run_on_commit:
+        if (isinstance(func, _Batch) and func.flush is flush
+                and started == savepoints):
+            func.items.update(items)
+            return
+    batch = _Batch(flush)
+    batch.items.update(items)
+    transaction.on_commit(batch, using)
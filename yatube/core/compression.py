@@ -0,0 +1,232 @@
+"""Сжатие ответов: минификация HTML и gzip/deflate.
+
+Минификатор схлопывает пробельные последовательности в HTML в один
+пробел или перевод строки и не трогает содержимое pre, textarea, script
+и style. Он работает по кускам, поэтому годится и для потоковых ответов:
+тег, разрезанный между кусками, ждёт своего конца в следующем.
+
+CompressionMiddleware минифицирует HTML и сжимает ответ gzip или deflate
+с уровнем COMPRESSION_LEVEL, если клиент принимает их в Accept-Encoding
+с ненулевым q. Итоговые байты ответов, которые можно
+кешировать (с max-age в Cache-Control, например из cache_page), хранятся
+в памяти процесса по хешу содержимого, и повторное попадание в кеш не
+минифицируется и не сжимается заново. Готовые страницы core.prerender
+уже лежат на диске минифицированными и сжатыми и проходят как есть.
+"""
+import codecs
+import gzip
+import hashlib
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+WHITESPACE_RE = re.compile(r'\s+')
+PROTECTED_OPEN_RE = re.compile(
+    r'<(pre|textarea|script|style)\b', re.IGNORECASE)
+ENCODINGS = ('gzip', 'deflate')
+# Сколько символов от последнего «<» куска ждать продолжения тега
+TAG_LOOKAHEAD = 32
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript',
+    'application/xml', 'application/atom+xml', 'application/rss+xml',
+)
+
+_lock = threading.Lock()
+_compressed = OrderedDict()
+
+
+def _collapse(match):
+    return '\n' if '\n' in match.group() else ' '
+
+
+class Minifier:
+    """Минифицирует HTML по кускам, помня незакрытый pre или script."""
+
+    def __init__(self):
+        self.protected = None
+        # Пробелы в конце куска схлопываются вместе с началом следующего
+        self.tail = ''
+
+    def feed(self, chunk):
+        chunk, held = self.tail + chunk, ''
+        # Начало тега в конце куска дописывается следующим куском
+        cut = chunk.rfind('<')
+        if (cut != -1 and '>' not in chunk[cut:]
+                and len(chunk) - cut <= TAG_LOOKAHEAD):
+            chunk, held = chunk[:cut], chunk[cut:]
+        stripped = chunk.rstrip()
+        chunk, spaces = stripped, chunk[len(stripped):]
+        output = []
+        position = 0
+        while position < len(chunk):
+            if self.protected:
+                closing = re.compile(
+                    rf'</{self.protected}\s*>', re.IGNORECASE).search(
+                    chunk, position)
+                if closing is None:
+                    output.append(chunk[position:])
+                    break
+                output.append(chunk[position:closing.end()])
+                position = closing.end()
+                self.protected = None
+                continue
+            opening = PROTECTED_OPEN_RE.search(chunk, position)
+            end = opening.start() if opening else len(chunk)
+            output.append(WHITESPACE_RE.sub(_collapse, chunk[position:end]))
+            if opening is None:
+                break
+            self.protected = opening.group(1)
+            position = end
+        if self.protected:
+            output.append(spaces)
+            self.tail = held
+        else:
+            self.tail = spaces + held
+        return ''.join(output)
+
+    def close(self):
+        tail, self.tail = self.tail, ''
+        if self.protected:
+            return tail
+        return WHITESPACE_RE.sub(_collapse, tail)
+
+
+def minify(html):
+    minifier = Minifier()
+    return minifier.feed(html) + minifier.close()
+
+
+def accepted_encoding(header, encodings=ENCODINGS):
+    """Кодировка из encodings с наибольшим q в Accept-Encoding или None.
+
+    Кодировка с q=0 запрещена, «*» задаёт q неназванных кодировок; при
+    равных q берётся первая из encodings.
+    """
+    weights = {}
+    for item in header.split(','):
+        name, *params = item.split(';')
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+    default = weights.get('*', 0.0)
+    best = max(encodings, key=lambda name: weights.get(name, default))
+    return best if weights.get(best, default) > 0 else None
+
+
+def _compressor(encoding, level):
+    if encoding == 'gzip':
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS)
+
+
+def compress(data, encoding, level=None):
+    level = settings.COMPRESSION_LEVEL if level is None else level
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return zlib.compress(data, level)
+
+
+def compress_stream(chunks, encoding, level=None):
+    level = settings.COMPRESSION_LEVEL if level is None else level
+    compressor = _compressor(encoding, level)
+    for chunk in chunks:
+        # Отдаём каждую пачку клиенту, а не ждём заполнения окна
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def _encode(content, encoding, charset, is_html):
+    if is_html:
+        content = minify(content.decode(charset)).encode(charset)
+    if encoding is None:
+        return content
+    return compress(content, encoding)
+
+
+def encode_cached(content, encoding, charset, is_html):
+    """Минифицированные и сжатые байты, один раз на содержимое."""
+    key = (hashlib.blake2b(content, digest_size=16).digest(), encoding)
+    with _lock:
+        encoded = _compressed.get(key)
+        if encoded is not None:
+            _compressed.move_to_end(key)
+            return encoded
+    encoded = _encode(content, encoding, charset, is_html)
+    with _lock:
+        _compressed[key] = encoded
+        while len(_compressed) > settings.COMPRESSION_CACHE_SIZE:
+            _compressed.popitem(last=False)
+    return encoded
+
+
+def _minify_stream(chunks, charset):
+    decoder = codecs.getincrementaldecoder(charset)()
+    minifier = Minifier()
+    for chunk in chunks:
+        yield minifier.feed(decoder.decode(chunk)).encode(charset)
+    tail = minifier.feed(decoder.decode(b'', final=True)) + minifier.close()
+    yield tail.encode(charset)
+
+
+class CompressionMiddleware:
+    """Минифицирует HTML и сжимает ответы gzip или deflate."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        content_type = response.get('Content-Type', '')
+        if response.has_header('Content-Encoding'):
+            return response
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        is_html = (
+            content_type.startswith('text/html')
+            and settings.MINIFY_HTML
+            and not getattr(response, 'minified', False)
+        )
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = accepted_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if response.streaming:
+            self.encode_stream(response, encoding, is_html)
+        elif len(response.content) < settings.COMPRESSION_MIN_LENGTH:
+            encoding = None
+            if is_html:
+                self.encode(response, encoding, is_html)
+        else:
+            self.encode(response, encoding, is_html)
+        if encoding:
+            etag = response.get('ETag')
+            if etag and etag.startswith('"'):
+                response['ETag'] = 'W/' + etag
+            response['Content-Encoding'] = encoding
+        return response
+
+    def encode(self, response, encoding, is_html):
+        encode = _encode
+        if 'max-age' in response.get('Cache-Control', ''):
+            encode = encode_cached
+        response.content = encode(
+            response.content, encoding, response.charset, is_html)
+        response['Content-Length'] = str(len(response.content))
+
+    def encode_stream(self, response, encoding, is_html):
+        content = response.streaming_content
+        if is_html:
+            content = _minify_stream(content, response.charset)
+        if encoding:
+            content = compress_stream(content, encoding)
+        response.streaming_content = content
+        del response['Content-Length']
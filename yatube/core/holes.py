@@ -0,0 +1,70 @@
+"""Кеширование страниц с «дырками» под персональные фрагменты.
+
+Общая часть страницы рендерится один раз для анонимного зрителя и
+кешируется, а вместо фрагментов, зависящих от зрителя, в неё попадают
+метки тега {% hole %}. На каждый запрос рендерятся только эти фрагменты
+и подставляются на место меток.
+"""
+import re
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+HOLE_RE = re.compile(r'<!--hole:([\w/.-]+)-->')
+
+
+def placeholder(template_name):
+    return f'<!--hole:{template_name}-->'
+
+
+def _version_key(name):
+    return f'holes:version:{name}'
+
+
+def versions(*names):
+    """Текущие версии именованных объектов для ключа кеша."""
+    keys = [_version_key(name) for name in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, uuid.uuid4().hex, None)
+            found[key] = cache.get(key)
+    return ':'.join(str(found[key]) for key in keys)
+
+
+def bump(*names):
+    """Сбрасывает кешированные страницы, зависящие от объектов."""
+    cache.delete_many([_version_key(name) for name in names])
+
+
+def render_cached(request, template_name, key, get_context, viewer_context,
+                  using=None):
+    """Отдаёт страницу из кеша, дорисовав фрагменты для зрителя.
+
+    get_context вызывается только при промахе и возвращает контекст
+    общей части; viewer_context нужен фрагментам и доступен обеим.
+    """
+    body = cache.get(key)
+    if body is None:
+        context = {
+            **get_context(),
+            **viewer_context,
+            'user': AnonymousUser(),
+            'punch_holes': True,
+        }
+        body = render_to_string(
+            template_name, context, request, using=using)
+        cache.set(key, body, settings.HOLE_CACHE_TIMEOUT)
+    fragments = {}
+
+    def fill(match):
+        name = match.group(1)
+        if name not in fragments:
+            fragments[name] = render_to_string(name, viewer_context, request)
+        return fragments[name]
+
+    return HttpResponse(HOLE_RE.sub(fill, body))
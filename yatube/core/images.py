@@ -0,0 +1,105 @@
+"""Адаптивные картинки и их заглушки.
+
+Картинка отдаётся миниатюрами sorl шириной IMAGE_WIDTHS с пропорциями
+IMAGE_GEOMETRY в srcset/sizes: телефон скачивает узкий вариант, а
+заданные width/height резервируют место, и разметка не прыгает, пока
+картинка грузится. До загрузки место закрашено заглушкой —
+преобладающим цветом картинки, который считается один раз при
+сохранении и хранится рядом с ней (#rrggbb, 7 байт).
+
+Преобладающий цвет ищется по уменьшенной до PLACEHOLDER_SIZE копии:
+пиксели раскладываются по корзинам из 16 уровней на канал, и берётся
+средний цвет самой полной корзины. Если установлен numpy, корзины
+считаются векторно, иначе — перебором пикселей уменьшенной копии.
+"""
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils.html import format_html
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_SIZE = (16, 16)
+
+
+def _geometry(width):
+    base_width, base_height = map(int, settings.IMAGE_GEOMETRY.split('x'))
+    return f'{width}x{round(width * base_height / base_width)}'
+
+
+def variants(file_):
+    """Миниатюры file_ всех ширин IMAGE_WIDTHS, от узкой к широкой."""
+    if not file_:
+        return []
+    try:
+        return [
+            get_thumbnail(
+                file_, _geometry(width), crop='center', upscale=True)
+            for width in settings.IMAGE_WIDTHS
+        ]
+    except Exception:
+        logger.exception('Не удалось построить миниатюры %s', file_)
+        return []
+
+
+def responsive_image(file_, placeholder='', css_class='card-img my-2'):
+    """Тег <img> с srcset по вариантам file_ или пустая строка."""
+    # У миниатюры недоступного файла sorl не знает размеров
+    images = [image for image in variants(file_) if image.size]
+    if not images:
+        return ''
+    largest = images[-1]
+    srcset = ', '.join(f'{image.url} {image.width}w' for image in images)
+    style = f'background-color: {placeholder}' if placeholder else ''
+    return format_html(
+        '<img class="{}" src="{}" srcset="{}" sizes="{}" width="{}" '
+        'height="{}" style="{}" loading="lazy" alt="">',
+        css_class, largest.url, srcset, settings.IMAGE_SIZES,
+        largest.width, largest.height, style)
+
+
+def _dominant(pixels):
+    if numpy is not None:
+        pixels = numpy.asarray(pixels, dtype=numpy.int32).reshape(-1, 3)
+        bins = pixels >> 4
+        keys = (bins[:, 0] << 8) | (bins[:, 1] << 4) | bins[:, 2]
+        top = numpy.bincount(keys, minlength=4096).argmax()
+        return tuple(pixels[keys == top].mean(axis=0).round().astype(int))
+    keys = [(r >> 4, g >> 4, b >> 4) for r, g, b in pixels]
+    top = Counter(keys).most_common(1)[0][0]
+    chosen = [pixel for pixel, key in zip(pixels, keys) if key == top]
+    return tuple(
+        round(sum(channel) / len(chosen)) for channel in zip(*chosen))
+
+
+def dominant_colour(file_):
+    """Преобладающий цвет картинки в виде #rrggbb или ''.
+
+    Файл может быть ещё не сохранён (загрузка из формы): после чтения он
+    перематывается в начало, а открытый здесь файл хранилища закрывается.
+    """
+    was_closed = file_.closed
+    try:
+        file_.open('rb')
+        with Image.open(file_) as image:
+            image = image.convert('RGB')
+            image.thumbnail(PLACEHOLDER_SIZE)
+            pixels = list(image.getdata())
+    except (OSError, ValueError, SuspiciousFileOperation):
+        logger.warning('Не удалось прочитать картинку %s', file_)
+        return ''
+    finally:
+        if was_closed and file_._committed:
+            file_.close()
+        elif not file_.closed:
+            file_.seek(0)
+    return '#{:02x}{:02x}{:02x}'.format(*_dominant(pixels))
@@ -0,0 +1,63 @@
+"""Окружение Jinja2 для горячих шаблонов (см. JINJA2_TEMPLATES).
+
+Повторяет то, что шаблоны на DTL берут из тегов и фильтров: url, static,
+thumbnail, responsive_image, date, linebreaksbr, addclass и hole.
+"""
+import logging
+
+from django.template import defaultfilters
+from django.template.loader import render_to_string
+from django.templatetags.static import static
+from django.urls import reverse
+from jinja2 import Environment, Undefined, pass_context
+from markupsafe import Markup
+from sorl.thumbnail import get_thumbnail
+
+from .holes import placeholder
+from .images import responsive_image
+from .templatetags.user_filters import addclass
+
+logger = logging.getLogger(__name__)
+
+
+def url(name, *args):
+    return reverse(name, args=args)
+
+
+def thumbnail(file_, geometry, **options):
+    """Миниатюра как у {% thumbnail %}: None, если файла нет."""
+    if not file_:
+        return None
+    try:
+        return get_thumbnail(file_, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось построить миниатюру %s', file_)
+        return None
+
+
+@pass_context
+def hole(context, template_name):
+    """Аналог тега {% hole %}: фрагмент рендерится движком Django."""
+    if context.get('punch_holes'):
+        return Markup(placeholder(template_name))
+    return Markup(render_to_string(
+        template_name, context.get_all(), context.get('request')))
+
+
+def environment(**options):
+    # Как в DTL: неизвестная переменная выводится пустой строкой.
+    options['undefined'] = Undefined
+    env = Environment(**options)
+    env.globals.update({
+        'url': url,
+        'static': static,
+        'thumbnail': thumbnail,
+        'responsive_image': responsive_image,
+        'hole': hole,
+    })
+    env.filters.update({
+        'date': defaultfilters.date,
+        'linebreaksbr': defaultfilters.linebreaksbr,
+        'addclass': addclass,
+    })
+    return env
@@ -0,0 +1,110 @@
+"""Фоновые задачи без внешнего брокера.
+
+Задача — функция, зарегистрированная через @register и принимающая
+объект Job и параметры. enqueue() сохраняет задачу в базу и запускает
+её в отдельном потоке после коммита транзакции (JOBS_ASYNC = True) или
+сразу. Задачи, оставшиеся в очереди, выполняет команда run_jobs.
+Прерванную задачу можно продолжить через resume(): задача сама читает
+job.checkpoint, сохранённый через Job.save_checkpoint().
+
+Выполняемая задача держит аренду: каждый шаг (start, advance,
+save_checkpoint) обновляет Job.heartbeat. Если обработчик умер вместе с
+процессом, задача остаётся в статусе «выполняется», но её отклик
+старше JOBS_LEASE секунд — такие задачи run_jobs подбирает заново.
+"""
+import json
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def register(name):
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def create(name, **params):
+    """Сохраняет задачу, не запуская её."""
+    return Job.objects.create(
+        name=name, params=json.dumps(params, cls=DjangoJSONEncoder))
+
+
+def enqueue(name, **params):
+    job = create(name, **params)
+    if settings.JOBS_ASYNC:
+        transaction.on_commit(lambda: threading.Thread(
+            target=_run_in_thread, args=(job.pk,), daemon=True).start())
+    else:
+        run(job)
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run(Job.objects.get(pk=job_id))
+    finally:
+        connections.close_all()
+
+
+def stalled():
+    """Задачи, обработчик которых перестал продлевать аренду."""
+    expired = timezone.now() - timedelta(seconds=settings.JOBS_LEASE)
+    return Job.objects.filter(
+        Q(heartbeat__lt=expired) | Q(heartbeat__isnull=True),
+        status=Job.RUNNING,
+    )
+
+
+def resumable():
+    """Упавшие задачи и задачи с истёкшей арендой."""
+    return Job.objects.filter(
+        Q(status=Job.FAILED) | Q(pk__in=stalled().values('pk')))
+
+
+def resume(job, report=None):
+    """Перезапускает упавшую или брошенную задачу с контрольной точки.
+
+    Задачу, которую ещё выполняет живой обработчик, не трогает.
+    """
+    resumable().filter(pk=job.pk).update(
+        status=Job.PENDING, error='', finished=None)
+    job.error = ''
+    return run(job, report=report)
+
+
+def run(job, report=None):
+    """Выполняет задачу, если её ещё не забрал другой обработчик."""
+    heartbeat = timezone.now()
+    claimed = Job.objects.filter(pk=job.pk, status=Job.PENDING).update(
+        status=Job.RUNNING, heartbeat=heartbeat)
+    if not claimed:
+        job.refresh_from_db()
+        return job
+    job.status, job.heartbeat = Job.RUNNING, heartbeat
+    job.report = report
+    try:
+        _registry[job.name](job, **json.loads(job.params))
+    except Exception:
+        logger.exception('Задача %s завершилась с ошибкой', job)
+        job.status, job.error = Job.FAILED, traceback.format_exc()
+    else:
+        job.status = Job.DONE
+    job.finished = timezone.now()
+    Job.objects.filter(pk=job.pk).update(
+        status=job.status, error=job.error, finished=job.finished)
+    return job
@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.compression import compress, minify
+from core.prerender import render_page
+from core.warmup import hot_urls
+
+LEVELS = (1, 5, 6, 9)
+
+
+def _timed(func, iterations):
+    func()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = func()
+    return result, (time.perf_counter() - started) / iterations * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает размер горячих страниц и время их минификации и '
+        'сжатия gzip и deflate на разных уровнях.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, iterations, **options):
+        for url in hot_urls():
+            response = render_page(url)
+            if response is None:
+                continue
+            html = response.getvalue().decode(response.charset)
+            minified, minify_ms = _timed(lambda: minify(html), iterations)
+            raw = html.encode(response.charset)
+            data = minified.encode(response.charset)
+            self.stdout.write(
+                f'{url}: {len(raw)} Б, после минификации {len(data)} Б '
+                f'({minify_ms:.2f} мс)')
+            for encoding in ('gzip', 'deflate'):
+                for level in LEVELS:
+                    compressed, ms = _timed(
+                        lambda: compress(data, encoding, level), iterations)
+                    plain, _ = _timed(
+                        lambda: compress(raw, encoding, level), 1)
+                    current = level == settings.COMPRESSION_LEVEL
+                    marker = ' *' if current else ''
+                    self.stdout.write(
+                        f'  {encoding} {level}{marker}: {len(compressed)} Б '
+                        f'({ms:.2f} мс), без минификации {len(plain)} Б')
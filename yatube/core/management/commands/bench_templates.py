@@ -0,0 +1,68 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template import engines
+from django.template.loader import render_to_string
+from django.template.utils import InvalidTemplateEngineError
+from django.test import RequestFactory
+
+from posts import sharding
+from posts.models import Post
+
+
+def sample_context():
+    """Контекст горячих шаблонов из последних постов в базе."""
+    posts = list(sharding.scatter(
+        Post.objects.select_related('author', 'group'))[:10])
+    if not posts:
+        return {}
+    author = posts[0].author
+    group = next((post.group for post in posts if post.group), None)
+    page_obj = Paginator(posts, 10).page(1)
+    return {
+        'posts/index.html': {'page_obj': page_obj},
+        'posts/profile.html': {
+            'page_obj': page_obj,
+            'author': author,
+            'following': False,
+            'followers_count': 0,
+        },
+        'includes/post_card.html': {'group': group, 'posts': posts},
+    }
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость рендеринга горячих шаблонов в DTL и Jinja2.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, iterations, **options):
+        try:
+            engines['jinja2']
+        except InvalidTemplateEngineError:
+            self.stderr.write('Jinja2 не установлен, сравнивать не с чем.')
+            return
+        contexts = sample_context()
+        if not contexts:
+            self.stderr.write('В базе нет постов для рендеринга.')
+            return
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        for template_name, context in contexts.items():
+            timings = {}
+            for using in ('django', 'jinja2'):
+                render_to_string(template_name, context, request, using=using)
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    render_to_string(
+                        template_name, context, request, using=using)
+                timings[using] = (
+                    time.perf_counter() - started) / iterations * 1000
+            self.stdout.write(
+                f'{template_name}: DTL {timings["django"]:.3f} мс, '
+                f'Jinja2 {timings["jinja2"]:.3f} мс, '
+                f'x{timings["django"] / timings["jinja2"]:.1f}'
+            )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core import jobs
+from core.models import Job
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи, ожидающие в очереди, и продолжает '
+        'задачи, обработчик которых перестал отзываться.'
+    )
+
+    def handle(self, *args, **options):
+        for job in jobs.stalled().order_by('pk'):
+            self.stdout.write(
+                f'{job}: продолжение после {job.heartbeat or job.created}')
+            self.show(jobs.resume(job, report=self.report))
+        for job in Job.objects.filter(status=Job.PENDING).order_by('pk'):
+            self.show(jobs.run(job, report=self.report))
+
+    def show(self, job):
+        self.stdout.write(f'{job}: {job.get_status_display()}')
+
+    def report(self, job):
+        self.stdout.write(f'{job}: {job.done}/{job.total}')
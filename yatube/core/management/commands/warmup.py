@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+from core.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает процесс как при старте воркера и выводит время '
+        'холодных и тёплых запросов к горячим страницам.'
+    )
+
+    def handle(self, *args, **options):
+        for name, seconds in warm_up(get_wsgi_application()).items():
+            if isinstance(seconds, tuple):
+                cold, warm = seconds
+                self.stdout.write(
+                    f'{name}: холодный {cold * 1000:.1f} мс, '
+                    f'тёплый {warm * 1000:.1f} мс')
+            else:
+                self.stdout.write(f'{name}: {seconds * 1000:.1f} мс')
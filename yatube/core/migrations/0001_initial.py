@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('name', models.CharField(max_length=100, verbose_name='Задача')),
+                ('params', models.TextField(default='{}', verbose_name='Параметры')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=10, verbose_name='Статус')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Всего')),
+                ('done', models.PositiveIntegerField(default=0, verbose_name='Обработано')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+            ],
+            options={
+                'verbose_name': 'Задача',
+                'verbose_name_plural': 'Задачи',
+                'ordering': ('-created',),
+            },
+        ),
+    ]
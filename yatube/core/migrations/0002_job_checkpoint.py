@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='checkpoint',
+            field=models.TextField(blank=True, verbose_name='Контрольная точка'),
+        ),
+    ]
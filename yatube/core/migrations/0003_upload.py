@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0002_job_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Upload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Токен')),
+                ('filename', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('size', models.PositiveIntegerField(verbose_name='Размер')),
+                ('received', models.PositiveIntegerField(default=0, verbose_name='Получено байт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Загрузка',
+                'verbose_name_plural': 'Загрузки',
+            },
+        ),
+    ]
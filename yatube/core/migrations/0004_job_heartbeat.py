@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последний отклик'),
+        ),
+    ]
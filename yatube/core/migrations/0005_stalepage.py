@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StalePage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=200, unique=True, verbose_name='Адрес')),
+            ],
+            options={
+                'verbose_name': 'Страница на перерисовку',
+                'verbose_name_plural': 'Страницы на перерисовку',
+            },
+        ),
+    ]
@@ -1,4 +1,9 @@
+import os
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 
 class CreatedModel(models.Model):
@@ -7,3 +12,156 @@ class CreatedModel(models.Model):
         'Дата создания',
         auto_now_add=True
     )
+
+    class Meta:
+        abstract = True
+
+
+class Job(CreatedModel):
+    """Фоновая задача, выполняемая через core.jobs."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+    # Колбэк отчёта о прогрессе, задаётся в core.jobs.run
+    report = None
+    name = models.CharField(
+        'Задача',
+        max_length=100,
+    )
+    params = models.TextField(
+        'Параметры',
+        default='{}',
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        db_index=True,
+    )
+    total = models.PositiveIntegerField(
+        'Всего',
+        default=0,
+    )
+    done = models.PositiveIntegerField(
+        'Обработано',
+        default=0,
+    )
+    checkpoint = models.TextField(
+        'Контрольная точка',
+        blank=True,
+    )
+    error = models.TextField(
+        'Ошибка',
+        blank=True,
+    )
+    finished = models.DateTimeField(
+        'Завершена',
+        null=True,
+        blank=True,
+    )
+    heartbeat = models.DateTimeField(
+        'Последний отклик',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        ordering = ('-created',)
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+    def _touch(self, **fields):
+        """Сохраняет fields и продлевает аренду задачи (см. core.jobs)."""
+        self.heartbeat = timezone.now()
+        Job.objects.filter(pk=self.pk).update(
+            heartbeat=self.heartbeat, **fields)
+
+    def start(self, total):
+        self.total = total
+        self._touch(total=total)
+
+    def advance(self, count):
+        """Отмечает обработку ещё count элементов."""
+        self.done += count
+        self._touch(done=self.done)
+        if self.report is not None:
+            self.report(self)
+
+    def save_checkpoint(self, value):
+        """Запоминает, с какого места продолжить прерванную задачу."""
+        self.checkpoint = str(value)
+        self._touch(checkpoint=self.checkpoint)
+
+
+class Upload(CreatedModel):
+    """Файл, загружаемый частями через core.uploads.
+
+    Части дописываются во временный файл token.part; когда получено
+    size байт, он переименовывается в token и готов к использованию.
+    """
+    token = models.UUIDField(
+        'Токен',
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='uploads',
+        verbose_name='Пользователь',
+    )
+    filename = models.CharField(
+        'Имя файла',
+        max_length=255,
+    )
+    size = models.PositiveIntegerField('Размер')
+    received = models.PositiveIntegerField(
+        'Получено байт',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Загрузка'
+        verbose_name_plural = 'Загрузки'
+
+    def __str__(self):
+        return f'{self.filename} ({self.received}/{self.size})'
+
+    @property
+    def complete(self):
+        return self.received == self.size
+
+    @property
+    def path(self):
+        name = self.token.hex if self.complete else f'{self.token.hex}.part'
+        return os.path.join(settings.UPLOAD_TEMP_DIR, name)
+
+
+class StalePage(models.Model):
+    """Готовая страница core.prerender, ждущая перерисовки.
+
+    Сигналы только отмечают страницы, а перерисовывает их команда
+    prerender_pages --pending, поэтому частые правки перерисовывают
+    страницу один раз за запуск и не задерживают запрос, который пишет.
+    """
+    url = models.CharField(
+        'Адрес',
+        max_length=200,
+        unique=True,
+    )
+
+    class Meta:
+        verbose_name = 'Страница на перерисовку'
+        verbose_name_plural = 'Страницы на перерисовку'
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimate_count(model, using='default'):
+    """Оценка числа строк таблицы по статистике СУБД или None."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] > 0 else None
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                [table])
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор для больших таблиц.
+
+    Для нефильтрованного queryset число строк берётся из статистики СУБД,
+    если оно больше ESTIMATED_COUNT_THRESHOLD, вместо COUNT(*) по всей
+    таблице.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate and estimate > settings.ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
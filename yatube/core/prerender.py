@@ -0,0 +1,242 @@
+"""Заранее отрендеренные страницы для анонимных посетителей.
+
+Страница рендерится тем же представлением, что и обычно, но от имени
+анонимного пользователя и в обход cache_page, и записывается в
+PRERENDER_ROOT вместе со сжатой gzip копией. PrerenderMiddleware отдаёт
+такие файлы запросам без сессии раньше, чем дело дойдёт до
+представлений; остальные запросы идут как обычно.
+
+Какие страницы держать готовыми, решает вызывающий код (publish_all).
+При изменении данных refresh() только отмечает страницы после коммита
+(StalePage), а команда prerender_pages --pending (cron, раз в минуту)
+перерисовывает из отмеченных уже опубликованные.
+"""
+import gzip
+import inspect
+import io
+import logging
+import os
+import shutil
+from urllib.parse import parse_qsl, urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.urls import Resolver404, resolve
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from . import commits
+from .compression import accepted_encoding, minify
+from .models import StalePage
+
+logger = logging.getLogger(__name__)
+
+_on_serve = {}
+
+
+def on_serve(view_name):
+    """Регистрирует колбэк, вызываемый при отдаче готовой страницы.
+
+    Колбэк получает именованные аргументы URL, например, чтобы учесть
+    просмотр, который иначе посчитало бы представление.
+    """
+    def decorator(func):
+        _on_serve[view_name] = func
+        return func
+    return decorator
+
+
+def file_name(path, query=''):
+    """Имя файла страницы или None, если такую страницу не готовят."""
+    params = dict(parse_qsl(query))
+    page = params.pop('page', '1')
+    if params or not page.isdigit() or '..' in path:
+        return None
+    directory = path.strip('/')
+    name = 'index.html' if page == '1' else f'index-{page}.html'
+    return f'{directory}/{name}' if directory else name
+
+
+def _full_path(name):
+    return os.path.join(settings.PRERENDER_ROOT, name)
+
+
+def _write(name, content):
+    path = _full_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    compressed = gzip.compress(
+        content, compresslevel=settings.PRERENDER_COMPRESSION_LEVEL, mtime=0)
+    for target, data in ((path, content), (f'{path}.gz', compressed)):
+        temporary = f'{target}.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, target)
+
+
+def _remove(name):
+    for path in (_full_path(name), f'{_full_path(name)}.gz'):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def render_page(url):
+    """Ответ представления на анонимный запрос url или None."""
+    parts = urlsplit(url)
+    environ = {
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'HTTP_HOST': 'localhost',
+        'wsgi.input': io.BytesIO(),
+    }
+    setup_testing_defaults(environ)
+    request = WSGIRequest(environ)
+    request.user = AnonymousUser()
+    request.prerendering = True
+    try:
+        request.resolver_match = match = resolve(parts.path)
+        view = inspect.unwrap(match.func)
+        response = view(request, *match.args, **match.kwargs)
+    except (Http404, Resolver404):
+        return None
+    except Exception:
+        logger.exception('Не удалось отрендерить страницу %s', url)
+        return None
+    return response if response.status_code == 200 else None
+
+
+def render(url):
+    """Рендерит страницу и сохраняет её; возвращает имя файла или None."""
+    parts = urlsplit(url)
+    name = file_name(parts.path, parts.query)
+    if name is None:
+        return None
+    response = render_page(url)
+    if response is None:
+        _remove(name)
+        return None
+    content = response.getvalue()
+    if settings.MINIFY_HTML:
+        content = minify(content.decode(response.charset)).encode(
+            response.charset)
+    _write(name, content)
+    return name
+
+
+def published():
+    """Есть ли сейчас готовые страницы."""
+    return os.path.isdir(settings.PRERENDER_ROOT)
+
+
+def refresh(urls):
+    """Отмечает после коммита страницы urls как устаревшие.
+
+    Перерисовывает их publish_pending (команда prerender_pages
+    --pending), а не записывающий запрос.
+    """
+    commits.collect(mark_stale, urls)
+
+
+def mark_stale(urls):
+    StalePage.objects.bulk_create(
+        [StalePage(url=url) for url in urls], ignore_conflicts=True)
+
+
+def publish_pending():
+    """Перерисовывает отмеченные и уже опубликованные страницы.
+
+    Отметка удаляется до перерисовки: если страницу снова отметят во
+    время неё, её перерисует следующий запуск. Возвращает число
+    перерисованных страниц.
+    """
+    stale = list(StalePage.objects.order_by('pk'))
+    StalePage.objects.filter(pk__in=[page.pk for page in stale]).delete()
+    written = 0
+    for page in stale:
+        parts = urlsplit(page.url)
+        name = file_name(parts.path, parts.query)
+        if name is None or not os.path.exists(_full_path(name)):
+            continue
+        try:
+            written += render(page.url) is not None
+        except Exception:
+            logger.exception('Не удалось перерисовать страницу %s', page.url)
+    return written
+
+
+def publish_all(urls):
+    """Рендерит страницы urls и удаляет все остальные готовые страницы."""
+    written = {name for name in map(render, urls) if name}
+    kept = written | {f'{name}.gz' for name in written}
+    for root, _, files in os.walk(settings.PRERENDER_ROOT):
+        for filename in files:
+            relative = os.path.relpath(
+                os.path.join(root, filename), settings.PRERENDER_ROOT)
+            if relative.replace(os.sep, '/') not in kept:
+                os.remove(os.path.join(root, filename))
+    return len(written)
+
+
+def clear():
+    """Удаляет все готовые страницы, пока их снова не опубликуют."""
+    shutil.rmtree(settings.PRERENDER_ROOT, ignore_errors=True)
+
+
+class PrerenderMiddleware:
+    """Отдаёт готовые страницы анонимным GET-запросам."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.serve(request) or self.get_response(request)
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return None
+        if 'messages' in request.COOKIES:
+            return None
+        name = file_name(request.path_info, request.META.get(
+            'QUERY_STRING', ''))
+        if name is None:
+            return None
+        path = _full_path(name)
+        accepts_gzip = bool(accepted_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''), ('gzip',)))
+        if accepts_gzip:
+            path += '.gz'
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        self.notify(request.path_info)
+        if not was_modified_since(
+                request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                stat.st_mtime, stat.st_size):
+            return HttpResponseNotModified()
+        with open(path, 'rb') as file:
+            response = HttpResponse(
+                file.read(), content_type='text/html; charset=utf-8')
+        response.minified = True
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Vary'] = 'Accept-Encoding, Cookie'
+        if accepts_gzip:
+            response['Content-Encoding'] = 'gzip'
+        return response
+
+    def notify(self, path):
+        if not _on_serve:
+            return
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return
+        callback = _on_serve.get(match.view_name)
+        if callback is not None:
+            callback(**match.kwargs)
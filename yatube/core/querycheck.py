@@ -0,0 +1,178 @@
+"""Поиск N+1 и повторяющихся SQL-запросов.
+
+Во время запроса или теста все SQL-запросы сводятся к «форме» — тексту
+без литералов, — и считаются отдельно для каждой базы: один запрос ко
+всем шардам постов (posts.sharding) — не N+1. Форма, выполненная больше
+QUERYCHECK_THRESHOLD раз в одной базе, — признак N+1, а одинаковый
+запрос с теми же параметрами дважды — лишний. Для каждой такой формы
+запоминается место вызова: строка шаблона, если запрос сделан при
+рендеринге, и строка кода проекта.
+
+QUERYCHECK_MODE: 'off' — ничего не проверять; 'log' — проверять долю
+QUERYCHECK_SAMPLE_RATE запросов и писать найденное в лог; 'strict' —
+проверять всё и падать с RepeatedQueriesError (так работают тесты через
+QueryCheckRunner). Запросы, сделанные уже при отдаче потокового ответа,
+не проверяются, как и запросы к таблицам из QUERYCHECK_IGNORED_TABLES
+(например, хранилищу миниатюр sorl-thumbnail, которое само кеширует
+свои записи). Адреса из QUERYCHECK_IGNORED_PATHS middleware пропускает.
+"""
+import logging
+import os
+import random
+import re
+import sys
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from importlib import import_module
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+
+LIBRARY_DIRS = tuple(
+    path for path in sys.path if 'site-packages' in path
+)
+
+
+class RepeatedQueriesError(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """Форма запроса: литералы и списки IN заменены заглушками."""
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+@lru_cache(maxsize=None)
+def _skipped_files():
+    """Файлы, строки которых не считаются местом вызова."""
+    modules = {path.rsplit('.', 1)[0] for path in settings.MIDDLEWARE}
+    return frozenset(
+        import_module(module).__file__ for module in modules
+    ) | {__file__}
+
+
+def _origin():
+    """Строка шаблона и строка кода проекта, откуда пришёл запрос."""
+    template_line = code_line = None
+    frame = sys._getframe(2)
+    while frame is not None and not (template_line and code_line):
+        code = frame.f_code
+        if template_line is None and code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                template_line = f'{origin.template_name}:{token.lineno}'
+        filename = code.co_filename
+        if (
+            code_line is None
+            and filename.startswith(settings.BASE_DIR)
+            and not filename.startswith(LIBRARY_DIRS)
+            and filename not in _skipped_files()
+        ):
+            relative = os.path.relpath(filename, settings.BASE_DIR)
+            code_line = f'{relative}:{frame.f_lineno} in {code.co_name}'
+        frame = frame.f_back
+    return template_line, code_line
+
+
+class Tracker:
+    """Считает формы запросов; подключается как execute_wrapper."""
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or settings.QUERYCHECK_THRESHOLD
+        self.ignored = tuple(
+            f'"{table}"' for table in settings.QUERYCHECK_IGNORED_TABLES)
+        self.shapes = Counter()
+        self.exact = Counter()
+        self.origins = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        if any(table in sql for table in self.ignored):
+            return execute(sql, params, many, context)
+        alias = context['connection'].alias
+        shape = (alias, fingerprint(sql))
+        self.shapes[shape] += 1
+        exact = (alias, sql, repr(params))
+        self.exact[exact] += 1
+        if self.shapes[shape] > 1:
+            self.origins[shape][_origin()] += 1
+        return execute(sql, params, many, context)
+
+    def problems(self):
+        """Список (вид, форма, число, места вызова)."""
+        found = []
+        for shape, count in self.shapes.items():
+            if count > self.threshold:
+                found.append(('N+1', shape[1], count, self.origins[shape]))
+        for (alias, sql, params), count in self.exact.items():
+            shape = (alias, fingerprint(sql))
+            if count > 1 and self.shapes[shape] <= self.threshold:
+                found.append((
+                    'повтор', f'{sql} {params}', count, self.origins[shape]))
+        return found
+
+    def report(self, label):
+        lines = []
+        for kind, shape, count, origins in self.problems():
+            lines.append(f'{kind} x{count}: {shape}')
+            for (template_line, code_line), times in origins.most_common(3):
+                where = ', '.join(filter(None, (template_line, code_line)))
+                lines.append(f'    {where or "?"} ({times})')
+        if lines:
+            return f'Повторяющиеся запросы в {label}:\n' + '\n'.join(lines)
+        return ''
+
+
+@contextmanager
+def track(threshold=None):
+    """Отслеживает запросы ко всем базам внутри блока."""
+    tracker = Tracker(threshold)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(tracker))
+        yield tracker
+
+
+@contextmanager
+def strict(label='блоке', threshold=None):
+    """Падает с RepeatedQueriesError, если в блоке нашлись N+1 или повторы."""
+    with track(threshold) as tracker:
+        yield tracker
+    report = tracker.report(label)
+    if report:
+        raise RepeatedQueriesError(report)
+
+
+class QueryCheckMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = settings.QUERYCHECK_MODE
+        if request.path.startswith(settings.QUERYCHECK_IGNORED_PATHS):
+            mode = 'off'
+        if mode == 'off' or (
+            mode == 'log'
+            and random.random() >= settings.QUERYCHECK_SAMPLE_RATE
+        ):
+            return self.get_response(request)
+        with track() as tracker:
+            response = self.get_response(request)
+        report = tracker.report(f'{request.method} {request.path}')
+        if report and mode == 'strict':
+            raise RepeatedQueriesError(report)
+        if report:
+            logger.warning(report)
+        return response
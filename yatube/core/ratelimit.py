@@ -0,0 +1,125 @@
+"""Ограничение частоты запросов к изменяющим данные адресам.
+
+Лимиты задаются в RATELIMITS: для области (обычно имя URL) — сколько
+запросов допускается за период в секундах, отдельно для пользователя и
+для IP-адреса. Лимит считается скользящим окном по двум счётчикам в
+общем кеше: запросам текущего окна длиной в период и предыдущего,
+взятого с весом непрошедшей части периода. Запрос учитывается одной
+атомарной парой add/incr над счётчиком текущего окна, ничего не
+пересчитывая и не дописывая после, поэтому параллельные запросы не
+теряют и не задваивают друг друга; отклонённый запрос счётчик
+возвращает (decr).
+
+IP-адрес берётся из REMOTE_ADDR. За прокси из RATELIMIT_TRUSTED_PROXIES
+клиентом считается первый адрес X-Forwarded-For справа, который не
+принадлежит доверенным прокси.
+
+Для функций-представлений есть декоратор @rate_limit, остальные адреса
+из RATELIMITS (например, регистрацию) ограничивает RateLimitMiddleware.
+При превышении отдаётся RATELIMIT_VIEW со статусом 429 и Retry-After.
+"""
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+
+def _retry_after(capacity, period, previous, current, elapsed):
+    """Через сколько секунд окно примет ещё один запрос."""
+    # Ещё в этом окне, когда вес предыдущего окна достаточно упадёт
+    room = capacity - 1 - current
+    if room >= 0 and previous:
+        moment = period * (1 - room / previous)
+        if moment < period:
+            return moment - elapsed
+    # В следующем окне текущее станет предыдущим
+    moment = period * (1 - (capacity - 1) / current) if current else 0
+    return period - elapsed + max(moment, 0)
+
+
+def _consume(key, capacity, period, now):
+    window = int(now // period)
+    current_key = f'ratelimit:{key}:{window}'
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        cache.add(current_key, 0, period * 2)
+        current = cache.incr(current_key)
+    previous = cache.get(f'ratelimit:{key}:{window - 1}', 0)
+    elapsed = now - window * period
+    if previous * (1 - elapsed / period) + current <= capacity:
+        return 0
+    cache.decr(current_key)
+    return max(1, math.ceil(_retry_after(
+        capacity, period, previous, current - 1, elapsed)))
+
+
+def _client_ip(request):
+    address = request.META.get('REMOTE_ADDR', '')
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    hops = [hop.strip() for hop in forwarded.split(',') if hop.strip()]
+    while hops and address in settings.RATELIMIT_TRUSTED_PROXIES:
+        address = hops.pop()
+    return address
+
+
+def check(request, scope):
+    """Списывает токен; возвращает, через сколько секунд повторить, или 0."""
+    limits = settings.RATELIMITS.get(scope)
+    if not limits:
+        return 0
+    now = time.time()
+    buckets = []
+    if 'user' in limits and request.user.is_authenticated:
+        buckets.append((f'{scope}:user:{request.user.pk}', limits['user']))
+    if 'ip' in limits:
+        buckets.append((f'{scope}:ip:{_client_ip(request)}', limits['ip']))
+    retry_after = 0
+    for key, (capacity, period) in buckets:
+        retry_after = max(retry_after, _consume(key, capacity, period, now))
+    return retry_after
+
+
+def too_many_requests(request, retry_after):
+    response = import_string(settings.RATELIMIT_VIEW)(request)
+    response.status_code = 429
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(scope, methods=('POST',)):
+    """Ограничивает представление лимитами области scope из RATELIMITS."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                retry_after = check(request, scope)
+                if retry_after:
+                    return too_many_requests(request, retry_after)
+            return view(request, *args, **kwargs)
+        wrapper.rate_limit_scope = scope
+        return wrapper
+    return decorator
+
+
+class RateLimitMiddleware:
+    """Ограничивает POST к адресам из RATELIMITS без @rate_limit."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method != 'POST':
+            return None
+        if getattr(view_func, 'rate_limit_scope', None):
+            return None
+        retry_after = check(request, request.resolver_match.view_name)
+        if retry_after:
+            return too_many_requests(request, retry_after)
+        return None
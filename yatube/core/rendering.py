@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.template import engines
+from django.template.utils import InvalidTemplateEngineError
+
+
+def engine_for(template_name):
+    """Имя движка для шаблона: jinja2 для включённых в JINJA2_TEMPLATES.
+
+    Если Jinja2 не установлен или не настроен, шаблон рендерится DTL.
+    """
+    if template_name not in settings.JINJA2_TEMPLATES:
+        return None
+    try:
+        engines['jinja2']
+    except InvalidTemplateEngineError:
+        return None
+    return 'jinja2'
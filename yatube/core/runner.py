@@ -0,0 +1,23 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class QueryCheckRunner(DiscoverRunner):
+    """Запускает тесты с QUERYCHECK_MODE = 'strict' (см. core.querycheck).
+
+    Карты сайта и ленты (posts.syndication) тесты пишут во временный
+    каталог, а не в SYNDICATION_ROOT рабочего дерева.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERYCHECK_MODE = 'strict'
+        self.syndication_root = tempfile.mkdtemp()
+        settings.SYNDICATION_ROOT = self.syndication_root
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        shutil.rmtree(self.syndication_root, ignore_errors=True)
@@ -0,0 +1,72 @@
+"""Потоковый рендеринг длинных страниц.
+
+Шаблон из STREAMING_TEMPLATES рендерится без длинных списков: на месте
+тега {% stream %} остаётся метка. Всё до первой метки — head, шапка и
+начало страницы — уходит клиенту сразу, а элементы списка читаются из
+базы через iterator() и отправляются пачками по STREAM_CHUNK_SIZE,
+так что в памяти не держится ни вся страница, ни весь queryset.
+Потоково рендерится только DTL, JINJA2_TEMPLATES здесь не учитываются.
+"""
+import re
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from django.template import Context
+from django.template.loader import render_to_string
+
+MARKER_RE = re.compile(r'<!--stream:(\d+)-->')
+
+
+def marker(index):
+    return f'<!--stream:{index}-->'
+
+
+def items(iterable):
+    """Элементы списка вместе с forloop: counter, first и last."""
+    if isinstance(iterable, QuerySet):
+        iterable = iterable.iterator(chunk_size=settings.STREAM_CHUNK_SIZE)
+    iterator = iter(iterable)
+    try:
+        current = next(iterator)
+    except StopIteration:
+        return
+    counter = 1
+    for following in iterator:
+        yield current, {'counter': counter, 'first': counter == 1,
+                        'last': False}
+        current, counter = following, counter + 1
+    yield current, {'counter': counter, 'first': counter == 1, 'last': True}
+
+
+def render_items(template, context, iterable, name):
+    """Рендерит шаблон для каждого элемента, отдавая пачки строк."""
+    chunk = []
+    for item, forloop in items(iterable):
+        with context.push({name: item, 'forloop': forloop}):
+            chunk.append(template.render(context))
+        if len(chunk) >= settings.STREAM_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk)
+
+
+def _stream(body, parts):
+    position = 0
+    for match in MARKER_RE.finditer(body):
+        yield body[position:match.start()]
+        template, iterable, name, shared = parts[int(match.group(1))]
+        yield from render_items(template, Context(shared), iterable, name)
+        position = match.end()
+    yield body[position:]
+
+
+def render(request, template_name, context):
+    parts = []
+    body = render_to_string(
+        template_name, {**context, 'stream_parts': parts}, request)
+    return StreamingHttpResponse(_stream(body, parts))
+
+
+def is_streaming(template_name):
+    return template_name in settings.STREAMING_TEMPLATES
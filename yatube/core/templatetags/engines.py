@@ -0,0 +1,18 @@
+from django import template
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.rendering import engine_for
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def render_template(context, template_name):
+    """Как {% include %}, но движок выбирается по JINJA2_TEMPLATES."""
+    return mark_safe(render_to_string(
+        template_name,
+        context.flatten(),
+        context.get('request'),
+        using=engine_for(template_name),
+    ))
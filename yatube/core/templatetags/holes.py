@@ -0,0 +1,18 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.holes import placeholder
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name):
+    """Фрагмент, зависящий от зрителя.
+
+    При рендеринге общей части для кеша выводит метку, иначе — сам
+    фрагмент с текущим контекстом.
+    """
+    if context.get('punch_holes'):
+        return mark_safe(placeholder(template_name))
+    return context.template.engine.get_template(template_name).render(context)
@@ -0,0 +1,11 @@
+from django import template
+
+from core.images import responsive_image as render_image
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(file_, placeholder='', css_class='card-img my-2'):
+    """Картинка с вариантами ширины в srcset и заглушкой (core.images)."""
+    return render_image(file_, placeholder, css_class)
@@ -0,0 +1,24 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.streaming import marker, render_items
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def stream(context, template_name, iterable, name):
+    """Цикл по iterable с шаблоном элемента template_name.
+
+    Элемент доступен шаблону под именем name, рядом лежит forloop. При
+    потоковом рендеринге выводит метку, и список рендерится позже.
+    """
+    item_template = context.template.engine.get_template(template_name)
+    parts = context.get('stream_parts')
+    if parts is not None:
+        shared = context.flatten()
+        del shared['stream_parts']
+        parts.append((item_template, iterable, name, shared))
+        return mark_safe(marker(len(parts) - 1))
+    return mark_safe(''.join(
+        render_items(item_template, context, iterable, name)))
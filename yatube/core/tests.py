@@ -1,6 +1,37 @@
+import gzip
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
 from http import HTTPStatus
+from unittest import mock, skipUnless
 
-from django.test import Client, TestCase
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.core.wsgi import get_wsgi_application
+from django.template import Context, Origin, Template, engines
+from django.template.loader import render_to_string
+from django.template.utils import InvalidTemplateEngineError
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from posts import sharding
+from posts.models import Group, Post
+from . import images, jobs, querycheck, uploads, warmup
+from .compression import Minifier, accepted_encoding, minify
+from .models import Job, Upload
+from .warmup import warm_up
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -11,3 +42,485 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+@jobs.register('core.tests.count')
+def count_job(job, total):
+    job.start(total)
+    job.advance(total)
+
+
+class JobTests(TestCase):
+    def _running(self, heartbeat):
+        job = jobs.create('core.tests.count', total=3)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, heartbeat=heartbeat)
+        return Job.objects.get(pk=job.pk)
+
+    def test_stalled_job_is_resumed(self):
+        """run_jobs продолжает задачу, аренда которой истекла."""
+        job = self._running(
+            timezone.now() - timedelta(seconds=settings.JOBS_LEASE + 1))
+        call_command('run_jobs', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.done), (Job.DONE, 3))
+
+    def test_live_job_is_not_taken_over(self):
+        """Задачу с живым обработчиком resume не перехватывает."""
+        job = jobs.resume(self._running(timezone.now()))
+        self.assertEqual((job.status, job.done), (Job.RUNNING, 0))
+
+
+class WarmUpTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='warm')
+        group = Group.objects.create(
+            title='Тестовая группа', slug='warm-group', description='')
+        Post.objects.create(text='Тестовый текст', author=author, group=group)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hot_pages_requested(self):
+        report = warm_up(get_wsgi_application())
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:trending'),
+            reverse('posts:group_list', args=['warm-group']),
+            reverse('posts:profile', args=['warm']),
+        ):
+            with self.subTest(url=url):
+                self.assertIn(url, report)
+        self.assertIn('templates', report)
+
+
+@override_settings(RATELIMITS={
+    'posts:add_comment': {'user': (2, 60), 'ip': (10, 60)},
+    'users:signup': {'ip': (1, 60)},
+})
+class RateLimitTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='spammer')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def comment(self):
+        return self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Комментарий'},
+        )
+
+    @mock.patch('core.ratelimit.time.time', return_value=1000.0)
+    def test_bucket_empties_and_refills(self, now):
+        """Сверх ёмкости корзины — 429 с Retry-After, затем снова можно."""
+        for _ in range(2):
+            self.assertEqual(self.comment().status_code, HTTPStatus.FOUND)
+        response = self.comment()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '50')
+        self.assertTemplateUsed(response, 'core/429.html')
+        self.assertEqual(self.post.comments.count(), 2)
+        # В следующем окне прошлые запросы весят тем меньше, чем оно старше
+        now.return_value = 1049.0
+        self.assertEqual(self.comment().status_code, 429)
+        now.return_value = 1050.0
+        self.assertEqual(self.comment().status_code, HTTPStatus.FOUND)
+        self.assertEqual(self.comment().status_code, 429)
+
+    def test_middleware_limits_class_based_views(self):
+        """Регистрацию ограничивает middleware по имени URL."""
+        client = Client()
+        url = reverse('users:signup')
+        self.assertNotEqual(client.post(url, {}).status_code, 429)
+        self.assertEqual(client.post(url, {}).status_code, 429)
+        self.assertEqual(client.get(url).status_code, HTTPStatus.OK)
+
+    @override_settings(RATELIMIT_TRUSTED_PROXIES=('10.0.0.1',))
+    def test_client_ip_behind_trusted_proxy(self):
+        """За доверенным прокси у каждого клиента свой лимит по IP."""
+        url = reverse('users:signup')
+        proxy = Client(REMOTE_ADDR='10.0.0.1')
+        for client_ip in ('1.1.1.1', '2.2.2.2'):
+            with self.subTest(client_ip=client_ip):
+                response = proxy.post(
+                    url, {}, HTTP_X_FORWARDED_FOR=f'3.3.3.3, {client_ip}')
+                self.assertNotEqual(response.status_code, 429)
+        response = proxy.post(url, {}, HTTP_X_FORWARDED_FOR='1.1.1.1')
+        self.assertEqual(response.status_code, 429)
+        # Чужой адрес не может выдать себя за другого клиента
+        spoofing = Client(REMOTE_ADDR='4.4.4.4')
+        self.assertNotEqual(spoofing.post(
+            url, {}, HTTP_X_FORWARDED_FOR='5.5.5.5').status_code, 429)
+        self.assertEqual(spoofing.post(
+            url, {}, HTTP_X_FORWARDED_FOR='6.6.6.6').status_code, 429)
+
+
+class CompressionTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=author) for i in range(10))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_minify_keeps_preformatted_text(self):
+        html = '<div>\n  <p>a   b</p>\n</div><pre>  x\n  y</pre>  <i>c</i> '
+        self.assertEqual(
+            minify(html),
+            '<div>\n<p>a b</p>\n</div><pre>  x\n  y</pre> <i>c</i> ',
+        )
+
+    def test_minify_tag_split_between_chunks(self):
+        """Защищённый тег, разрезанный между кусками, всё равно узнаётся."""
+        html = (
+            '<p>a   b</p>  <pre>  x\n  y</pre>  <script>  if (a  <  b)'
+            '  {}</script>  <textarea>  t  </textarea>  <i>c   d</i>'
+        )
+        expected = minify(html)
+        for size in range(1, len(html) + 1):
+            with self.subTest(size=size):
+                minifier = Minifier()
+                output = ''.join(
+                    minifier.feed(html[start:start + size])
+                    for start in range(0, len(html), size))
+                self.assertEqual(output + minifier.close(), expected)
+        self.assertIn('<pre>  x\n  y</pre>', expected)
+
+    def test_encoding_respects_q_values(self):
+        for header, encoding in (
+            ('gzip, deflate', 'gzip'),
+            ('gzip;q=0, deflate', 'deflate'),
+            ('gzip;q=0', None),
+            ('deflate;q=0.5, gzip;q=0.4', 'deflate'),
+            ('*;q=0.1', 'gzip'),
+            ('identity, *;q=0', None),
+            ('', None),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(accepted_encoding(header), encoding)
+        response = Client().get(
+            reverse('posts:index'), HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_gzip_response_is_minified(self):
+        plain = Client().get(reverse('posts:index'))
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertNotIn(b'\n  ', plain.content)
+        response = Client().get(
+            reverse('posts:index'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    @override_settings(STREAMING_TEMPLATES={'posts/profile.html'})
+    def test_streaming_response_is_compressed(self):
+        response = Client().get(
+            reverse('posts:profile', args=['author']),
+            HTTP_ACCEPT_ENCODING='gzip',
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        html = gzip.decompress(b''.join(response.streaming_content))
+        self.assertIn('Пост 9'.encode(), html)
+
+
+def _normalize(html):
+    html = html.replace('&#34;', '&quot;')
+    html = re.sub(r'>\s+<', '><', re.sub(r'\s+', ' ', html))
+    return html.strip()
+
+
+def _has_jinja2():
+    try:
+        engines['jinja2']
+    except InvalidTemplateEngineError:
+        return False
+    return True
+
+
+@skipUnless(_has_jinja2(), 'Jinja2 не установлен')
+class JinjaParityTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Описание\nв две строки',
+        )
+        Post.objects.bulk_create(
+            Post(
+                text=f'Пост "{i}" <b>\nвторая строка',
+                author=cls.author,
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(12)
+        )
+
+    def setUp(self):
+        self.request = RequestFactory().get('/')
+        self.request.user = AnonymousUser()
+        posts = self.author.posts.select_related('author', 'group')
+        self.contexts = {
+            'posts/index.html': {
+                'page_obj': Paginator(posts, 10).page(1),
+            },
+            'posts/profile.html': {
+                'page_obj': Paginator(posts, 10).page(2),
+                'author': self.author,
+                'following': False,
+                'followers_count': 0,
+            },
+            'includes/post_card.html': {
+                'group': self.group,
+                'posts': posts,
+            },
+        }
+
+    def test_templates_render_the_same(self):
+        """Шаблоны Jinja2 выводят то же, что и шаблоны DTL."""
+        for template_name, context in self.contexts.items():
+            with self.subTest(template_name=template_name):
+                self.assertEqual(
+                    _normalize(render_to_string(
+                        template_name, context, self.request)),
+                    _normalize(render_to_string(
+                        template_name, context, self.request,
+                        using='jinja2')),
+                )
+
+    @override_settings(JINJA2_TEMPLATES={'posts/index.html'})
+    def test_switch_per_template(self):
+        """Главная рендерится Jinja2, если включена в JINJA2_TEMPLATES."""
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateNotUsed(response, 'posts/index.html')
+        self.assertContains(response, 'Лев Толстой')
+
+    @override_settings(JINJA2_TEMPLATES={'posts/index.html'})
+    def test_warm_up_compiles_with_own_engine(self):
+        """Прогрев компилирует шаблон движком, которым он рендерится."""
+        jinja2 = engines['jinja2']
+        with mock.patch.object(
+                jinja2, 'get_template', wraps=jinja2.get_template) as compile_:
+            compiled = warmup._compile_templates()
+        compile_.assert_called_once_with('posts/index.html')
+        names = list(warmup._template_names())
+        self.assertEqual(compiled, len(names))
+        self.assertFalse(
+            [name for name in names if name.startswith('jinja2/')])
+
+
+class QueryCheckTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='n-plus-one')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author) for i in range(7))
+
+    def setUp(self):
+        # Запрос не через author.posts: тот подставляет автора в посты
+        self.posts = Post.objects.using(
+            sharding.shard_for_author(self.author.pk))
+
+    def test_fingerprint_drops_literals(self):
+        self.assertEqual(
+            querycheck.fingerprint(
+                "SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'x'"),
+            querycheck.fingerprint(
+                "SELECT * FROM t WHERE id IN (4) AND name = 'y''z'"),
+        )
+
+    def test_strict_reports_template_line(self):
+        """N+1 при рендеринге указывает на строку шаблона."""
+        template = Template(
+            '{% for post in posts %}\n{{ post.author }}\n{% endfor %}',
+            origin=Origin('n_plus_one.html', 'core/n_plus_one.html'),
+            engine=engines['django'].engine,
+        )
+        with self.assertRaisesRegex(
+                querycheck.RepeatedQueriesError,
+                r'N\+1 x7.*auth_user[^\n]*\n\s+core/n_plus_one\.html:2,'):
+            with querycheck.strict():
+                template.render(Context({'posts': self.posts}))
+        with querycheck.strict():
+            template.render(
+                Context({'posts': self.posts.select_related('author')}))
+
+    def test_exact_repeat(self):
+        with querycheck.track() as tracker:
+            Post.objects.count()
+            Post.objects.count()
+        [(kind, _, count, _)] = tracker.problems()
+        self.assertEqual((kind, count), ('повтор', 2))
+
+
+class ResponsiveImageTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        picture = Image.new('RGB', (200, 80), (250, 10, 10))
+        picture.paste((10, 10, 250), (150, 0, 200, 80))
+        content = BytesIO()
+        picture.save(content, 'PNG')
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=User.objects.create_user(username='painter'),
+            image=SimpleUploadedFile('red.png', content.getvalue()),
+        )
+
+    def test_placeholder_is_dominant_colour(self):
+        self.assertEqual(self.post.placeholder, '#fa0a0a')
+        self.post.image = None
+        self.post.save(update_fields=['image'])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.placeholder, '')
+
+    def test_full_save_does_not_decode_stored_image(self):
+        posts = self.post.author.posts
+        posts.filter(pk=self.post.pk).update(placeholder='')
+        post = posts.get(pk=self.post.pk)
+        with mock.patch('posts.models.dominant_colour') as dominant:
+            post.text = 'Новый текст'
+            post.save()
+        dominant.assert_not_called()
+        call_command('fill_placeholders', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.placeholder, '#fa0a0a')
+
+    def test_dominant_without_numpy(self):
+        pixels = [(250, 10, 10)] * 3 + [(10, 10, 250)]
+        with mock.patch.object(images, 'numpy', None):
+            self.assertEqual(images._dominant(pixels), (250, 10, 10))
+
+    @skipUnless(images.numpy, 'numpy не установлен')
+    def test_dominant_with_numpy_matches_loop(self):
+        pixels = (
+            [(200 + i, 30, 40 + i) for i in range(5)]
+            + [(10, 250, 10)] * 3 + [(0, 0, 0)])
+        expected = images._dominant(pixels)
+        with mock.patch.object(images, 'numpy', None):
+            self.assertEqual(expected, images._dominant(pixels))
+
+    def test_srcset_has_every_width(self):
+        html = images.responsive_image(
+            self.post.image, self.post.placeholder)
+        for width in settings.IMAGE_WIDTHS:
+            self.assertRegex(html, rf'\.(png|jpg) {width}w')
+        self.assertIn('width="960" height="339"', html)
+        self.assertIn('background-color: #fa0a0a', html)
+        self.assertEqual(images.responsive_image(None), '')
+
+
+@override_settings(UPLOAD_READ_SIZE=64)
+class ChunkedUploadTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            UPLOAD_TEMP_DIR=os.path.join(cls.media_root, 'uploads'))
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='uploader')
+        self.client.force_login(self.user)
+        content = BytesIO()
+        Image.new('RGB', (64, 64), (0, 128, 0)).save(content, 'PNG')
+        self.content = content.getvalue()
+
+    def send(self, token, offset, data):
+        return self.client.patch(
+            reverse('core:upload_chunk', args=[token]), data,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_resumable_upload_becomes_post_image(self):
+        response = self.client.post(reverse('core:upload_start'), {
+            'filename': 'green.png', 'size': len(self.content)})
+        self.assertEqual(response.status_code, 201)
+        token = response.json()['token']
+        half = len(self.content) // 2
+        self.assertEqual(self.send(token, 0, self.content[:half]).json()[
+            'offset'], half)
+        # Повтор с устаревшего смещения не портит файл
+        response = self.send(token, 0, self.content[:half])
+        self.assertEqual(response.status_code, 409)
+        offset = self.client.get(
+            reverse('core:upload_chunk', args=[token])).json()['offset']
+        response = self.send(token, offset, self.content[offset:])
+        self.assertTrue(response.json()['complete'])
+
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост с загрузкой', 'upload': token})
+        post = self.user.posts.get(text='Пост с загрузкой')
+        with post.image.open('rb') as image:
+            self.assertEqual(image.read(), self.content)
+        self.assertFalse(Upload.objects.exists())
+        self.assertEqual(os.listdir(settings.UPLOAD_TEMP_DIR), [])
+
+    def test_rejected_form_closes_upload_file(self):
+        upload = uploads.start(self.user, 'green.png', len(self.content))
+        uploads.write(
+            upload, 0, BytesIO(self.content), len(self.content))
+        response = self.client.post(reverse('posts:post_create'), {
+            'text': '', 'upload': upload.token})
+        form = response.context['form']
+        self.assertTrue(form.errors)
+        self.assertTrue(form.files['image'].closed)
+        self.assertTrue(Upload.objects.filter(pk=upload.pk).exists())
+        uploads.discard(upload)
+
+    def test_unfinished_or_foreign_upload_is_rejected(self):
+        upload = uploads.start(self.user, 'green.png', len(self.content))
+        response = self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост', 'upload': upload.token})
+        self.assertFormError(
+            response, 'form', None,
+            'Загрузка картинки не найдена или ещё не завершена.')
+        self.assertEqual(
+            self.send(upload.token, 0, b'x' * (len(self.content) + 1))
+            .status_code, 413)
+        self.client.force_login(User.objects.create_user(username='other'))
+        self.assertEqual(self.send(upload.token, 0, b'x').status_code, 404)
@@ -0,0 +1,146 @@
+"""Загрузка файлов частями с докачкой.
+
+Клиент создаёт загрузку (start), получает токен и шлёт файл частями
+PATCH-запросами с заголовком Upload-Offset. Часть читается из запроса
+по UPLOAD_READ_SIZE байт и сразу пишется во временный файл на диске,
+так что память не зависит от размера файла. После обрыва клиент узнаёт
+смещение (GET) и продолжает с него. Когда получен весь файл, он
+переименовывается в готовый, и формы принимают его по токену
+(as_file) вместо файла из multipart-запроса.
+"""
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Upload
+
+
+class UploadError(Exception):
+    status = 400
+
+
+class OffsetMismatch(UploadError):
+    """Часть начинается не там, где закончилась предыдущая."""
+    status = 409
+
+
+class TooLarge(UploadError):
+    status = 413
+
+
+class ChunkedFile(UploadedFile):
+    """Готовая загрузка в виде файла формы.
+
+    Как у TemporaryUploadedFile, у неё есть путь на диске: ImageField
+    проверяет картинку по нему, а FileSystemStorage переносит файл в
+    MEDIA_ROOT без копирования. Сам файл открывается при первом
+    обращении, так что форма, до него не дошедшая, ничего не держит.
+    """
+
+    def __init__(self, upload):
+        self.upload = upload
+        super().__init__(None, upload.filename, None, upload.size, None)
+
+    def _get_file(self):
+        if self._file is None:
+            self._file = open(self.upload.path, 'rb')
+        return self._file
+
+    def _set_file(self, file_):
+        self._file = file_
+
+    file = property(_get_file, _set_file)
+
+    @property
+    def closed(self):
+        return self._file is None or self._file.closed
+
+    def open(self, mode='rb'):
+        if self.closed:
+            self._file = open(self.upload.path, mode)
+        else:
+            self.seek(0)
+        return self
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def temporary_file_path(self):
+        return self.upload.path
+
+
+def prune():
+    """Удаляет брошенные загрузки старше UPLOAD_EXPIRE_HOURS."""
+    expired = timezone.now() - timedelta(hours=settings.UPLOAD_EXPIRE_HOURS)
+    for upload in Upload.objects.filter(created__lt=expired):
+        discard(upload)
+
+
+def start(user, filename, size):
+    if size <= 0:
+        raise UploadError('Пустой файл.')
+    if size > settings.UPLOAD_MAX_SIZE:
+        raise TooLarge('Файл слишком большой.')
+    prune()
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+    upload = Upload.objects.create(
+        user=user, filename=os.path.basename(filename)[:255], size=size)
+    open(upload.path, 'wb').close()
+    return upload
+
+
+def write(upload, offset, stream, length):
+    """Пишет length байт из stream с позиции offset, возвращает смещение."""
+    if upload.complete or offset != upload.received:
+        raise OffsetMismatch('Ожидалась часть с другого смещения.')
+    if length > min(
+            settings.UPLOAD_CHUNK_MAX_SIZE, upload.size - offset):
+        raise TooLarge('Часть слишком большая.')
+    written = 0
+    with open(upload.path, 'r+b') as file_:
+        file_.seek(offset)
+        while written < length:
+            data = stream.read(
+                min(settings.UPLOAD_READ_SIZE, length - written))
+            if not data:
+                break
+            file_.write(data)
+            written += len(data)
+    # Смещение сдвигает только тот, кто писал с текущего смещения
+    claimed = Upload.objects.filter(pk=upload.pk, received=offset).update(
+        received=F('received') + written)
+    if not claimed:
+        raise OffsetMismatch('Часть уже записана другим запросом.')
+    partial = upload.path
+    upload.received = offset + written
+    if upload.complete:
+        os.replace(partial, upload.path)
+    return upload.received
+
+
+def finished(token, user):
+    """Полностью полученная загрузка user по токену или None."""
+    try:
+        upload = Upload.objects.get(token=token, user=user)
+    except (Upload.DoesNotExist, ValidationError):
+        return None
+    return upload if upload.complete else None
+
+
+def as_file(upload):
+    return ChunkedFile(upload)
+
+
+def discard(upload):
+    """Удаляет загрузку вместе с её файлом, если он ещё на месте."""
+    try:
+        os.remove(upload.path)
+    except FileNotFoundError:
+        pass
+    upload.delete()
@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('', views.upload_start, name='upload_start'),
+    path('<uuid:token>/', views.upload_chunk, name='upload_chunk'),
+]
@@ -1,4 +1,10 @@
-from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.views.decorators.http import require_http_methods, require_POST
+
+from . import uploads
+from .models import Upload
 
 
 def page_not_found(request, exception):
@@ -7,3 +13,53 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def too_many_requests(request):
+    return render(request, 'core/429.html', status=429)
+
+
+def _upload_state(upload, status=200, **extra):
+    return JsonResponse({
+        'token': str(upload.token),
+        'offset': upload.received,
+        'size': upload.size,
+        'complete': upload.complete,
+        **extra,
+    }, status=status)
+
+
+@login_required
+@require_POST
+def upload_start(request):
+    """Начинает загрузку частями: filename и size в теле формы."""
+    size = request.POST.get('size', '')
+    if not size.isdigit():
+        return JsonResponse({'error': 'Не указан размер файла.'}, status=400)
+    try:
+        upload = uploads.start(
+            request.user, request.POST.get('filename', 'upload'), int(size))
+    except uploads.UploadError as error:
+        return JsonResponse({'error': str(error)}, status=error.status)
+    return _upload_state(upload, status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'PATCH'])
+def upload_chunk(request, token):
+    """GET — текущее смещение, PATCH — часть файла с Upload-Offset."""
+    upload = get_object_or_404(Upload, token=token, user=request.user)
+    if request.method == 'PATCH':
+        offset = request.META.get('HTTP_UPLOAD_OFFSET', '')
+        length = request.META.get('CONTENT_LENGTH', '')
+        if not (offset.isdigit() and length.isdigit()):
+            return _upload_state(
+                upload, status=400,
+                error='Нужны заголовки Upload-Offset и Content-Length.')
+        try:
+            uploads.write(upload, int(offset), request, int(length))
+        except uploads.UploadError as error:
+            upload.refresh_from_db()
+            return _upload_state(
+                upload, status=error.status, error=str(error))
+    return _upload_state(upload)
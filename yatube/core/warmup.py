@@ -0,0 +1,140 @@
+"""Прогрев процесса перед приёмом трафика.
+
+warm_up() вызывается из yatube.wsgi (WARMUP_ON_START) или из хука
+post_fork сервера приложений: заполняет резолвер URL, компилирует
+шаблоны, импортирует ленивые модули, открывает соединения с базой и
+прогоняет горячие страницы через WSGI-приложение, чтобы наполнить кеши.
+Для каждой страницы в лог пишется время первого и повторного запроса.
+"""
+import io
+import logging
+import os
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Count
+from django.template import engines
+from django.urls import get_resolver, reverse
+
+from .rendering import engine_for
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def _populate_urls():
+    get_resolver().reverse_dict
+    reverse('posts:index')
+
+
+def _template_names():
+    """Имена шаблонов из каталогов DTL, кроме каталогов других движков."""
+    django_engine = engines['django']
+    skip = tuple(
+        os.path.join(directory, '')
+        for engine in engines.all() if engine is not django_engine
+        for directory in engine.template_dirs
+    )
+    for directory in django_engine.template_dirs:
+        for root, _, files in os.walk(directory):
+            if os.path.join(root, '').startswith(skip):
+                continue
+            for filename in files:
+                name = os.path.relpath(os.path.join(root, filename), directory)
+                yield name.replace(os.sep, '/')
+
+
+def _compile_templates():
+    """Компилирует каждый шаблон тем движком, которым он рендерится."""
+    compiled = 0
+    for name in _template_names():
+        engine = engines[engine_for(name) or 'django']
+        try:
+            engine.get_template(name)
+        except Exception:
+            logger.exception('Прогрев: шаблон %s не скомпилирован', name)
+            continue
+        compiled += 1
+    return compiled
+
+
+def _import_modules():
+    from sorl.thumbnail import default
+    default.kvstore
+    default.engine
+    default.storage
+
+
+def _connect_databases():
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def hot_urls():
+    """Первые страницы ленты, крупнейших групп и самых читаемых авторов."""
+    from posts import sharding
+
+    urls = [reverse('posts:index'), reverse('posts:trending')]
+    groups = sharding.largest_groups(settings.WARMUP_TOP_GROUPS)
+    urls += [reverse('posts:group_list', args=[slug]) for slug in groups]
+    authors = User.objects.filter(is_active=True).annotate(
+        followers=Count('following')).order_by('-followers').values_list(
+        'username', flat=True)[:settings.WARMUP_TOP_PROFILES]
+    urls += [reverse('posts:profile', args=[name]) for name in authors]
+    return urls
+
+
+def _request(application, url):
+    environ = {
+        'PATH_INFO': url,
+        'HTTP_HOST': 'localhost',
+        'wsgi.input': io.BytesIO(),
+    }
+    setup_testing_defaults(environ)
+    started = time.perf_counter()
+    response = application(environ, lambda status, headers: None)
+    for _ in response:
+        pass
+    if hasattr(response, 'close'):
+        response.close()
+    return time.perf_counter() - started
+
+
+def _step(report, name, func, *args):
+    started = time.perf_counter()
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Прогрев: шаг %s не выполнен', name)
+    report[name] = time.perf_counter() - started
+    logger.info('Прогрев %s: %.1f мс', name, report[name] * 1000)
+
+
+def warm_up(application):
+    """Прогревает процесс и возвращает отчёт {шаг или URL: секунды}."""
+    report = {}
+    _step(report, 'urls', _populate_urls)
+    _step(report, 'templates', _compile_templates)
+    _step(report, 'modules', _import_modules)
+    _step(report, 'databases', _connect_databases)
+    try:
+        urls = hot_urls()
+    except Exception:
+        logger.exception('Прогрев: не удалось выбрать горячие страницы')
+        urls = []
+    for url in urls:
+        try:
+            cold = _request(application, url)
+            warm = _request(application, url)
+        except Exception:
+            logger.exception('Прогрев: страница %s не открылась', url)
+            continue
+        report[url] = (cold, warm)
+        logger.info(
+            'Прогрев %s: холодный запрос %.1f мс, тёплый %.1f мс',
+            url, cold * 1000, warm * 1000)
+    return report
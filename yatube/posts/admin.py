@@ -1,24 +1,226 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.admin.views.main import (
+    ERROR_FLAG, IGNORED_PARAMS, PAGE_VAR, SEARCH_VAR,
+)
+from django.core.paginator import Paginator
+from django.forms.models import BaseInlineFormSet
+from django.template.response import TemplateResponse
 
-from .models import Post, Group, Comment, Follow
+from core.paginators import EstimatedCountPaginator
+from . import bulk, sharding
+from .forms import BulkDeleteForm, BulkReassignForm, BulkRegroupForm
+from .models import Post, Group, Comment, Follow, GroupSubscription
 
 
-class BookInline(admin.TabularInline):
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Формсет инлайна, который показывает комментарии постранично."""
+    page_var = 'comments_page'
+    per_page = 20
+    page_number = None
+
+    def get_queryset(self):
+        if not hasattr(self, 'page_obj'):
+            queryset = super().get_queryset().using(
+                self.instance._state.db).select_related(
+                    'author').order_by('-created', '-pk')
+            self.page_obj = Paginator(
+                queryset, self.per_page).get_page(self.page_number)
+        return self.page_obj.object_list
+
+
+class CommentInline(admin.TabularInline):
     model = Comment
+    formset = PaginatedInlineFormSet
+    template = 'admin/edit_inline/tabular_paginated.html'
+    raw_id_fields = ('author',)
+    extra = 0
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.page_number = request.GET.get(formset.page_var)
+        return formset
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """Шард, записи которого показывает список (см. posts.sharding).
+
+    Список читает один шард за раз, без параметра — первый из POST_SHARDS.
+    """
+    title = 'шард'
+    parameter_name = 'shard'
+
+    @classmethod
+    def alias(cls, request):
+        value = request.GET.get(cls.parameter_name)
+        aliases = sharding.shards()
+        return value if value in aliases else aliases[0]
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in sharding.shards()]
+
+    def has_output(self):
+        return sharding.is_sharded()
+
+    def choices(self, changelist):
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': alias == (self.value() or sharding.shards()[0]),
+                'query_string': changelist.get_query_string(
+                    {self.parameter_name: alias}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        return queryset
+
+
+class ShardedAdmin(admin.ModelAdmin):
+    """Админка шардированной модели: список по шардам, запись — по id."""
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).using(ShardFilter.alias(request))
+
+    def get_object(self, request, object_id, from_field=None):
+        if from_field is not None or not str(object_id).isdigit():
+            return super().get_object(request, object_id, from_field)
+        for alias in sharding.id_shards(object_id):
+            obj = self.get_queryset(request).using(alias).filter(
+                pk=object_id).first()
+            if obj is not None:
+                return obj
+        return None
 
 
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(ShardedAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    list_filter = (ShardFilter, 'pub_date')
+    date_hierarchy = 'pub_date'
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
     inlines = [
-        BookInline,
+        CommentInline,
     ]
+    actions = ('regroup_posts', 'reassign_posts', 'delete_posts')
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def _bulk_action(self, request, queryset, form_class, title, start):
+        """Запрашивает параметры операции и ставит фоновую задачу."""
+        form = form_class(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            try:
+                job = start(
+                    self._selection(request, queryset),
+                    *form.cleaned_data.values())
+            except bulk.BulkError as error:
+                self.message_user(request, str(error), messages.ERROR)
+                return None
+            self.message_user(request, f'Запущена задача {job}.')
+            return None
+        context = {
+            **self.admin_site.each_context(request),
+            'title': title,
+            'opts': self.model._meta,
+            'form': form,
+            'count': queryset.count(),
+            'action': request.POST['action'],
+            'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+        }
+        return TemplateResponse(
+            request, 'admin/posts/post/bulk_action.html', context)
+
+    def _selection(self, request, queryset):
+        """Выборка bulk: фильтры списка при выборе всех, иначе id."""
+        if request.POST.get('select_across') == '1':
+            ignored = {
+                *IGNORED_PARAMS, PAGE_VAR, ERROR_FLAG,
+                ShardFilter.parameter_name,
+            }
+            return {
+                'filters': {
+                    key: value for key, value in request.GET.items()
+                    if key not in ignored
+                },
+                'search': request.GET.get(SEARCH_VAR, ''),
+                'shard': queryset.db,
+            }
+        return {'ids': list(queryset.values_list('pk', flat=True))}
+
+    def regroup_posts(self, request, queryset):
+        return self._bulk_action(
+            request, queryset, BulkRegroupForm,
+            'Перенос постов в группу', bulk.start_regroup)
+    regroup_posts.short_description = 'Перенести в группу'
+
+    def reassign_posts(self, request, queryset):
+        return self._bulk_action(
+            request, queryset, BulkReassignForm,
+            'Смена автора постов', bulk.start_reassign)
+    reassign_posts.short_description = 'Сменить автора'
+
+    def delete_posts(self, request, queryset):
+        return self._bulk_action(
+            request, queryset, BulkDeleteForm,
+            'Удаление постов', bulk.start_delete)
+    delete_posts.short_description = 'Удалить выбранные посты'
+
+    def get_changelist_formset(self, request, **kwargs):
+        """Выбор группы в списке строится одним запросом на страницу."""
+        formset = super().get_changelist_formset(request, **kwargs)
+        field = formset.form.base_fields['group']
+        field.widget = forms.Select()
+        field.choices = tuple(iter(field.choices))
+        return formset
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по индексам: «#123» — по id, «@username» — по автору."""
+        return queryset.search(search_term), False
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug')
+    search_fields = ('title', 'slug')
+
+
+class CommentAdmin(ShardedAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    list_filter = (ShardFilter,)
+    raw_id_fields = ('author', 'post')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class GroupSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'group')
+    list_select_related = ('user', 'group')
+    raw_id_fields = ('user', 'group')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
+admin.site.register(GroupSubscription, GroupSubscriptionAdmin)
@@ -0,0 +1,86 @@
+"""Архив старых постов.
+
+Посты старше ARCHIVE_AFTER_DAYS вместе с комментариями переносятся из
+Post и Comment в ArchivedPost и ArchivedComment той же базы (в каждом
+шарде свой архив). Перенос идёт фоновой задачей core.jobs пачками по
+ARCHIVE_CHUNK_SIZE, каждая пачка — одна транзакция, поэтому прерванную
+задачу достаточно запустить ещё раз.
+
+Ленты (index, follow_index, группы) читают только горячую таблицу;
+страница поста и профиль находят и архивные посты.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import jobs
+from . import sharding
+from .models import ArchivedComment, ArchivedPost, Comment, Post
+
+
+def _copy(source, target, filters):
+    """Копирует строки source в target с теми же значениями полей."""
+    fields = [field.attname for field in target._meta.concrete_fields]
+    target.objects.using(source.db).bulk_create(
+        target(**values) for values in source.filter(**filters).values(
+            *fields))
+
+
+def archive_chunk(alias, post_ids):
+    with transaction.atomic(using=alias):
+        posts = Post.objects.using(alias).filter(pk__in=post_ids)
+        _copy(posts, ArchivedPost, {})
+        _copy(
+            Comment.objects.using(alias), ArchivedComment,
+            {'post_id__in': post_ids})
+        posts.delete()
+
+
+@jobs.register('posts.archive')
+def archive(job, before):
+    before = parse_datetime(before)
+    old = {
+        alias: Post.objects.using(alias).filter(pub_date__lt=before)
+        for alias in sharding.shards()
+    }
+    job.start(sum(posts.count() for posts in old.values()))
+    for alias, posts in old.items():
+        while True:
+            post_ids = list(posts.order_by('pk').values_list(
+                'pk', flat=True)[:settings.ARCHIVE_CHUNK_SIZE])
+            if not post_ids:
+                break
+            archive_chunk(alias, post_ids)
+            job.advance(len(post_ids))
+
+
+def start_archive(before=None, background=True):
+    if before is None:
+        before = timezone.now() - timedelta(
+            days=settings.ARCHIVE_AFTER_DAYS)
+    create = jobs.enqueue if background else jobs.create
+    return create('posts.archive', before=before)
+
+
+def find_post(post_id):
+    """Видимый пост из горячей таблицы или из архива, иначе None."""
+    for alias in sharding.id_shards(post_id):
+        for model in (Post, ArchivedPost):
+            posts = model.objects.using(alias).visible().select_related(
+                'author', 'group')
+            post = posts.filter(pk=post_id).first()
+            if post is not None:
+                return post
+    return None
+
+
+def posts_of(author):
+    """Посты автора вместе с архивными, новые первыми."""
+    return sharding.Merged([
+        model.objects.using(alias).filter(author=author).previews()
+        for alias in sharding.author_shards(author.pk)
+        for model in (Post, ArchivedPost)
+    ])
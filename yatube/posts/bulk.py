@@ -0,0 +1,190 @@
+"""Массовые операции над постами.
+
+Операции выполняются фоновыми задачами core.jobs. Посты задаются
+выборкой — словарём, который хранится в параметрах задачи как JSON:
+явные id отмеченных постов ('ids') или фильтры списка постов в админке
+и строка поиска ('filters', 'search'), поэтому выбор «всех по фильтру»
+не раздувает параметры задачи. Запрос по выборке строится заново при
+каждом запуске (select), допустимы только фильтры FILTER_LOOKUPS
+по полям FILTER_FIELDS. Ключ 'shard' ограничивает выборку одним шардом:
+список постов в админке показывает шард за шардом.
+
+Посты обрабатываются пачками по BULK_CHUNK_SIZE по возрастанию id, на
+каждую пачку — один UPDATE или DELETE в отдельной короткой транзакции,
+шард за шардом. После пачки сбрасываются кеши только её постов, авторов
+и сообществ, их ленты и готовые страницы отмечаются для пересборки, а
+шард и id последнего поста сохраняются как контрольная точка для
+jobs.resume. Сменить автора можно только на автора из того же шарда:
+переносить посты между шардами операции не умеют.
+"""
+from django.conf import settings
+from django.contrib.admin.utils import prepare_lookup_value
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.constants import LOOKUP_SEP
+
+from core import holes, jobs
+from . import feed, prerender, sharding, syndication, trending
+from .models import Post
+
+
+FILTER_FIELDS = (
+    'id', 'pk', 'pub_date', 'author', 'author__id', 'author__username',
+    'group', 'group__id', 'group__slug',
+)
+FILTER_LOOKUPS = (
+    'exact', 'iexact', 'in', 'gt', 'gte', 'lt', 'lte', 'isnull', 'year',
+    'month', 'day',
+)
+
+
+class BulkError(Exception):
+    pass
+
+
+def delete_files(names):
+    for name in names:
+        default_storage.delete(name)
+
+
+def forget(rows, author_ids=(), group_ids=(), deleted=False):
+    """Сбрасывает кеши постов rows [(id, author_id, group_id)].
+
+    Головы лент (posts.feed) их авторов и сообществ пересчитываются, а
+    файлы posts.syndication и готовые страницы отмечаются для пересборки:
+    UPDATE и DELETE проходят мимо сигналов.
+
+    author_ids и group_ids — дополнительные затронутые объекты, например
+    новый автор или новая группа постов.
+    """
+    post_ids = [pk for pk, _, _ in rows]
+    author_ids = {*author_ids, *(author_id for _, author_id, _ in rows)}
+    group_ids = {*group_ids, *(group_id for _, _, group_id in rows)}
+    group_ids.discard(None)
+    holes.bump(
+        *(f'post:{pk}' for pk in post_ids),
+        *(f'author:{pk}' for pk in author_ids),
+    )
+    feed.refresh_heads(author_ids, group_ids)
+    syndication.schedule('index')
+    for pk in author_ids:
+        syndication.schedule('author', pk)
+    for pk in group_ids:
+        syndication.schedule('group', pk)
+    if deleted:
+        for pk in post_ids:
+            syndication.schedule_sitemap('posts', pk)
+    prerender.refresh_posts(post_ids, group_ids)
+
+
+def _allowed(lookup):
+    parts = lookup.split(LOOKUP_SEP)
+    for size in range(len(parts), 0, -1):
+        if LOOKUP_SEP.join(parts[:size]) in FILTER_FIELDS:
+            return set(parts[size:]) <= set(FILTER_LOOKUPS)
+    return False
+
+
+def select(selection):
+    """Запрос к постам выборки из параметров задачи (см. описание модуля)."""
+    posts = Post.objects.all()
+    if 'ids' in selection:
+        return posts.filter(pk__in=selection['ids'])
+    for lookup, value in selection.get('filters', {}).items():
+        if not _allowed(lookup):
+            raise BulkError(f'Фильтр {lookup} не поддерживается.')
+        posts = posts.filter(**{lookup: prepare_lookup_value(lookup, value)})
+    return posts.search(selection.get('search', ''))
+
+
+def _aliases(selection):
+    """Шарды, по которым проходит выборка."""
+    aliases = sharding.shards()
+    if selection.get('shard') in aliases:
+        return [selection['shard']]
+    return list(aliases)
+
+
+def _apply(job, selection, operation, author_ids=(), group_ids=(),
+           deleted=False):
+    posts = select(selection)
+    aliases = _aliases(selection)
+    alias, _, last = (job.checkpoint or '').rpartition(':')
+    alias, last = alias or aliases[0], int(last or 0)
+    if not job.checkpoint:
+        job.start(sum(posts.using(alias).count() for alias in aliases))
+    for alias in aliases[aliases.index(alias):]:
+        while True:
+            rows = list(
+                posts.using(alias).filter(pk__gt=last).order_by('pk')
+                .values_list('pk', 'author_id', 'group_id')
+                [:settings.BULK_CHUNK_SIZE]
+            )
+            if not rows:
+                break
+            chunk = [pk for pk, _, _ in rows]
+            with transaction.atomic(using=alias):
+                operation(alias, chunk)
+            forget(rows, author_ids, group_ids, deleted)
+            last = chunk[-1]
+            job.save_checkpoint(f'{alias}:{last}')
+            job.advance(len(chunk))
+        last = 0
+    trending.refresh()
+
+
+@jobs.register('posts.regroup')
+def regroup(job, selection, group_id):
+    _apply(
+        job, selection,
+        lambda alias, chunk: Post.objects.using(alias).filter(
+            pk__in=chunk).update(group_id=group_id),
+        group_ids=[group_id])
+
+
+@jobs.register('posts.reassign')
+def reassign(job, selection, author_id):
+    _apply(
+        job, selection,
+        lambda alias, chunk: Post.objects.using(alias).filter(
+            pk__in=chunk).update(author_id=author_id),
+        author_ids=[author_id])
+
+
+def _delete_chunk(alias, chunk):
+    posts = Post.objects.using(alias).filter(pk__in=chunk)
+    images = list(posts.exclude(image='').values_list('image', flat=True))
+    posts.delete()
+    transaction.on_commit(lambda: delete_files(images), using=alias)
+
+
+@jobs.register('posts.delete')
+def delete(job, selection):
+    _apply(job, selection, _delete_chunk, deleted=True)
+
+
+def _start(name, selection, background, **params):
+    create = jobs.enqueue if background else jobs.create
+    return create(name, selection=selection, **params)
+
+
+def start_regroup(selection, group, background=True):
+    return _start(
+        'posts.regroup', selection, background,
+        group_id=group.pk if group else None)
+
+
+def start_reassign(selection, author, background=True):
+    target = sharding.shard_for_author(author.pk)
+    posts = select(selection)
+    for alias in _aliases(selection):
+        if alias != target and posts.using(alias).exists():
+            raise BulkError(
+                f'Посты из шарда {alias} нельзя передать автору '
+                f'{author} из шарда {target}.')
+    return _start(
+        'posts.reassign', selection, background, author_id=author.pk)
+
+
+def start_delete(selection, background=True):
+    return _start('posts.delete', selection, background)
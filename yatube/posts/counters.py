@@ -0,0 +1,66 @@
+"""Счётчик просмотров постов с агрегацией в памяти процесса.
+
+Просмотры и комментарии копятся в словарях и сбрасываются в базу одной
+пачкой, когда событий набирается POST_VIEWS_FLUSH_SIZE или с прошлого
+сброса прошло POST_VIEWS_FLUSH_INTERVAL секунд. При остановке процесса
+теряется не больше одной несброшенной пачки.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from . import sharding, trending
+from .models import Post
+
+_lock = threading.Lock()
+_views = Counter()
+_weights = Counter()
+_state = {'events': 0, 'flushed': time.monotonic()}
+
+
+def _register(post_id, weight, is_view):
+    with _lock:
+        if is_view:
+            _views[post_id] += 1
+        _weights[post_id] += weight
+        _state['events'] += 1
+        due = (
+            _state['events'] >= settings.POST_VIEWS_FLUSH_SIZE
+            or time.monotonic() - _state['flushed']
+            >= settings.POST_VIEWS_FLUSH_INTERVAL
+        )
+    if due:
+        flush()
+
+
+def register_view(post_id):
+    _register(post_id, 1, is_view=True)
+
+
+def register_comment(post_id):
+    _register(post_id, settings.TRENDING_COMMENT_WEIGHT, is_view=False)
+
+
+def flush():
+    """Записывает накопленные события в базу и возвращает просмотры."""
+    with _lock:
+        views, weights = dict(_views), dict(_weights)
+        _views.clear()
+        _weights.clear()
+        _state['events'] = 0
+        _state['flushed'] = time.monotonic()
+    if not weights:
+        return views
+    by_count = defaultdict(list)
+    for post_id, count in views.items():
+        by_count[sharding.shard_for_id(post_id), count].append(post_id)
+    with transaction.atomic():
+        for (alias, count), post_ids in by_count.items():
+            Post.objects.using(alias).filter(pk__in=post_ids).update(
+                views=F('views') + count)
+        trending.add_events(weights)
+    return views
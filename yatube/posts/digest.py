@@ -0,0 +1,174 @@
+"""Дайджест новых постов от авторов, на которых подписан пользователь.
+
+Задача идёт по подписчикам в порядке id пачками по DIGEST_CHUNK_SIZE:
+посты для всей пачки выбираются одним запросом, письма рендерятся в пуле
+из DIGEST_WORKERS процессов и уходят через одно соединение с почтовым
+сервером по DIGEST_BATCH_SIZE штук. После каждой пачки в задаче
+сохраняется id последнего подписчика, и прерванная рассылка продолжается
+с этого места; письма пачки, на которой процесс упал, могут уйти повторно.
+
+Окно новой рассылки начинается там, где закончилось окно предыдущей,
+поэтому поздний запуск cron не теряет посты, а ранний не повторяет их.
+"""
+import heapq
+import json
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import jobs
+from core.models import Job
+from . import sharding
+from .models import Follow, Post
+
+User = get_user_model()
+
+JOB_NAME = 'posts.digest'
+
+
+def _readers(cursor, size):
+    return list(
+        Follow.objects.filter(user_id__gt=cursor, user__is_active=True)
+        .order_by('user_id')
+        .values_list('user_id', flat=True)
+        .distinct()[:size]
+    )
+
+
+def _collect(reader_ids, since, until):
+    """Письма для пачки подписчиков: [(email, контекст шаблона)]."""
+    recipients = dict(
+        User.objects.filter(pk__in=reader_ids).exclude(email='')
+        .values_list('pk', 'email')
+    )
+    # Подписки лежат в default, а посты — в шардах авторов
+    readers = defaultdict(list)
+    for reader_id, author_id in Follow.objects.filter(
+            user_id__in=list(recipients)).values_list('user_id', 'author_id'):
+        readers[author_id].append(reader_id)
+    authors = sharding.by_author_shard(readers)
+    rows = heapq.merge(
+        *(
+            Post.objects.using(alias).visible()
+            .filter(
+                pub_date__gte=since,
+                pub_date__lt=until,
+                author_id__in=author_ids,
+            )
+            .order_by('-pub_date')
+            .values_list(
+                'author_id', 'pk', 'text', 'pub_date', 'author__username')
+            for alias, author_ids in authors.items()
+        ),
+        key=lambda row: row[3],
+        reverse=True,
+    )
+    posts = defaultdict(list)
+    for author_id, pk, text, pub_date, author in rows:
+        for reader_id in readers[author_id]:
+            if len(posts[reader_id]) >= settings.DIGEST_MAX_POSTS:
+                continue
+            posts[reader_id].append({
+                'text': text,
+                'pub_date': pub_date,
+                'author': author,
+                'url': settings.SITE_URL + reverse(
+                    'posts:post_detail', args=[pk]),
+            })
+    return [
+        (recipients[reader_id], {'posts': reader_posts})
+        for reader_id, reader_posts in posts.items()
+    ]
+
+
+def _render(item):
+    email, context = item
+    return email, render_to_string('posts/email/digest.txt', context)
+
+
+def _send(connection, rendered):
+    messages = [
+        EmailMessage(settings.DIGEST_SUBJECT, body, to=[email])
+        for email, body in rendered
+    ]
+    for start in range(0, len(messages), settings.DIGEST_BATCH_SIZE):
+        connection.send_messages(
+            messages[start:start + settings.DIGEST_BATCH_SIZE])
+    return len(messages)
+
+
+@jobs.register(JOB_NAME)
+def send_digest(job, since, until):
+    since, until = parse_datetime(since), parse_datetime(until)
+    cursor = int(job.checkpoint or 0)
+    if not cursor:
+        job.start(
+            Follow.objects.filter(user__is_active=True)
+            .values('user_id').distinct().count()
+        )
+    pool = None
+    if settings.DIGEST_WORKERS > 1:
+        pool = ProcessPoolExecutor(
+            settings.DIGEST_WORKERS, initializer=django.setup)
+    connection = get_connection()
+    connection.open()
+    try:
+        while True:
+            reader_ids = _readers(cursor, settings.DIGEST_CHUNK_SIZE)
+            if not reader_ids:
+                break
+            items = _collect(reader_ids, since, until)
+            if pool is not None:
+                rendered = list(pool.map(_render, items, chunksize=50))
+            else:
+                rendered = [_render(item) for item in items]
+            _send(connection, rendered)
+            cursor = reader_ids[-1]
+            job.save_checkpoint(cursor)
+            job.advance(len(reader_ids))
+    finally:
+        connection.close()
+        if pool is not None:
+            pool.shutdown()
+
+
+def unfinished():
+    """Последняя упавшая или брошенная рассылка, если она есть."""
+    return jobs.resumable().filter(name=JOB_NAME).order_by('-pk').first()
+
+
+def in_progress():
+    """Есть ли рассылка в очереди или с живым обработчиком."""
+    return Job.objects.filter(
+        name=JOB_NAME, status__in=(Job.PENDING, Job.RUNNING)
+    ).exclude(pk__in=jobs.stalled().values('pk')).exists()
+
+
+def _previous_until():
+    params = Job.objects.filter(name=JOB_NAME).order_by('-pk').values_list(
+        'params', flat=True).first()
+    return params and parse_datetime(json.loads(params)['until'])
+
+
+def start_digest(background=True):
+    """Ставит рассылку постов, вышедших после окна предыдущей.
+
+    Самая первая рассылка берёт последние DIGEST_PERIOD секунд.
+    """
+    until = timezone.now()
+    since = _previous_until() or until - timedelta(
+        seconds=settings.DIGEST_PERIOD)
+    create = jobs.enqueue if background else jobs.create
+    # isoformat сохраняет микросекунды, DjangoJSONEncoder — только
+    # миллисекунды, и посты последней миллисекунды выпадали бы из окна
+    return create(
+        JOB_NAME, since=since.isoformat(), until=until.isoformat())
@@ -0,0 +1,36 @@
+"""Сохранение правок поста.
+
+Пишутся только изменённые поля формы (update_fields), поэтому правка
+текста не трогает картинку и не заставляет заново сохранять файл. Если
+ничего не изменилось, пост не сохраняется вовсе и сигналы не срабатывают.
+
+Одновременные правки разводит счётчик version: форма присылает версию,
+которую видел автор, и сохранение проходит, только если в базе всё ещё
+она. Проверка и увеличение версии — один UPDATE, так что из двух
+одновременных правок пройдёт ровно одна.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .models import Post
+
+
+class EditConflict(Exception):
+    """Пост изменили после того, как автор открыл форму."""
+
+
+def save_changes(form, version):
+    """Сохраняет изменённые поля поста и возвращает их список."""
+    changed = [name for name in form.changed_data if name in form.fields]
+    if not changed:
+        return []
+    post = form.save(commit=False)
+    posts = Post.objects.using(post._state.db)
+    with transaction.atomic(using=post._state.db):
+        claimed = posts.filter(pk=post.pk, version=version).update(
+            version=F('version') + 1)
+        if not claimed:
+            raise EditConflict
+        post.version = version + 1
+        post.save(update_fields=changed)
+    return changed
@@ -0,0 +1,233 @@
+"""Личная лента: посты авторов и сообществ, на которые подписан пользователь.
+
+Каждый источник (автор или сообщество) — отсортированный курсор по
+(pub_date, id), который читает посты пачками по размеру страницы.
+Курсоры сливаются кучей: в куче лежат посты и ещё не открытые
+источники с ключом «голова» — датой самого нового поста источника.
+Источник открывается, только когда его голова поднимается на вершину
+кучи, и вместе с ним одним запросом открываются ближайшие источники
+того же вида (не больше размера страницы за раз). Пост, пришедший и
+от автора, и от сообщества, выводится один раз.
+
+Головы хранятся в самих подписках (Follow.head, GroupSubscription.head)
+с индексом (user, -head), и подписки читаются в порядке голов пачками
+по размеру страницы, только когда куча до них доходит. Новый пост
+поднимает головы подписок на своего автора и сообщество, а удаление их
+не опускает: голова — оценка сверху, и источник с устаревшей головой
+просто открывается раньше. Поэтому страница не читает все подписки и
+число запросов на неё ограничено её размером, а не числом подписок.
+
+Страницы листаются курсором «старше поста (pub_date, id)», а не номером
+страницы: номер заставил бы сливать все предыдущие страницы. Головы
+источников, новее курсора, считаются равными ему: такие источники
+открываются первыми, пачками по размеру страницы (при точных головах их
+не больше, чем постов выше курсора).
+"""
+import heapq
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from itertools import count
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Max, Q
+
+from . import sharding
+from .models import Follow, GroupSubscription, Post
+
+AUTHOR = 'author'
+GROUP = 'group'
+# Подписки на источники каждого вида
+SUBSCRIPTIONS = {AUTHOR: Follow, GROUP: GroupSubscription}
+MORE = 'more'
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def raise_heads(post):
+    """Поднимает головы подписок на автора и сообщество нового поста."""
+    for kind, pk in ((AUTHOR, post.author_id), (GROUP, post.group_id)):
+        if pk:
+            SUBSCRIPTIONS[kind].objects.filter(
+                Q(head__lt=post.pub_date) | Q(head=None),
+                **{f'{kind}_id': pk},
+            ).update(head=post.pub_date)
+
+
+def _older(cursor):
+    pub_date, pk = cursor
+    return Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+
+
+def load_heads(kind, ids):
+    """Дата самого нового поста каждого источника ids или None."""
+    heads = dict.fromkeys(ids)
+    field = f'{kind}_id'
+    for alias in sharding.shards():
+        rows = Post.objects.using(alias).filter(
+            **{f'{field}__in': ids}
+        ).order_by().values(field).annotate(
+            head=Max('pub_date')).values_list(field, 'head')
+        for pk, head in rows:
+            if heads[pk] is None or head > heads[pk]:
+                heads[pk] = head
+    return heads
+
+
+def fill_head(subscription):
+    """Голова новой подписки по постам её источника."""
+    kind = AUTHOR if isinstance(subscription, Follow) else GROUP
+    pk = getattr(subscription, f'{kind}_id')
+    subscription.head = load_heads(kind, [pk])[pk]
+
+
+def refresh_heads(author_ids=(), group_ids=()):
+    """Пересчитывает головы подписок на источники по их постам.
+
+    Нужен после массовых операций, которые переносят посты между
+    источниками в обход сигналов.
+    """
+    for kind, ids in ((AUTHOR, author_ids), (GROUP, group_ids)):
+        ids = [pk for pk in set(ids) if pk]
+        if not ids:
+            continue
+        by_head = defaultdict(list)
+        for pk, head in load_heads(kind, ids).items():
+            by_head[head].append(pk)
+        for head, pks in by_head.items():
+            SUBSCRIPTIONS[kind].objects.filter(
+                **{f'{kind}_id__in': pks}).update(head=head)
+
+
+def _subscriptions(user, kind, size):
+    """(id, голова) источников user по убыванию головы, пачками по size."""
+    field = f'{kind}_id'
+    rows = SUBSCRIPTIONS[kind].objects.filter(
+        user=user, head__isnull=False
+    ).order_by('-head', f'-{field}').values_list(field, 'head')
+    batch = list(rows[:size])
+    while batch:
+        yield batch
+        if len(batch) < size:
+            return
+        pk, head = batch[-1]
+        batch = list(rows.filter(
+            Q(head__lt=head) | Q(head=head, **{f'{field}__lt': pk}))[:size])
+
+
+def encode_cursor(post):
+    return f'{(post.pub_date - EPOCH) // MICROSECOND}_{post.pk}'
+
+
+def decode_cursor(value):
+    """(pub_date, id) из строки курсора или None."""
+    micros, _, pk = (value or '').partition('_')
+    if not (micros.isdigit() and pk.isdigit()):
+        return None
+    return EPOCH + int(micros) * MICROSECOND, int(pk)
+
+
+def _key(pub_date, pk):
+    # heapq — куча минимумов, а выводить надо от новых к старым
+    return (-((pub_date - EPOCH) // MICROSECOND), -pk)
+
+
+def _fetch(kind, ids, cursor, size):
+    """Первые size постов, общих для источников ids, старше cursor."""
+    posts = Post.objects.visible().previews().select_related(
+        'author', 'group')
+    if cursor is not None:
+        posts = posts.filter(_older(cursor))
+    posts = posts.order_by('-pub_date', '-pk')
+    if kind == AUTHOR:
+        posts = sharding.scatter(posts.filter(author_id__in=ids), ids)
+    else:
+        posts = sharding.scatter(posts.filter(group_id__in=ids))
+    return list(posts[:size])
+
+
+def _same_source(entry, kind, cursor):
+    item = entry[2]
+    return (
+        not isinstance(item, Post) and item[0] == kind and item[2] == cursor)
+
+
+def _push(heap, order, key, item):
+    heapq.heappush(heap, (key, next(order), item))
+
+
+def _head_key(head, cursor):
+    # Источник открывается раньше постов той же даты; голова новее
+    # курсора ничего не говорит о постах старше него
+    if cursor is not None and head > cursor[0]:
+        head = cursor[0]
+    return _key(head, float('inf'))
+
+
+def _more(heap, order, kind, batches, cursor):
+    """Кладёт в кучу следующую пачку подписок вида kind."""
+    batch = next(batches, None)
+    if batch is None:
+        return
+    for pk, head in batch:
+        _push(heap, order, _head_key(head, cursor), (kind, (pk,), cursor))
+    # Головы остальных подписок не новее последней в пачке
+    _push(
+        heap, order, _head_key(batch[-1][1], cursor),
+        (MORE, kind, batches))
+
+
+def _open(heap, order, source, size):
+    """Читает источник и ближайшие к нему того же вида одним запросом.
+
+    Открыть источник раньше очереди не страшно — его посты просто встают
+    в кучу, — а куча держит не больше нескольких пачек подписок и
+    постов, поэтому её просмотр ограничен размером страницы.
+    """
+    kind, ids, after = source
+    ids = set(ids)
+    joined = heapq.nsmallest(
+        size - len(ids),
+        (entry for entry in heap if _same_source(entry, kind, after)))
+    if joined:
+        for entry in joined:
+            ids.update(entry[2][1])
+        taken = {entry[1] for entry in joined}
+        heap[:] = [entry for entry in heap if entry[1] not in taken]
+        heapq.heapify(heap)
+    posts = _fetch(kind, ids, after, size)
+    for post in posts:
+        _push(heap, order, _key(post.pub_date, post.pk), post)
+    if len(posts) == size:
+        # Продолжение источников встаёт сразу за их последним постом
+        last = posts[-1]
+        _push(
+            heap, order, _key(last.pub_date, last.pk),
+            (kind, ids, (last.pub_date, last.pk)))
+
+
+def read(user, cursor=None, size=10):
+    """Страница ленты user из size постов старше cursor.
+
+    Возвращает Page; курсор следующей страницы — в page.next_cursor.
+    """
+    heap = []
+    order = count()
+    for kind in SUBSCRIPTIONS:
+        _more(heap, order, kind, _subscriptions(user, kind, size), cursor)
+    posts, seen = [], set()
+    while heap and len(posts) < size:
+        _, _, item = heapq.heappop(heap)
+        if isinstance(item, Post):
+            if item.pk not in seen:
+                seen.add(item.pk)
+                posts.append(item)
+        elif item[0] == MORE:
+            _more(heap, order, item[1], item[2], cursor)
+        else:
+            _open(heap, order, item, size)
+    page = Page(posts, 1, Paginator(posts, size))
+    page.next_cursor = None
+    if len(posts) == size and heap:
+        page.next_cursor = encode_cursor(posts[-1])
+    return page
@@ -0,0 +1,126 @@
+"""Граф подписок в памяти процесса.
+
+Для пользователя хранится отсортированный массив id авторов, на которых
+он подписан, для автора — число подписчиков. Записи сверяются с версиями
+в кеше: сигналы Follow сбрасывают версии затронутых пользователей, и с
+общим кешем (Redis, Memcached) инвалидация видна всем процессам. При
+FOLLOW_GRAPH_SHARED = True в кеш кладутся и сами массивы, чтобы процессы
+не строили их каждый заново.
+"""
+import threading
+import uuid
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Follow
+
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+
+_lock = threading.Lock()
+_local = {FOLLOWING: OrderedDict(), FOLLOWERS: OrderedDict()}
+
+
+def _version_key(kind, pk):
+    return f'follow_graph:{kind}:{pk}:version'
+
+
+def _data_key(kind, pk):
+    return f'follow_graph:{kind}:{pk}'
+
+
+def invalidate(user_id, author_id):
+    cache.delete_many([
+        _version_key(FOLLOWING, user_id),
+        _version_key(FOLLOWERS, author_id),
+    ])
+
+
+def _versions(kind, ids):
+    keys = {_version_key(kind, pk): pk for pk in ids}
+    found = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    for key in missing:
+        cache.add(key, uuid.uuid4().hex, None)
+    if missing:
+        found.update(cache.get_many(missing))
+    return {pk: found.get(key) for key, pk in keys.items()}
+
+
+def _load_following(user_ids):
+    following = {pk: array('q') for pk in user_ids}
+    rows = Follow.objects.filter(user_id__in=user_ids).order_by(
+        'author_id').values_list('user_id', 'author_id')
+    for user_id, author_id in rows:
+        following[user_id].append(author_id)
+    return following
+
+
+def _load_followers(author_ids):
+    counts = dict.fromkeys(author_ids, 0)
+    counts.update(
+        Follow.objects.filter(author_id__in=author_ids)
+        .values('author_id')
+        .annotate(count=Count('pk'))
+        .values_list('author_id', 'count')
+    )
+    return counts
+
+
+def _lookup(kind, ids, load):
+    versions = _versions(kind, ids)
+    local = _local[kind]
+    result = {}
+    with _lock:
+        for pk in ids:
+            entry = local.get(pk)
+            if entry is not None and entry[0] == versions[pk]:
+                result[pk] = entry[1]
+                local.move_to_end(pk)
+    stale = [pk for pk in ids if pk not in result]
+    if stale and settings.FOLLOW_GRAPH_SHARED:
+        shared = cache.get_many([_data_key(kind, pk) for pk in stale])
+        for pk in stale:
+            entry = shared.get(_data_key(kind, pk))
+            if entry is not None and entry[0] == versions[pk]:
+                result[pk] = entry[1]
+    loaded = load([pk for pk in stale if pk not in result])
+    if loaded and settings.FOLLOW_GRAPH_SHARED:
+        cache.set_many({
+            _data_key(kind, pk): (versions[pk], value)
+            for pk, value in loaded.items()
+        })
+    result.update(loaded)
+    with _lock:
+        for pk in stale:
+            local[pk] = (versions[pk], result[pk])
+        while len(local) > settings.FOLLOW_GRAPH_SIZE:
+            local.popitem(last=False)
+    return result
+
+
+def following_ids(user):
+    """Отсортированный массив id авторов, на которых подписан user."""
+    return _lookup(FOLLOWING, [user.pk], _load_following)[user.pk]
+
+
+def follows(user, author_ids):
+    """Подписан ли user на каждого из авторов: {author_id: bool}."""
+    if not user.is_authenticated:
+        return dict.fromkeys(author_ids, False)
+    following = following_ids(user)
+    result = {}
+    for pk in author_ids:
+        index = bisect_left(following, pk)
+        result[pk] = index < len(following) and following[index] == pk
+    return result
+
+
+def follower_counts(author_ids):
+    """Число подписчиков каждого из авторов: {author_id: int}."""
+    return _lookup(FOLLOWERS, list(author_ids), _load_followers)
@@ -1,15 +1,80 @@
 from django import forms
+from django.contrib.auth import get_user_model
+from django.utils.datastructures import MultiValueDict
 
-from .models import Post, Comment
+from core import uploads
+from .models import Post, Comment, Group
+
+User = get_user_model()
 
 
 class PostForm(forms.ModelForm):
+    """Форма поста.
+
+    Картинку можно загрузить заранее частями (core.uploads) и передать
+    токен загрузки в поле upload запроса вместо самого файла.
+    """
+
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, data=None, files=None, *args, user=None, **kwargs):
+        self.upload_token = data.get('upload', '') if data else ''
+        self.upload = None
+        if self.upload_token and not (files and files.get('image')):
+            self.upload = uploads.finished(self.upload_token, user)
+            if self.upload is not None:
+                files = files.copy() if files else MultiValueDict()
+                files['image'] = uploads.as_file(self.upload)
+        super().__init__(data, files, *args, **kwargs)
+
+    def clean(self):
+        if self.upload_token and self.upload is None and not (
+                self.files.get('image')):
+            raise forms.ValidationError(
+                'Загрузка картинки не найдена или ещё не завершена.')
+        return super().clean()
+
+    def close_upload(self):
+        """Закрывает файл загрузки, если его открывали; загрузка остаётся."""
+        if self.upload is not None:
+            self.files['image'].close()
+
+    def release_upload(self):
+        """Удаляет использованную загрузку после сохранения поста."""
+        if self.upload is not None:
+            self.close_upload()
+            uploads.discard(self.upload)
+            self.upload = None
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ['text']
+
+
+class BulkRegroupForm(forms.Form):
+    group = forms.ModelChoiceField(
+        queryset=Group.objects.all(),
+        required=False,
+        label='Новая группа',
+        help_text='Оставьте пустым, чтобы убрать посты из группы.',
+    )
+
+
+class BulkReassignForm(forms.Form):
+    author = forms.CharField(label='Имя пользователя нового автора')
+
+    def clean_author(self):
+        username = self.cleaned_data['author']
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise forms.ValidationError(
+                f'Пользователь {username} не найден.')
+
+
+class BulkDeleteForm(forms.Form):
+    pass
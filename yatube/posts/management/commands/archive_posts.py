@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import jobs
+from posts import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит старые посты с комментариями в архив. Запускается по '
+        'расписанию (cron); по умолчанию архивирует посты старше '
+        'ARCHIVE_AFTER_DAYS дней.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, help='Архивировать посты старше N дней')
+
+    def handle(self, *args, days, **options):
+        before = None
+        if days is not None:
+            before = timezone.now() - timedelta(days=days)
+        job = jobs.run(
+            archive.start_archive(before, background=False),
+            report=self.report)
+        self.stdout.write(f'{job}: {job.get_status_display()}')
+
+    def report(self, job):
+        self.stdout.write(f'{job}: {job.done}/{job.total}')
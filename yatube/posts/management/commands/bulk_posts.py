@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import jobs
+from posts import bulk
+from posts.models import Group
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Массово переносит посты в группу, меняет автора или удаляет их. '
+        'Посты выбираются фильтрами --author, --group и --before.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'operation', choices=('regroup', 'reassign', 'delete'))
+        parser.add_argument('--author', help='Имя пользователя автора')
+        parser.add_argument('--group', help='Слаг группы')
+        parser.add_argument(
+            '--before', help='Только посты, опубликованные до даты')
+        parser.add_argument(
+            '--to-group', help='Слаг новой группы, пусто — без группы')
+        parser.add_argument('--to-author', help='Имя нового автора')
+
+    def handle(self, *args, operation, **options):
+        filters = {}
+        if options['author']:
+            filters['author__username'] = options['author']
+        if options['group']:
+            filters['group__slug'] = options['group']
+        if options['before']:
+            filters['pub_date__lt'] = options['before']
+        selection = {'filters': filters}
+        try:
+            if operation == 'regroup':
+                group = options['to_group'] and Group.objects.get(
+                    slug=options['to_group'])
+                job = bulk.start_regroup(
+                    selection, group or None, background=False)
+            elif operation == 'reassign':
+                if not options['to_author']:
+                    raise CommandError('Укажите --to-author.')
+                job = bulk.start_reassign(
+                    selection,
+                    User.objects.get(username=options['to_author']),
+                    background=False,
+                )
+            else:
+                job = bulk.start_delete(selection, background=False)
+        except (Group.DoesNotExist, User.DoesNotExist,
+                bulk.BulkError) as error:
+            raise CommandError(error)
+        job = jobs.run(job, report=self.report)
+        self.stdout.write(f'{job}: {job.get_status_display()}')
+
+    def report(self, job):
+        self.stdout.write(f'{job}: {job.done}/{job.total}')
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from core.images import dominant_colour
+from posts import sharding
+from posts.models import ArchivedPost, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает цвет заглушки для картинок постов, сохранённых до его '
+        'появления. Картинки читаются пачками по --chunk-size.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=100,
+            help='Сколько постов обрабатывать за раз')
+
+    def handle(self, *args, chunk_size, **options):
+        for alias in sharding.shards():
+            for model in (Post, ArchivedPost):
+                done = self.fill(
+                    model.objects.using(alias).exclude(image='').filter(
+                        placeholder=''),
+                    chunk_size)
+                self.stdout.write(f'{alias}: {model.__name__}: {done}')
+
+    def fill(self, queryset, chunk_size):
+        model, alias = queryset.model, queryset.db
+        last, done = 0, 0
+        while True:
+            posts = list(queryset.filter(pk__gt=last).order_by('pk').only(
+                'pk', 'image')[:chunk_size])
+            if not posts:
+                return done
+            last = posts[-1].pk
+            for post in posts:
+                post.placeholder = dominant_colour(post.image)
+            model.objects.using(alias).bulk_update(posts, ['placeholder'])
+            done += len(posts)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core import prerender
+from posts.prerender import hot_urls
+
+
+class Command(BaseCommand):
+    help = (
+        'Рендерит горячие страницы для анонимных посетителей и удаляет '
+        'остальные. С --pending перерисовывает только страницы, '
+        'отмеченные сигналами; так команда запускается по расписанию '
+        '(cron) раз в минуту.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending', action='store_true',
+            help='Только страницы, ждущие перерисовки')
+
+    def handle(self, *args, pending, **options):
+        if pending:
+            written = prerender.publish_pending()
+        else:
+            written = prerender.publish_all(hot_urls())
+        self.stdout.write(f'Готово страниц: {written}')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts import syndication
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает все карты сайта и ленты Atom/RSS и удаляет '
+        'устаревшие файлы. С --pending пересобирает только файлы, '
+        'отмеченные сигналами; так команда запускается по расписанию '
+        '(cron) раз в минуту.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending', action='store_true',
+            help='Только файлы, ждущие пересборки')
+
+    def handle(self, *args, pending, **options):
+        if pending:
+            written = syndication.publish_pending()
+        else:
+            written = syndication.publish_all()
+        self.stdout.write(f'Записано файлов: {written}')
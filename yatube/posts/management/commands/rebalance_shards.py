@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core import jobs
+from posts import rebalance, sharding
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит посты, созданные до шардирования, вместе с комментариями '
+        'в шарды их авторов (см. posts.rebalance). Запускается один раз '
+        'после того, как в POST_SHARDS добавлены шарды.'
+    )
+
+    def handle(self, *args, **options):
+        job = jobs.run(
+            rebalance.start_rebalance(background=False), report=self.report)
+        sharding.recheck_rebalanced()
+        self.stdout.write(f'{job}: {job.get_status_display()}')
+
+    def report(self, job):
+        self.stdout.write(f'{job}: {job.done}/{job.total}')
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import feed
+
+
+def _chunks(queryset, field, size):
+    ids = queryset.order_by(field).values_list(field, flat=True).distinct()
+    last = 0
+    while True:
+        chunk = list(ids.filter(**{f'{field}__gt': last})[:size])
+        if not chunk:
+            return
+        last = chunk[-1]
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает головы подписок личной ленты по постам всех '
+        'шардов, например после подключения шардов к существующей базе.'
+    )
+
+    def handle(self, *args, **options):
+        for kind, model in feed.SUBSCRIPTIONS.items():
+            done = 0
+            for ids in _chunks(
+                    model.objects.all(), f'{kind}_id',
+                    settings.BULK_CHUNK_SIZE):
+                feed.refresh_heads(**{f'{kind}_ids': ids})
+                done += len(ids)
+            self.stdout.write(f'{model.__name__}: {done}')
@@ -0,0 +1,43 @@
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import sharding, text
+from posts.models import ArchivedComment, ArchivedPost, Comment, Post
+
+
+def _missing(model):
+    return reduce(or_, (
+        Q(**{field: ''}) for field in model.rendered_fields
+        if field.endswith('_html')))
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет готовый HTML текста постов и комментариев и начала '
+        'постов для записей, сохранённых до его появления. Тексты '
+        'рендерятся параллельно в нескольких процессах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int,
+            help='Число процессов (по умолчанию — число ядер)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Сколько записей рендерит процесс за раз')
+        parser.add_argument(
+            '--all', action='store_true', dest='rerender',
+            help='Перерендерить и уже заполненные записи')
+
+    def handle(self, *args, workers, chunk_size, rerender, **options):
+        for alias in sharding.shards():
+            for model in (Post, Comment, ArchivedPost, ArchivedComment):
+                rows = model.objects.using(alias).all()
+                if not rerender:
+                    rows = rows.filter(_missing(model))
+                done = text.backfill(rows, workers, chunk_size)
+                self.stdout.write(
+                    f'{alias}: {model.__name__}: {done}')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core import jobs
+from posts import digest
+
+
+class Command(BaseCommand):
+    help = (
+        'Рассылает подписчикам дайджест новых постов. Запускается по '
+        'расписанию (cron) раз в DIGEST_PERIOD; прерванная рассылка '
+        'продолжается с контрольной точки, новая берёт посты с конца окна '
+        'предыдущей.'
+    )
+
+    def handle(self, *args, **options):
+        job = digest.unfinished()
+        if job is not None:
+            self.stdout.write(
+                f'{job}: продолжение с подписчика {job.checkpoint or 0}')
+            job = jobs.resume(job, report=self.report)
+        elif digest.in_progress():
+            self.stdout.write('Рассылка уже выполняется.')
+            return
+        else:
+            job = jobs.run(
+                digest.start_digest(background=False), report=self.report)
+        self.stdout.write(f'{job}: {job.get_status_display()}')
+
+    def report(self, job):
+        self.stdout.write(f'{job}: {job.done}/{job.total}')
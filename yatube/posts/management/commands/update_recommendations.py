@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core import jobs
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации авторов по подпискам и комментариям. '
+        'Запускается по расписанию (cron).'
+    )
+
+    def handle(self, *args, **options):
+        job = jobs.run(
+            recommendations.start_rebuild(background=False),
+            report=self.report)
+        self.stdout.write(f'{job}: {job.get_status_display()}')
+
+    def report(self, job):
+        self.stdout.write(f'{job}: {job.done}/{job.total}')
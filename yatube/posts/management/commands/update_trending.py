@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет затухшие рейтинги и пересобирает ленту популярного. '
+        'Запускается по расписанию (cron).'
+    )
+
+    def handle(self, *args, **options):
+        pruned = trending.prune()
+        post_ids = trending.refresh()
+        self.stdout.write(
+            f'Удалено рейтингов: {pruned}, в ленте постов: {len(post_ids)}')
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_post_views_trendingscore'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='pub_date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата публикации'),
+        ),
+    ]
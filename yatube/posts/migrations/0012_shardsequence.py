@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardSequence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Модель')),
+                ('last', models.PositiveIntegerField(default=0, verbose_name='Последний выданный номер')),
+            ],
+            options={
+                'verbose_name': 'Последовательность шарда',
+                'verbose_name_plural': 'Последовательности шардов',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0013_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupSubscription',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='posts.Group', verbose_name='Сообщество')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_subscriptions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Подписка на сообщество',
+                'verbose_name_plural': 'Подписки на сообщества',
+                'unique_together': {('user', 'group')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0014_groupsubscription'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('similar', models.TextField(blank=True, verbose_name='Похожие авторы')),
+                ('suggested', models.TextField(blank=True, verbose_name='Предложенные авторы')),
+            ],
+            options={
+                'verbose_name': 'Рекомендация',
+                'verbose_name_plural': 'Рекомендации',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_recommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedcomment',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML текста'),
+        ),
+        migrations.AddField(
+            model_name='archivedpost',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML текста'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML текста'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML текста'),
+        ),
+    ]
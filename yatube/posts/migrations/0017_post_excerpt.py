@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_text_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedpost',
+            name='excerpt_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML начала текста'),
+        ),
+        migrations.AddField(
+            model_name='archivedpost',
+            name='has_more',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Текст длиннее начала'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML начала текста'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='has_more',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Текст длиннее начала'),
+        ),
+    ]
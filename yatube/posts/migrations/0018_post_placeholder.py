@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_excerpt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedpost',
+            name='placeholder',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Цвет заглушки картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='placeholder',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Цвет заглушки картинки'),
+        ),
+    ]
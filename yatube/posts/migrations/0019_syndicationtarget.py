@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_placeholder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyndicationTarget',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20, verbose_name='Вид файла')),
+                ('key', models.CharField(max_length=200, verbose_name='Ключ')),
+            ],
+            options={
+                'verbose_name': 'Файл на пересборку',
+                'verbose_name_plural': 'Файлы на пересборку',
+                'unique_together': {('kind', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:16
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_heads(apps, schema_editor):
+    """Головы подписок по постам той же базы; шарды — refresh_feed_heads."""
+    alias = schema_editor.connection.alias
+    Post = apps.get_model('posts', 'Post')
+    for name, field in (
+            ('Follow', 'author_id'), ('GroupSubscription', 'group_id')):
+        model = apps.get_model('posts', name)
+        model.objects.using(alias).update(head=Subquery(
+            Post.objects.using(alias).filter(
+                **{field: OuterRef(field)}
+            ).order_by('-pub_date').values('pub_date')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_syndicationtarget'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='follow',
+            name='head',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последний пост автора'),
+        ),
+        migrations.AddField(
+            model_name='groupsubscription',
+            name='head',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последний пост сообщества'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['user', '-head'], name='follow_user_head'),
+        ),
+        migrations.AddIndex(
+            model_name='groupsubscription',
+            index=models.Index(fields=['user', '-head'], name='group_subscription_user_head'),
+        ),
+        migrations.RunPython(fill_heads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:19
+
+from django.db import migrations
+
+from posts.text import render_fields
+
+FIELDS = ('excerpt_html', 'has_more')
+CHUNK_SIZE = 500
+
+
+def fill_excerpts(apps, schema_editor):
+    """Начала постов, сохранённых до появления excerpt_html."""
+    alias = schema_editor.connection.alias
+    for name in ('Post', 'ArchivedPost'):
+        model = apps.get_model('posts', name)
+        rows = model.objects.using(alias).filter(excerpt_html='')
+        last = 0
+        while True:
+            chunk = list(rows.filter(pk__gt=last).order_by('pk').values_list(
+                'pk', 'text')[:CHUNK_SIZE])
+            if not chunk:
+                break
+            last = chunk[-1][0]
+            model.objects.using(alias).bulk_update(
+                [
+                    model(pk=pk, **render_fields(FIELDS, text))
+                    for pk, text in chunk
+                ],
+                FIELDS,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_feed_heads'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
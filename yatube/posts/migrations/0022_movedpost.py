@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_fill_excerpts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovedPost',
+            fields=[
+                ('old_id', models.PositiveIntegerField(primary_key=True, serialize=False, verbose_name='Прежний id')),
+                ('new_id', models.PositiveIntegerField(verbose_name='Новый id')),
+            ],
+            options={
+                'verbose_name': 'Перенесённый пост',
+                'verbose_name_plural': 'Перенесённые посты',
+            },
+        ),
+    ]
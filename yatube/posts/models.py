@@ -1,6 +1,11 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import models, router
 from django.contrib.auth import get_user_model
 
+from core.images import dominant_colour
+from .text import RenderedText
+
 User = get_user_model()
 
 
@@ -21,13 +26,93 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class ShardedQuerySet(models.QuerySet):
+    def create(self, **kwargs):
+        """Без явного using база выбирается по самой записи.
+
+        Шард поста или комментария известен только по его полям
+        (см. posts.sharding), поэтому роутеру передаётся экземпляр.
+        """
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """Как save(), заполняет готовый HTML текста (см. posts.text).
+
+        Без явного using записи, как и при save(), раскладываются по
+        шардам и получают id своего шарда.
+        """
+        # posts.sharding импортирует модели
+        from . import sharding
+
+        objs = list(objs)
+        for obj in objs:
+            obj.render_text()
+        if self._db is not None or not sharding.is_sharded():
+            return super().bulk_create(objs, *args, **kwargs)
+        by_shard = defaultdict(list)
+        for obj in objs:
+            alias = router.db_for_write(self.model, instance=obj)
+            if obj.pk is None:
+                obj.pk = sharding.next_id(self.model, alias)
+            by_shard[alias].append(obj)
+        for alias, part in by_shard.items():
+            self.using(alias).bulk_create(part, *args, **kwargs)
+        return objs
+
+
+class PostQuerySet(ShardedQuerySet):
+    def visible(self):
+        """Посты без аккаунтов на удалении: они скрываются сразу."""
+        return self.filter(author__pending_removal__isnull=True)
+
+    def previews(self):
+        """Посты для лент: без полного текста, только с его началом."""
+        return self.defer('text', 'text_html')
+
+    def search(self, term):
+        """Поиск админки: «#123» — по id, «@username» — по автору.
+
+        Иначе в тексте поста должно встречаться каждое слово term.
+        """
+        if term.startswith('#') and term[1:].isdigit():
+            return self.filter(pk=int(term[1:]))
+        if term.startswith('@') and len(term) > 1:
+            return self.filter(author__username=term[1:])
+        posts = self
+        for word in term.split():
+            posts = posts.filter(text__icontains=word)
+        return posts
+
+
+class Post(RenderedText, models.Model):
+    rendered_fields = ('text_html', 'excerpt_html', 'has_more')
+
     text = models.TextField(
         verbose_name='Запись'
     )
+    text_html = models.TextField(
+        'HTML текста',
+        blank=True,
+        editable=False,
+    )
+    excerpt_html = models.TextField(
+        'HTML начала текста',
+        blank=True,
+        editable=False,
+    )
+    has_more = models.BooleanField(
+        'Текст длиннее начала',
+        default=False,
+        editable=False,
+    )
     pub_date = models.DateTimeField(
         auto_now_add=True,
-        verbose_name='Дата публикации'
+        verbose_name='Дата публикации',
+        db_index=True,
     )
     author = models.ForeignKey(
         User,
@@ -48,17 +133,54 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    placeholder = models.CharField(
+        'Цвет заглушки картинки',
+        max_length=7,
+        blank=True,
+        editable=False,
+    )
+    views = models.PositiveIntegerField(
+        'Просмотры',
+        default=0,
+        editable=False,
+    )
+    version = models.PositiveIntegerField(
+        'Версия',
+        default=1,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'image' in update_fields:
+            self.update_placeholder()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'placeholder'}
+        super().save(*args, **kwargs)
+
+    def update_placeholder(self):
+        """Цвет заглушки для новой картинки (см. core.images).
+
+        Картинка декодируется, только пока загрузка не сохранена; цвет
+        старых постов заполняет команда fill_placeholders.
+        """
+        if not self.image:
+            self.placeholder = ''
+        elif not self.image._committed:
+            self.placeholder = dominant_colour(self.image)
+
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ('-pub_date',)
 
 
-class Comment(models.Model):
+class Comment(RenderedText, models.Model):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -74,16 +196,125 @@ class Comment(models.Model):
     text = models.TextField(
         verbose_name='Коментарий'
     )
+    text_html = models.TextField(
+        'HTML текста',
+        blank=True,
+        editable=False,
+    )
     created = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Создан'
     )
 
+    objects = ShardedQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
 
+class ArchivedPost(RenderedText, models.Model):
+    """Пост, перенесённый из Post в архив (см. posts.archive).
+
+    Поля повторяют Post, id сохраняется, так что адрес поста не
+    меняется. Архивные посты только читаются.
+    """
+    is_archived = True
+    rendered_fields = ('text_html', 'excerpt_html', 'has_more')
+
+    text = models.TextField(
+        verbose_name='Запись'
+    )
+    text_html = models.TextField(
+        'HTML текста',
+        blank=True,
+        editable=False,
+    )
+    excerpt_html = models.TextField(
+        'HTML начала текста',
+        blank=True,
+        editable=False,
+    )
+    has_more = models.BooleanField(
+        'Текст длиннее начала',
+        default=False,
+        editable=False,
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+        db_index=True,
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_posts',
+        verbose_name='Автор',
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        related_name='archived_posts',
+        verbose_name='Сообщество',
+        blank=True,
+        null=True,
+    )
+    image = models.ImageField(
+        'Картинка',
+        upload_to='posts/',
+        blank=True
+    )
+    placeholder = models.CharField(
+        'Цвет заглушки картинки',
+        max_length=7,
+        blank=True,
+        editable=False,
+    )
+    views = models.PositiveIntegerField(
+        'Просмотры',
+        default=0,
+    )
+
+    objects = PostQuerySet.as_manager()
+
+    def __str__(self):
+        return self.text
+
+    class Meta:
+        verbose_name = 'Архивный пост'
+        verbose_name_plural = 'Архивные посты'
+        ordering = ('-pub_date',)
+
+
+class ArchivedComment(RenderedText, models.Model):
+    post = models.ForeignKey(
+        ArchivedPost,
+        on_delete=models.CASCADE,
+        related_name='comments',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_comments',
+        verbose_name='Автор'
+    )
+    text = models.TextField(
+        verbose_name='Коментарий'
+    )
+    text_html = models.TextField(
+        'HTML текста',
+        blank=True,
+        editable=False,
+    )
+    created = models.DateTimeField(
+        verbose_name='Создан'
+    )
+
+    class Meta:
+        verbose_name = 'Архивный комментарий'
+        verbose_name_plural = 'Архивные комментарии'
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -95,7 +326,146 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following',
         verbose_name='Автор')
+    head = models.DateTimeField(
+        'Последний пост автора',
+        null=True,
+        blank=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        indexes = [
+            models.Index(fields=['user', '-head'], name='follow_user_head'),
+        ]
+
+
+class GroupSubscription(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='group_subscriptions',
+        verbose_name='Пользователь')
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='subscriptions',
+        verbose_name='Сообщество')
+    head = models.DateTimeField(
+        'Последний пост сообщества',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
+    class Meta:
+        verbose_name = 'Подписка на сообщество'
+        verbose_name_plural = 'Подписки на сообщества'
+        unique_together = ('user', 'group')
+        indexes = [
+            models.Index(
+                fields=['user', '-head'], name='group_subscription_user_head'),
+        ]
+
+
+class TrendingScore(models.Model):
+    """Затухающий рейтинг поста для ленты популярного.
+
+    Хранится как log2 суммы весов событий, приведённых к эпохе
+    posts.trending.EPOCH, поэтому порядок по полю hot совпадает
+    с порядком по текущему затухшему рейтингу.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Пост',
+    )
+    hot = models.FloatField(
+        'Рейтинг',
+        default=0,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг поста'
+        verbose_name_plural = 'Рейтинги постов'
+
+
+class ShardSequence(models.Model):
+    """Последовательность id записей в шарде (см. posts.sharding)."""
+    name = models.CharField(
+        'Модель',
+        max_length=100,
+        unique=True,
+    )
+    last = models.PositiveIntegerField(
+        'Последний выданный номер',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Последовательность шарда'
+        verbose_name_plural = 'Последовательности шардов'
+
+
+class MovedPost(models.Model):
+    """Пост, перенесённый в свой шард под новым id (см. posts.rebalance).
+
+    По прежнему адресу страница поста перенаправляет на новый.
+    """
+    old_id = models.PositiveIntegerField(
+        'Прежний id',
+        primary_key=True,
+    )
+    new_id = models.PositiveIntegerField('Новый id')
+
+    class Meta:
+        verbose_name = 'Перенесённый пост'
+        verbose_name_plural = 'Перенесённые посты'
+
+
+class Recommendation(models.Model):
+    """Рекомендованные авторы пользователя (см. posts.recommendations).
+
+    Списки id через запятую в порядке убывания похожести: similar —
+    авторы, похожие на пользователя как на автора, suggested — авторы,
+    которых стоит предложить ему как читателю.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='recommendation',
+        verbose_name='Пользователь',
+    )
+    similar = models.TextField('Похожие авторы', blank=True)
+    suggested = models.TextField('Предложенные авторы', blank=True)
+
+    class Meta:
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+
+
+class SyndicationTarget(models.Model):
+    """Файл posts.syndication, ждущий пересборки.
+
+    Сигналы только отмечают файлы, а пересобирает их команда
+    publish_feeds --pending, поэтому частые правки одного автора или
+    группы пересобирают файл один раз за запуск.
+    """
+    kind = models.CharField(
+        'Вид файла',
+        max_length=20,
+    )
+    key = models.CharField(
+        'Ключ',
+        max_length=200,
+    )
+
+    class Meta:
+        verbose_name = 'Файл на пересборку'
+        verbose_name_plural = 'Файлы на пересборку'
+        unique_together = ('kind', 'key')
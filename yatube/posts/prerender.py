@@ -0,0 +1,80 @@
+"""Какие страницы постов держать готовыми для анонимных посетителей.
+
+Готовятся первые PRERENDER_INDEX_PAGES страниц главной, первые страницы
+PRERENDER_GROUPS самых больших групп и PRERENDER_POSTS популярных постов.
+Набор пересчитывает команда prerender_pages (cron), а сигналы постов,
+комментариев и групп отмечают затронутые страницы из этого набора, и
+их перерисовывает prerender_pages --pending.
+"""
+from django.conf import settings
+from django.urls import reverse
+
+from core import prerender
+from . import counters, sharding, trending
+from .models import Group
+
+
+def index_urls():
+    url = reverse('posts:index')
+    return [url] + [
+        f'{url}?page={page}'
+        for page in range(2, settings.PRERENDER_INDEX_PAGES + 1)
+    ]
+
+
+def group_url(slug):
+    return reverse('posts:group_list', args=[slug])
+
+
+def post_url(post_id):
+    return reverse('posts:post_detail', args=[post_id])
+
+
+def hot_urls():
+    groups = sharding.largest_groups(settings.PRERENDER_GROUPS)
+    posts = trending.ranking()[:settings.PRERENDER_POSTS]
+    return (
+        index_urls()
+        + [group_url(slug) for slug in groups]
+        + [post_url(pk) for pk in posts]
+    )
+
+
+def refresh_post(post):
+    # Без готовых страниц не тратим запрос на группу поста
+    if not prerender.published():
+        return
+    urls = index_urls() + [post_url(post.pk)]
+    if post.group_id:
+        urls.append(group_url(post.group.slug))
+    prerender.refresh(urls)
+
+
+def refresh_group(slug):
+    if not prerender.published():
+        return
+    prerender.refresh(index_urls() + [group_url(slug)])
+
+
+def refresh_posts(post_ids, group_ids=()):
+    """Отмечает страницы постов post_ids, их групп group_ids и главной."""
+    if not prerender.published():
+        return
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True)
+    prerender.refresh(
+        index_urls()
+        + [group_url(slug) for slug in slugs]
+        + [post_url(pk) for pk in post_ids]
+    )
+
+
+def refresh_comments(post_id):
+    if not prerender.published():
+        return
+    prerender.refresh([post_url(post_id)])
+
+
+@prerender.on_serve('posts:post_detail')
+def count_view(post_id):
+    counters.register_view(post_id)
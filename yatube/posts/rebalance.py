@@ -0,0 +1,122 @@
+"""Перенос постов, созданных до шардирования, в их шарды.
+
+posts.sharding ищет пост по id (id % N — номер шарда), а посты автора —
+в шарде автора. Посты, созданные до того, как в POST_SHARDS появились
+шарды, лежат в default с id из автоинкремента и обычно не там, где их
+ищут. Задача posts.rebalance (команда rebalance_shards) переносит их,
+горячие и архивные, вместе с комментариями и рейтингами в шард автора
+под новыми id. Прежний id остаётся в MovedPost, и страница поста по
+старому адресу перенаправляет на новый; картинки остаются на месте.
+
+Посты переносятся пачками по BULK_CHUNK_SIZE: новые id сначала
+записываются в MovedPost, затем пачка копируется в шард автора и
+удаляется из старого шарда. Скопированные посты при повторе не
+копируются ещё раз, так что прерванную задачу достаточно запустить
+снова. Пока задача не завершилась, posts.sharding ищет посты ещё и в
+default.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from core import jobs
+from . import bulk, sharding, trending
+from .models import Comment, MovedPost, Post, TrendingScore
+
+COMMENTS = dict(zip(sharding.POST_MODELS, sharding.COMMENT_MODELS))
+
+
+def _fields(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def misplaced(model, alias):
+    """Посты model в alias, которым место в другом шарде или под другим id."""
+    aliases = sharding.shards()
+    index = aliases.index(alias)
+    return model.objects.using(alias).annotate(
+        author_shard=F('author_id') % len(aliases),
+        id_shard=F('id') % len(aliases),
+    ).exclude(author_shard=index, id_shard=index)
+
+
+def _insert(model, source, target, rows, new_ids):
+    """Копирует посты rows из source в target с комментариями."""
+    existing = set(model.objects.using(target).filter(
+        pk__in=[new_ids[row['id']] for row in rows]).values_list(
+            'pk', flat=True))
+    rows = [row for row in rows if new_ids[row['id']] not in existing]
+    if not rows:
+        return
+    old_ids = [row['id'] for row in rows]
+    comment_model = COMMENTS[model]
+    comments = comment_model.objects.using(source).filter(
+        post_id__in=old_ids).values(*_fields(comment_model))
+    scores = TrendingScore.objects.using(source).filter(
+        post_id__in=old_ids).values_list('post_id', 'hot')
+    with transaction.atomic(using=target):
+        model.objects.using(target).bulk_create(
+            model(**{**row, 'id': new_ids[row['id']]}) for row in rows)
+        comment_model.objects.using(target).bulk_create(
+            comment_model(**{
+                **row,
+                'id': sharding.next_id(Comment, target),
+                'post_id': new_ids[row['post_id']],
+            })
+            for row in comments
+        )
+        if model is Post:
+            TrendingScore.objects.using(target).bulk_create(
+                TrendingScore(post_id=new_ids[post_id], hot=hot)
+                for post_id, hot in scores)
+
+
+def move_chunk(model, alias, post_ids):
+    """Переносит посты model из шарда alias в шарды их авторов."""
+    rows = list(model.objects.using(alias).filter(pk__in=post_ids).values(
+        *_fields(model)))
+    new_ids = dict(MovedPost.objects.filter(old_id__in=post_ids).values_list(
+        'old_id', 'new_id'))
+    fresh = [
+        MovedPost(old_id=row['id'], new_id=sharding.next_id(
+            Post, sharding.shard_for_author(row['author_id'])))
+        for row in rows if row['id'] not in new_ids
+    ]
+    MovedPost.objects.bulk_create(fresh)
+    new_ids.update((moved.old_id, moved.new_id) for moved in fresh)
+    by_target = defaultdict(list)
+    for row in rows:
+        by_target[sharding.shard_for_author(row['author_id'])].append(row)
+    for target, part in by_target.items():
+        _insert(model, alias, target, part, new_ids)
+    with transaction.atomic(using=alias):
+        model.objects.using(alias).filter(pk__in=post_ids).delete()
+    bulk.forget([
+        (pk, row['author_id'], row['group_id'])
+        for row in rows for pk in (row['id'], new_ids[row['id']])
+    ], deleted=True)
+
+
+@jobs.register(sharding.REBALANCE_JOB)
+def rebalance(job, shards):
+    parts = [
+        (model, alias)
+        for alias in sharding.shards() for model in sharding.POST_MODELS]
+    job.start(sum(misplaced(model, alias).count() for model, alias in parts))
+    for model, alias in parts:
+        posts = misplaced(model, alias).order_by('pk')
+        while True:
+            post_ids = list(posts.values_list(
+                'pk', flat=True)[:settings.BULK_CHUNK_SIZE])
+            if not post_ids:
+                break
+            move_chunk(model, alias, post_ids)
+            job.advance(len(post_ids))
+    trending.refresh()
+
+
+def start_rebalance(background=True):
+    create = jobs.enqueue if background else jobs.create
+    return create(sharding.REBALANCE_JOB, shards=list(sharding.shards()))
@@ -0,0 +1,274 @@
+"""Рекомендации авторов: «похожие авторы» и «вам могут понравиться».
+
+Подписки и комментарии загружаются в разреженные матрицы читатель ×
+автор в формате CSR. Похожесть двух авторов — косинус их столбцов:
+сколько читателей подписаны на обоих (или комментируют обоих),
+делённое на корень из произведения чисел их читателей. Произведение
+Aᵀ·A считается пачками по RECOMMENDATIONS_CHUNK_SIZE авторов, так что
+в памяти не бывает полной матрицы автор × автор.
+
+Читателю предлагаются авторы, похожие на тех, на кого он подписан,
+кроме уже подписанных и его самого. Для каждого пользователя храним
+RECOMMENDATIONS_TOP_K id в одной строке Recommendation, поэтому
+страница достаёт рекомендации поиском по первичному ключу.
+
+Матрицы строятся из потока пар, упорядоченного базой, без сортировки
+и множеств в памяти. Если установлены numpy и scipy, Aᵀ·A считает
+scipy.sparse. Без них каждая строка Aᵀ·A складывается в Counter из
+строк читателей автора: результат тот же, но это цикл на Python, и на
+больших графах он заметно медленнее.
+"""
+import heapq
+import math
+from array import array
+from collections import Counter
+from functools import cached_property
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+
+from core import jobs
+from . import sharding
+from .models import Comment, Follow, Recommendation
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:
+    numpy = sparse = None
+
+User = get_user_model()
+
+
+class Adjacency:
+    """Разреженная 0/1-матрица в формате CSR по парам (строка, столбец).
+
+    Строки и столбцы — id пользователей; indptr и indices — массивы
+    array('q'), строка i — indices[indptr[i]:indptr[i + 1]]. Пары должны
+    идти по возрастанию (строка, столбец), повторы подряд пропускаются.
+    """
+
+    def __init__(self, pairs):
+        self.rows = array('q')
+        self.indptr = array('q', [0])
+        self.indices = array('q')
+        last = None
+        for pair in pairs:
+            if last is not None and pair <= last:
+                if pair == last:
+                    continue
+                raise ValueError(f'Пары не упорядочены: {last}, {pair}')
+            row, column = last = pair
+            if not self.rows or self.rows[-1] != row:
+                if self.rows:
+                    self.indptr.append(len(self.indices))
+                self.rows.append(row)
+            self.indices.append(column)
+        if self.rows:
+            self.indptr.append(len(self.indices))
+        self.positions = {row: i for i, row in enumerate(self.rows)}
+
+    def row(self, pk):
+        i = self.positions.get(pk)
+        if i is None:
+            return array('q')
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    @cached_property
+    def degrees(self):
+        """Число ненулевых элементов в каждом столбце."""
+        return Counter(self.indices)
+
+    @cached_property
+    def transposed(self):
+        """Aᵀ подсчётом по столбцам, без сортировки пар."""
+        degrees = self.degrees
+        result = Adjacency(())
+        result.rows = array('q', sorted(degrees))
+        for column in result.rows:
+            result.indptr.append(result.indptr[-1] + degrees[column])
+        result.positions = {
+            column: i for i, column in enumerate(result.rows)}
+        result.indices = array('q', bytes(8 * len(self.indices)))
+        filled = array('q', result.indptr[:-1])
+        # Строки идут по возрастанию, поэтому и строки Aᵀ упорядочены
+        for i, row in enumerate(self.rows):
+            for column in self.indices[self.indptr[i]:self.indptr[i + 1]]:
+                position = result.positions[column]
+                result.indices[filled[position]] = row
+                filled[position] += 1
+        return result
+
+    def co_counts(self, columns):
+        """Строки Aᵀ·A для столбцов columns: {столбец: Counter}."""
+        result = {}
+        for column in columns:
+            counts = Counter()
+            for row in self.transposed.row(column):
+                counts.update(self.row(row))
+            if counts:
+                result[column] = counts
+        return result
+
+
+class ScipyAdjacency(Adjacency):
+    """То же, но Aᵀ·A считает scipy.sparse."""
+
+    def __init__(self, pairs):
+        super().__init__(pairs)
+        self.columns = numpy.unique(numpy.frombuffer(
+            self.indices, dtype=numpy.int64))
+        matrix = sparse.csr_matrix(
+            (
+                numpy.ones(len(self.indices), dtype=numpy.int32),
+                numpy.searchsorted(self.columns, self.indices),
+                numpy.frombuffer(self.indptr, dtype=numpy.int64),
+            ),
+            shape=(len(self.rows), len(self.columns)),
+        )
+        self.matrix = matrix
+        self.transposed = matrix.T.tocsr()
+
+    def co_counts(self, columns):
+        columns = numpy.intersect1d(
+            numpy.asarray(columns, dtype=numpy.int64), self.columns)
+        positions = numpy.searchsorted(self.columns, columns)
+        block = (self.transposed[positions] @ self.matrix).tocsr()
+        result = {}
+        for i, column in enumerate(columns.tolist()):
+            start, end = block.indptr[i], block.indptr[i + 1]
+            result[column] = Counter(dict(zip(
+                self.columns[block.indices[start:end]].tolist(),
+                block.data[start:end].tolist())))
+        return result
+
+
+def _adjacency(pairs):
+    if sparse is None:
+        return Adjacency(pairs)
+    return ScipyAdjacency(pairs)
+
+
+def _follow_pairs():
+    """Пары (читатель, автор) подписок по возрастанию."""
+    return Follow.objects.order_by('user_id', 'author_id').values_list(
+        'user_id', 'author_id').iterator()
+
+
+def _comment_pairs():
+    """Пары (комментатор, автор поста) со всех шардов по возрастанию."""
+    return heapq.merge(*(
+        Comment.objects.using(alias).exclude(
+            author_id=F('post__author_id')
+        ).order_by('author_id', 'post__author_id').values_list(
+            'author_id', 'post__author_id').distinct().iterator()
+        for alias in sharding.shards()
+    ))
+
+
+def _cosine(graph, columns):
+    """Косинусная похожесть столбцов columns с остальными."""
+    degrees = graph.degrees
+    scores = {}
+    for column, counts in graph.co_counts(columns).items():
+        del counts[column]
+        scores[column] = {
+            other: count / math.sqrt(degrees[column] * degrees[other])
+            for other, count in counts.items()
+        }
+    return scores
+
+
+def _top(scores, exclude=()):
+    return [
+        pk for pk, _ in heapq.nlargest(
+            settings.RECOMMENDATIONS_TOP_K,
+            ((pk, score) for pk, score in scores.items()
+             if pk not in exclude),
+            key=lambda item: (item[1], -item[0]))
+    ]
+
+
+def similar_authors_of(follows, comments, authors):
+    """Похожие авторы для пачки authors: {автор: {автор: похожесть}}."""
+    weight = settings.RECOMMENDATIONS_COMMENT_WEIGHT
+    combined = {author: Counter() for author in authors}
+    for graph, factor in ((follows, 1), (comments, weight)):
+        for author, scores in _cosine(graph, authors).items():
+            for other, score in scores.items():
+                combined[author][other] += factor * score
+    return combined
+
+
+def suggest(following, similar):
+    """Авторы для читателя: сумма похожести на его подписки."""
+    scores = Counter()
+    for author in following:
+        for other, score in similar.get(author, {}).items():
+            scores[other] += score
+    return scores
+
+
+@jobs.register('posts.recommendations')
+def rebuild(job):
+    follows = _adjacency(_follow_pairs())
+    comments = _adjacency(_comment_pairs())
+    authors = sorted(set(follows.indices) | set(comments.indices))
+    job.start(len(authors))
+    similar = {}
+    chunk = settings.RECOMMENDATIONS_CHUNK_SIZE
+    for start in range(0, len(authors), chunk):
+        part = authors[start:start + chunk]
+        for author, scores in similar_authors_of(
+                follows, comments, part).items():
+            # Для предложений хватает top-k похожих на каждого автора
+            similar[author] = {pk: scores[pk] for pk in _top(scores)}
+        job.advance(len(part))
+    rows = []
+    for pk in sorted(set(similar) | set(follows.rows)):
+        following = set(follows.row(pk))
+        row = Recommendation(
+            user_id=pk,
+            similar=_join(similar.get(pk, ())),
+            suggested=_join(_top(
+                suggest(following, similar), following | {pk})),
+        )
+        if row.similar or row.suggested:
+            rows.append(row)
+    with transaction.atomic():
+        Recommendation.objects.all().delete()
+        Recommendation.objects.bulk_create(rows, batch_size=500)
+
+
+def start_rebuild(background=True):
+    create = jobs.enqueue if background else jobs.create
+    return create('posts.recommendations')
+
+
+def _join(ids):
+    return ','.join(map(str, ids))
+
+
+def _users(ids):
+    users = User.objects.filter(pk__in=ids, is_active=True).in_bulk()
+    return [users[pk] for pk in ids if pk in users]
+
+
+def _ids(user, field):
+    if not user.is_authenticated:
+        return []
+    value = Recommendation.objects.filter(pk=user.pk).values_list(
+        field, flat=True).first()
+    return [int(pk) for pk in (value or '').split(',') if pk]
+
+
+def similar_authors(author):
+    """Авторы, похожие на author (для профиля)."""
+    return _users(_ids(author, 'similar'))
+
+
+def suggested_authors(user):
+    """Авторы, которых стоит предложить user (для ленты подписок)."""
+    return _users(_ids(user, 'suggested'))
@@ -0,0 +1,311 @@
+"""Горизонтальное шардирование постов и комментариев по автору.
+
+Посты автора лежат в базе POST_SHARDS[author_id % N], комментарии и
+рейтинги популярного — там же, где их пост, архив (posts.archive) — в
+том же шарде. Чтобы по id
+поста сразу найти шард, id выдаются так, что id % N — номер шарда:
+каждый шард ведёт свою последовательность в ShardSequence и раздаёт её
+блоками по SHARD_ID_BLOCK, начиная выше id, уже занятых в default.
+
+Пользователи и сообщества живут в default и копируются во все шарды
+(на них ссылаются внешние ключи постов), как и отметки об удалении
+аккаунта (по ним скрываются посты); подписки остаются только в
+default. Ленты со всех шардов (index, follow_index) собираются
+k-путевым слиянием по pub_date, профиль и страница поста читают один
+шард.
+
+По умолчанию шард один — default, и всё работает как без шардирования.
+Новые базы нужно мигрировать (migrate --database=<alias>) до того, как
+добавлять их в POST_SHARDS. Посты, созданные до шардирования, остаются
+в default, пока их не перенесёт задача posts.rebalance (команда
+rebalance_shards); до её завершения посты по id и посты автора
+ищутся ещё и в default (author_shards, id_shards).
+"""
+import heapq
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max
+
+from core.models import Job
+from users.models import PendingRemoval
+from .models import (
+    ArchivedComment, ArchivedPost, Comment, Group, Post, ShardSequence,
+    TrendingScore,
+)
+
+User = get_user_model()
+
+POST_MODELS = (Post, ArchivedPost)
+COMMENT_MODELS = (Comment, ArchivedComment)
+# Записи, которые лежат в шарде своего поста
+POST_CHILD_MODELS = COMMENT_MODELS + (TrendingScore,)
+SHARDED_MODELS = POST_MODELS + POST_CHILD_MODELS
+REPLICATED_MODELS = (User, Group, PendingRemoval)
+ARCHIVED = {Post: ArchivedPost, Comment: ArchivedComment}
+# Шард, где лежат записи, созданные до шардирования
+LEGACY_SHARD = 'default'
+REBALANCE_JOB = 'posts.rebalance'
+# Как часто, в секундах, проверять, не завершился ли перенос
+REBALANCE_CHECK_INTERVAL = 60
+
+_lock = threading.Lock()
+_blocks = {}
+_rebalanced = set()
+_checked = {}
+
+
+def shards():
+    return tuple(settings.POST_SHARDS)
+
+
+def is_sharded():
+    return len(shards()) > 1
+
+
+def shard_for_author(author_id):
+    aliases = shards()
+    return aliases[author_id % len(aliases)]
+
+
+def shard_for_id(pk):
+    """Шард поста или комментария по его id."""
+    aliases = shards()
+    return aliases[int(pk) % len(aliases)]
+
+
+def rebalanced():
+    """Перенесены ли в свои шарды записи, созданные до шардирования."""
+    aliases = shards()
+    if len(aliases) == 1 or aliases in _rebalanced:
+        return True
+    now = time.monotonic()
+    if now - _checked.get(aliases, -REBALANCE_CHECK_INTERVAL) \
+            < REBALANCE_CHECK_INTERVAL:
+        return False
+    if not Job.objects.filter(
+            name=REBALANCE_JOB, status=Job.DONE,
+            params=json.dumps({'shards': list(aliases)})).exists():
+        _checked[aliases] = now
+        return False
+    _rebalanced.add(aliases)
+    return True
+
+
+def recheck_rebalanced():
+    """Сбрасывает отрицательный ответ rebalanced() до конца интервала."""
+    _checked.clear()
+
+
+def _with_legacy(alias):
+    if alias == LEGACY_SHARD or rebalanced():
+        return (alias,)
+    return (alias, LEGACY_SHARD)
+
+
+def author_shards(author_id):
+    """Шарды, где могут лежать посты автора."""
+    return _with_legacy(shard_for_author(author_id))
+
+
+def id_shards(pk):
+    """Шарды, где может лежать пост или комментарий с этим id."""
+    return _with_legacy(shard_for_id(pk))
+
+
+def posts_by_id(pk):
+    *aliases, last = id_shards(pk)
+    for alias in aliases:
+        if Post.objects.using(alias).filter(pk=pk).exists():
+            return Post.objects.using(alias)
+    return Post.objects.using(last)
+
+
+def _group(keys, shard_for):
+    legacy = not rebalanced()
+    grouped = defaultdict(list)
+    for key in keys:
+        alias = shard_for(key)
+        grouped[alias].append(key)
+        if legacy and alias != LEGACY_SHARD:
+            grouped[LEGACY_SHARD].append(key)
+    return grouped
+
+
+def by_shard(ids):
+    """Раскладывает id постов или комментариев по шардам: {шард: [id]}."""
+    return _group(ids, shard_for_id)
+
+
+def by_author_shard(author_ids):
+    """Раскладывает id авторов по шардам с их постами: {шард: [id]}."""
+    return _group(author_ids, shard_for_author)
+
+
+def per_shard(queryset):
+    """Тот же запрос к шардированной модели в каждом шарде."""
+    if queryset.model not in SHARDED_MODELS:
+        return [queryset]
+    return [queryset.using(alias) for alias in shards()]
+
+
+def largest_groups(limit):
+    """Слаги сообществ с наибольшим числом постов во всех шардах."""
+    sizes = Counter()
+    for posts in per_shard(Post.objects.exclude(group=None)):
+        sizes.update(dict(posts.order_by().values_list('group_id').annotate(
+            size=Count('pk'))))
+    top = [pk for pk, _ in sizes.most_common(limit)]
+    groups = Group.objects.in_bulk(top)
+    return [groups[pk].slug for pk in top if pk in groups]
+
+
+def _first_local(model):
+    """Номер, с которого шард начинает последовательность model.
+
+    Номера выбираются так, чтобы новые id были больше id, уже занятых
+    в default записями, созданными до шардирования.
+    """
+    used = 0
+    for twin in (model, ARCHIVED.get(model)):
+        if twin is not None:
+            used = max(used, twin._base_manager.using(
+                LEGACY_SHARD).aggregate(last=Max('pk'))['last'] or 0)
+    return used // len(shards()) + 1
+
+
+def _allocate(alias, model):
+    size = settings.SHARD_ID_BLOCK
+    name = model._meta.label_lower
+    sequences = ShardSequence.objects.using(alias)
+    for _ in range(2):
+        with transaction.atomic(using=alias):
+            if sequences.filter(name=name).update(last=F('last') + size):
+                last = sequences.get(name=name).last
+                return iter(range(last - size + 1, last + 1))
+            first = _first_local(model)
+            try:
+                with transaction.atomic(using=alias):
+                    sequences.create(name=name, last=first + size - 1)
+                return iter(range(first, first + size))
+            except IntegrityError:
+                # Последовательность только что создал другой процесс
+                continue
+    raise IntegrityError(f'Не удалось выделить id для {name} в {alias}')
+
+
+def next_id(model, alias):
+    """Глобально уникальный id новой записи model в шарде alias."""
+    aliases = shards()
+    key = (model._meta.label_lower, alias)
+    with _lock:
+        local = next(_blocks.get(key, iter(())), None)
+        if local is None:
+            _blocks[key] = _allocate(alias, model)
+            local = next(_blocks[key])
+    return local * len(aliases) + aliases.index(alias)
+
+
+def replicate(instance, deleted=False):
+    """Повторяет в шардах запись пользователя или сообщества из default."""
+    model = type(instance)
+    values = {
+        field.attname: getattr(instance, field.attname)
+        for field in model._meta.concrete_fields if not field.primary_key
+    }
+    for alias in shards():
+        if alias == 'default':
+            continue
+        # Копии пишутся мимо save(): сигналы уже отработали в default
+        replicas = model._base_manager.using(alias)
+        if deleted:
+            replicas.filter(pk=instance.pk).delete()
+        elif not replicas.filter(pk=instance.pk).update(**values):
+            replicas.bulk_create([model(pk=instance.pk, **values)])
+
+
+class ShardRouter:
+    """Отправляет посты и комментарии в шард автора, остальное — в default.
+
+    Прочитанная запись и записи, связанные с прочитанным постом,
+    остаются в его базе: пост, созданный до шардирования, лежит в
+    default, пока его не перенесёт posts.rebalance.
+    """
+
+    def _shard(self, model, instance):
+        if isinstance(instance, SHARDED_MODELS) and not instance._state.adding:
+            return instance._state.db
+        if isinstance(instance, POST_MODELS) and instance.author_id:
+            return shard_for_author(instance.author_id)
+        if isinstance(instance, POST_CHILD_MODELS) and instance.post_id:
+            field = instance._meta.get_field('post')
+            if field.is_cached(instance) and not instance.post._state.adding:
+                return instance.post._state.db
+            return shard_for_id(instance.post_id)
+        if isinstance(instance, User) and model in POST_MODELS:
+            return shard_for_author(instance.pk)
+        return None
+
+    def db_for_read(self, model, **hints):
+        if model in SHARDED_MODELS:
+            return self._shard(model, hints.get('instance'))
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        if model in SHARDED_MODELS:
+            return self._shard(model, hints.get('instance'))
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class Merged:
+    """Посты нескольких шардов, слитые по убыванию pub_date.
+
+    Годится для Paginator: срез берёт из каждого шарда не больше
+    stop записей и сливает их heapq.merge.
+    """
+    ordered = True
+
+    def __init__(self, querysets):
+        self.querysets = [
+            queryset.order_by('-pub_date', '-pk') for queryset in querysets]
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            parts = self.querysets
+        else:
+            parts = [queryset[:stop] for queryset in self.querysets]
+        merged = heapq.merge(
+            *parts, key=lambda post: (post.pub_date, post.pk), reverse=True)
+        return list(islice(merged, start, stop))
+
+
+def scatter(queryset, author_ids=None):
+    """Запрос к постам на всех нужных шардах: QuerySet или Merged.
+
+    Если переданы author_ids, опрашиваются только шарды этих авторов.
+    """
+    if not is_sharded():
+        return queryset
+    aliases = shards()
+    if author_ids is not None:
+        used = by_author_shard(author_ids)
+        aliases = [alias for alias in aliases if alias in used]
+    return Merged(queryset.using(alias) for alias in aliases)
@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core import holes
+from users.models import PendingRemoval
+from . import feed, follow_graph, prerender, sharding, syndication
+from .models import Comment, Follow, Group, GroupSubscription, Post
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_graph(sender, instance, **kwargs):
+    follow_graph.invalidate(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    holes.bump(f'post:{instance.pk}', f'author:{instance.author_id}')
+    prerender.refresh_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def raise_feed_heads(sender, instance, **kwargs):
+    feed.raise_heads(instance)
+
+
+@receiver(pre_save, sender=Follow)
+@receiver(pre_save, sender=GroupSubscription)
+def fill_feed_head(sender, instance, **kwargs):
+    if instance._state.adding and instance.head is None:
+        feed.fill_head(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    holes.bump(f'post:{instance.post_id}')
+    prerender.refresh_comments(instance.post_id)
+
+
+def _login_only(update_fields):
+    """Сохранение только last_login при входе не меняет страниц."""
+    return bool(update_fields) and set(update_fields) <= {'last_login'}
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_pages(sender, instance, update_fields, **kwargs):
+    if not _login_only(update_fields):
+        holes.bump(f'author:{instance.pk}')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def publish_post_feeds(sender, instance, signal, created=False, **kwargs):
+    syndication.schedule('index')
+    syndication.schedule('author', instance.author_id)
+    if instance.group_id:
+        syndication.schedule('group', instance.group_id)
+    if created or signal is post_delete:
+        syndication.schedule_sitemap('posts', instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def publish_group_feeds(sender, instance, **kwargs):
+    prerender.refresh_group(instance.slug)
+    syndication.schedule('group', instance.pk)
+    syndication.schedule_sitemap('groups', instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def remove_group_feeds(sender, instance, **kwargs):
+    prerender.refresh_group(instance.slug)
+    syndication.schedule('removed_group', instance.slug)
+    syndication.schedule_sitemap('groups', instance.pk)
+
+
+@receiver(post_save, sender=User)
+def publish_author_feeds(sender, instance, created, update_fields, **kwargs):
+    if _login_only(update_fields):
+        return
+    syndication.schedule('author', instance.pk)
+    if created:
+        syndication.schedule_sitemap('profiles', instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+def assign_sharded_id(sender, instance, using, **kwargs):
+    if instance.pk is None and sharding.is_sharded():
+        instance.pk = sharding.next_id(sender, using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=PendingRemoval)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=PendingRemoval)
+def replicate_to_shards(sender, instance, using, signal, **kwargs):
+    if using == 'default' and sharding.is_sharded():
+        sharding.replicate(instance, deleted=signal is post_delete)
@@ -0,0 +1,294 @@
+"""Карты сайта и ленты Atom/RSS в виде готовых файлов.
+
+Файлы лежат в SYNDICATION_ROOT и отдаются как статика (views.published
+или веб-сервер) с поддержкой условных запросов, поэтому поисковые роботы
+не листают ленту страницами с OFFSET. Ленты — общая, каждой группы и
+каждого автора — содержат последние FEED_SIZE постов. Карта сайта
+разбита на части по SITEMAP_SHARD_SIZE адресов: в часть n попадают
+объекты с pk от n * SITEMAP_SHARD_SIZE, так что новый пост меняет только
+одну часть.
+
+Сигналы не пересобирают файлы в запросе: после коммита они только
+отмечают затронутые файлы в таблице SyndicationTarget, а пересобирает
+их команда publish_feeds --pending (cron, раз в минуту). Отметка одного
+файла хранится один раз, поэтому сколько бы постов автора ни менялось
+между запусками, его лента пересобирается однажды. Массовые операции и
+команда publish_feeds без ключа пересобирают всё целиком.
+"""
+import heapq
+import json
+import logging
+import os
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+from django.template.defaultfilters import truncatechars
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+
+from core import commits
+from users.models import PendingRemoval
+from . import sharding
+from .models import Group, Post, SyndicationTarget
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+FEED_FORMATS = {'atom.xml': Atom1Feed, 'rss.xml': Rss201rev2Feed}
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def _url(path):
+    return settings.SITE_URL + path
+
+
+def _write(relative, content):
+    path = os.path.join(settings.SYNDICATION_ROOT, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        file.write(content)
+    os.replace(temporary, path)
+    return relative
+
+
+def _remove(relative):
+    try:
+        os.remove(os.path.join(settings.SYNDICATION_ROOT, relative))
+    except FileNotFoundError:
+        pass
+
+
+def _publish_feed(directory, title, link, posts, author_ids=None):
+    posts = list(sharding.scatter(
+        posts.select_related('author', 'group'), author_ids
+    )[:settings.FEED_SIZE])
+    written = []
+    for filename, feed_class in FEED_FORMATS.items():
+        relative = f'{directory}/{filename}'
+        feed = feed_class(
+            title=title,
+            link=_url(link),
+            description=title,
+            language='ru',
+            feed_url=_url(reverse('posts:published', args=[relative])),
+        )
+        for post in posts:
+            url = _url(reverse('posts:post_detail', args=[post.pk]))
+            feed.add_item(
+                title=truncatechars(post.text, 60),
+                link=url,
+                unique_id=url,
+                description=post.text,
+                author_name=post.author.get_full_name()
+                or post.author.username,
+                pubdate=post.pub_date,
+                categories=[post.group.title] if post.group else None,
+            )
+        written.append(_write(relative, feed.writeString('utf-8')))
+    return written
+
+
+def publish_index_feed():
+    return _publish_feed(
+        'feeds', 'Последние обновления на сайте', reverse('posts:index'),
+        Post.objects.visible())
+
+
+def publish_group_feed(group):
+    return _publish_feed(
+        f'feeds/group/{group.slug}', f'Записи сообщества {group.title}',
+        reverse('posts:group_list', args=[group.slug]),
+        Post.objects.visible().filter(group=group))
+
+
+def publish_author_feed(author):
+    directory = f'feeds/profile/{author.username}'
+    if PendingRemoval.objects.filter(user_id=author.pk).exists():
+        for filename in FEED_FORMATS:
+            _remove(f'{directory}/{filename}')
+        return []
+    return _publish_feed(
+        directory, f'Записи {author.get_full_name() or author.username}',
+        reverse('posts:profile', args=[author.username]),
+        Post.objects.visible().filter(author=author), [author.pk])
+
+
+def _sections():
+    """Разделы карты сайта: (queryset, функция адреса, поле даты)."""
+    return {
+        'posts': (
+            Post.objects.visible(),
+            lambda row: reverse('posts:post_detail', args=[row[0]]),
+            'pub_date',
+        ),
+        'groups': (
+            Group.objects.all(),
+            lambda row: reverse('posts:group_list', args=[row[1]]),
+            'slug',
+        ),
+        'profiles': (
+            User.objects.filter(pending_removal__isnull=True),
+            lambda row: reverse('posts:profile', args=[row[1]]),
+            'username',
+        ),
+    }
+
+
+def shard_of(pk):
+    return pk // settings.SITEMAP_SHARD_SIZE
+
+
+def publish_sitemap(section, shard):
+    queryset, location, field = _sections()[section]
+    size = settings.SITEMAP_SHARD_SIZE
+    # Посты части лежат во всех шардах: строки сливаются по pk
+    rows = heapq.merge(*(
+        part.filter(
+            pk__gte=shard * size, pk__lt=(shard + 1) * size
+        ).order_by('pk').values_list('pk', field).iterator()
+        for part in sharding.per_shard(queryset)
+    ))
+    entries = []
+    for row in rows:
+        entry = f'<url><loc>{escape(_url(location(row)))}</loc>'
+        if field == 'pub_date':
+            entry += f'<lastmod>{row[1].date().isoformat()}</lastmod>'
+        entries.append(entry + '</url>')
+    return _write(
+        f'sitemaps/{section}-{shard}.xml',
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<urlset xmlns="{SITEMAP_NAMESPACE}">\n'
+        + '\n'.join(entries) + '\n</urlset>\n',
+    )
+
+
+def _shard_counts():
+    counts = {}
+    for section, (queryset, _, _) in _sections().items():
+        lasts = [
+            part.aggregate(last=Max('pk'))['last']
+            for part in sharding.per_shard(queryset)]
+        lasts = [last for last in lasts if last is not None]
+        counts[section] = shard_of(max(lasts)) + 1 if lasts else 0
+    return counts
+
+
+def publish_sitemap_index(shard_counts=None):
+    if shard_counts is None:
+        shard_counts = _shard_counts()
+    entries = []
+    for section, count in shard_counts.items():
+        for shard in range(count):
+            location = _url(reverse(
+                'posts:published', args=[f'sitemaps/{section}-{shard}.xml']))
+            entries.append(f'<sitemap><loc>{escape(location)}</loc></sitemap>')
+    return _write(
+        'sitemap.xml',
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<sitemapindex xmlns="{SITEMAP_NAMESPACE}">\n'
+        + '\n'.join(entries) + '\n</sitemapindex>\n',
+    )
+
+
+def publish_robots():
+    return _write(
+        'robots.txt',
+        'User-agent: *\n'
+        'Disallow: /*?page=\n'
+        f'Sitemap: {_url(reverse("posts:sitemap"))}\n',
+    )
+
+
+def _publish_author(author_id):
+    author = User.objects.filter(pk=author_id).first()
+    if author is not None:
+        publish_author_feed(author)
+
+
+def _publish_group(group_id):
+    group = Group.objects.filter(pk=group_id).first()
+    if group is not None:
+        publish_group_feed(group)
+
+
+def _remove_group(slug):
+    for filename in FEED_FORMATS:
+        _remove(f'feeds/group/{slug}/{filename}')
+
+
+PUBLISHERS = {
+    'index': lambda key: publish_index_feed(),
+    'author': _publish_author,
+    'group': _publish_group,
+    'removed_group': _remove_group,
+    'sitemap': lambda key: publish_sitemap(*key),
+    'sitemap_index': lambda key: publish_sitemap_index(),
+}
+
+
+def schedule(kind, key=None):
+    """Отмечает файл для пересборки после коммита текущей транзакции.
+
+    Отметки транзакции сохраняются одним INSERT (core.commits), а при
+    откате пропадают вместе с ней.
+    """
+    commits.collect(save_targets, [(kind, json.dumps(key))])
+
+
+def schedule_sitemap(section, pk):
+    schedule('sitemap', (section, shard_of(pk)))
+    schedule('sitemap_index')
+
+
+def save_targets(targets):
+    SyndicationTarget.objects.bulk_create(
+        [SyndicationTarget(kind=kind, key=key) for kind, key in targets],
+        ignore_conflicts=True,
+    )
+
+
+def publish_pending():
+    """Пересобирает отмеченные файлы и возвращает их число.
+
+    Отметка удаляется до пересборки: если файл снова отметят во время
+    неё, его пересоберёт следующий запуск.
+    """
+    targets = list(SyndicationTarget.objects.order_by('pk'))
+    SyndicationTarget.objects.filter(
+        pk__in=[target.pk for target in targets]).delete()
+    for target in targets:
+        try:
+            PUBLISHERS[target.kind](json.loads(target.key))
+        except Exception:
+            logger.exception(
+                'Не удалось обновить файл %s %s', target.kind, target.key)
+    return len(targets)
+
+
+def publish_all():
+    """Пересобирает все файлы и удаляет устаревшие."""
+    shard_counts = _shard_counts()
+    written = {publish_robots(), publish_sitemap_index(shard_counts)}
+    written.update(publish_index_feed())
+    for group in Group.objects.all():
+        written.update(publish_group_feed(group))
+    # Пользователи есть в каждом шарде, а их посты — только в одном
+    for alias in sharding.shards():
+        authors = User.objects.using(alias).filter(
+            pending_removal__isnull=True, posts__isnull=False)
+        for author in authors.distinct().iterator():
+            written.update(publish_author_feed(author))
+    for section, count in shard_counts.items():
+        for shard in range(count):
+            written.add(publish_sitemap(section, shard))
+    for root, _, files in os.walk(settings.SYNDICATION_ROOT):
+        for filename in files:
+            relative = os.path.relpath(
+                os.path.join(root, filename), settings.SYNDICATION_ROOT)
+            if relative.replace(os.sep, '/') not in written:
+                os.remove(os.path.join(root, filename))
+    return len(written)
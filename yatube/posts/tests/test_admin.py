@@ -0,0 +1,185 @@
+import json
+from http import HTTPStatus
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.models import Job
+from core.paginators import EstimatedCountPaginator
+from .. import bulk, sharding, syndication
+from ..models import Comment, Group, Post, SyndicationTarget
+
+User = get_user_model()
+
+
+class PostAdminTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@yatube.ru', password='pass')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.admin, group=cls.group)
+            for i in range(5)
+        )
+        cls.post = cls.admin.posts.first()
+        Comment.objects.bulk_create(
+            Comment(text=f'Комментарий {i}', author=cls.admin, post=cls.post)
+            for i in range(25)
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def test_changelist_queries_do_not_grow(self):
+        """Список постов не делает запрос на каждую строку."""
+        url = reverse('admin:posts_post_changelist')
+        self.client.get(url)
+        with self.assertNumQueries(7):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_change_form_paginates_comments(self):
+        """Инлайн комментариев выводится постранично."""
+        url = reverse('admin:posts_post_change', args=[self.post.pk])
+        response = self.client.get(url)
+        formset = response.context['inline_admin_formsets'][0].formset
+        self.assertEqual(len(formset.forms), 20)
+        response = self.client.get(url, {'comments_page': 2})
+        formset = response.context['inline_admin_formsets'][0].formset
+        self.assertEqual(len(formset.forms), 5)
+
+    def test_search_by_author(self):
+        """Поиск «@username» фильтрует по автору."""
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'),
+            {'q': '@admin', 'shard': self.post._state.db})
+        self.assertEqual(response.context['cl'].result_count, 5)
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=0)
+    def test_paginator_counts_filtered_queryset(self):
+        """Для отфильтрованного queryset число строк считается точно."""
+        paginator = EstimatedCountPaginator(
+            self.admin.posts.filter(group=self.group), 2)
+        self.assertEqual(paginator.count, 5)
+
+
+@override_settings(JOBS_ASYNC=False, BULK_CHUNK_SIZE=2)
+class BulkActionsTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@yatube.ru', password='pass')
+        cls.spammer = User.objects.create_user(username='spammer')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.spammer) for i in range(5))
+        self.shard = sharding.shard_for_author(self.spammer.pk)
+        self.changelist = reverse('admin:posts_post_changelist')
+        self.changelist += f'?shard={self.shard}'
+
+    def test_regroup_action(self):
+        """Действие переносит выбранные посты в группу пачками."""
+        response = self.client.post(
+            self.changelist,
+            {
+                'action': 'regroup_posts',
+                '_selected_action': self.spammer.posts.values_list(
+                    'pk', flat=True),
+                'group': self.group.pk,
+                'apply': 'Запустить',
+            },
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(
+            self.spammer.posts.filter(group=self.group).count(), 5)
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual((job.done, job.total), (5, 5))
+
+    def test_regroup_across_stores_filters(self):
+        """Выбор всех постов по фильтру хранит в задаче фильтры, а не id."""
+        Post.objects.create(text='Другой пост', author=self.admin)
+        response = self.client.post(
+            self.changelist + '&q=@spammer',
+            {
+                'action': 'regroup_posts',
+                '_selected_action': [self.spammer.posts.first().pk],
+                'select_across': '1',
+                'group': self.group.pk,
+                'apply': 'Запустить',
+            },
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(
+            self.spammer.posts.filter(group=self.group).count(), 5)
+        self.assertFalse(self.admin.posts.filter(group=self.group).exists())
+        job = Job.objects.get()
+        self.assertEqual(json.loads(job.params)['selection'], {
+            'filters': {}, 'search': '@spammer', 'shard': self.shard})
+        last = self.spammer.posts.latest('pk')
+        self.assertEqual(job.checkpoint, f'{self.shard}:{last.pk}')
+
+    def test_selection_rejects_unknown_filters(self):
+        for lookup in ('author__password', 'text__regex', 'group__slug__x'):
+            with self.subTest(lookup=lookup):
+                with self.assertRaises(bulk.BulkError):
+                    bulk.select({'filters': {lookup: 'x'}})
+        self.assertEqual(bulk.select({'filters': {
+            'author__username__exact': 'spammer', 'pub_date__year': '2000',
+        }}).count(), 0)
+
+    def test_regroup_action_asks_for_group(self):
+        """Без подтверждения действие показывает форму выбора группы."""
+        response = self.client.post(
+            self.changelist,
+            {
+                'action': 'regroup_posts',
+                '_selected_action': self.spammer.posts.values_list(
+                    'pk', flat=True),
+            },
+        )
+        self.assertTemplateUsed(response, 'admin/posts/post/bulk_action.html')
+        self.assertFalse(Job.objects.exists())
+
+    def test_bulk_posts_command(self):
+        """Команда bulk_posts удаляет посты автора."""
+        call_command(
+            'bulk_posts', 'delete', author='spammer', stdout=StringIO())
+        self.assertFalse(self.spammer.posts.exists())
+
+    def test_bulk_delete_marks_files_instead_of_rebuilding(self):
+        """Массовое удаление отмечает ленты и карты сайта для пересборки."""
+        with mock.patch.object(
+                transaction, 'on_commit', lambda func, using=None: func()), \
+                mock.patch.object(syndication, 'publish_all') as publish_all:
+            call_command(
+                'bulk_posts', 'delete', author='spammer', stdout=StringIO())
+        publish_all.assert_not_called()
+        kinds = set(SyndicationTarget.objects.values_list('kind', flat=True))
+        self.assertEqual(
+            kinds, {'index', 'author', 'sitemap', 'sitemap_index'})
@@ -0,0 +1,62 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import sharding
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+class ArchiveTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='archivist')
+        cls.old = Post.objects.create(text='Старый пост', author=cls.author)
+        cls.fresh = Post.objects.create(text='Свежий пост', author=cls.author)
+        cls.author.posts.filter(pk=cls.old.pk).update(
+            pub_date=timezone.now() - timedelta(days=365))
+        Comment.objects.create(
+            post=cls.old, author=cls.author, text='Старый комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        call_command('archive_posts', '--days', '30', stdout=StringIO())
+
+    def test_old_posts_move_to_archive(self):
+        self.assertEqual(
+            list(self.author.posts.values_list('pk', flat=True)),
+            [self.fresh.pk])
+        archived = self.author.archived_posts.get()
+        self.assertEqual(archived.pk, self.old.pk)
+        self.assertEqual(archived.pub_date.date(), (
+            timezone.now() - timedelta(days=365)).date())
+        self.assertEqual(
+            archived.comments.get().post_id, self.old.pk)
+        comments = sharding.per_shard(Comment.objects.all())
+        self.assertFalse(any(part.exists() for part in comments))
+
+    def test_index_shows_only_hot_posts(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [self.fresh])
+
+    def test_post_detail_and_profile_find_archived_posts(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.old.pk]))
+        self.assertContains(response, 'Старый пост')
+        self.assertContains(response, 'Старый комментарий')
+        self.assertContains(response, 'Пост в архиве')
+        response = self.client.get(
+            reverse('posts:profile', args=[self.author.username]))
+        texts = [post.text for post in response.context['page_obj']]
+        self.assertEqual(texts, ['Свежий пост', 'Старый пост'])
@@ -0,0 +1,88 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+from ..digest import start_digest
+from ..models import Follow, Post
+
+User = get_user_model()
+
+
+@override_settings(DIGEST_WORKERS=1, DIGEST_CHUNK_SIZE=2)
+class DigestTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.readers = [
+            User.objects.create_user(
+                username=f'reader{i}', email=f'reader{i}@yatube.ru')
+            for i in range(3)
+        ]
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=cls.author) for reader in cls.readers)
+        Post.objects.create(text='Свежий пост', author=cls.author)
+        Post.objects.create(text='Чужой пост', author=cls.other)
+        old = Post.objects.create(text='Старый пост', author=cls.author)
+        cls.author.posts.filter(pk=old.pk).update(
+            pub_date=timezone.now() - timedelta(days=2))
+
+    def test_digest_contains_new_posts_of_followed_authors(self):
+        """Каждый подписчик получает одно письмо только со свежими постами."""
+        job = jobs.run(start_digest(background=False))
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            [reader.email for reader in self.readers],
+        )
+        body = mail.outbox[0].body
+        self.assertIn('Свежий пост', body)
+        self.assertNotIn('Чужой пост', body)
+        self.assertNotIn('Старый пост', body)
+
+    def test_interrupted_digest_resumes_from_checkpoint(self):
+        """Команда продолжает упавшую рассылку с контрольной точки."""
+        job = start_digest(background=False)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.FAILED,
+            checkpoint=str(self.readers[1].pk),
+            total=3,
+            done=2,
+        )
+        call_command('send_digest', stdout=StringIO())
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [[self.readers[2].email]],
+        )
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.done, 3)
+
+    def test_next_digest_starts_where_previous_ended(self):
+        """Следующая рассылка берёт только посты после окна предыдущей."""
+        call_command('send_digest', stdout=StringIO())
+        Post.objects.create(text='Новый пост', author=self.author)
+        mail.outbox.clear()
+        call_command('send_digest', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), len(self.readers))
+        body = mail.outbox[0].body
+        self.assertIn('Новый пост', body)
+        self.assertNotIn('Свежий пост', body)
+
+    def test_running_digest_is_not_taken_over(self):
+        """Рассылку с живым обработчиком команда не перехватывает."""
+        job = start_digest(background=False)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, heartbeat=timezone.now())
+        call_command('send_digest', stdout=StringIO())
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Job.objects.get().status, Job.RUNNING)
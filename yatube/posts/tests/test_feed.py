@@ -0,0 +1,119 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import feed
+from ..models import Follow, Group, GroupSubscription, Post
+
+User = get_user_model()
+
+
+class FeedTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='feed-group', description='')
+        cls.authors = [
+            User.objects.create_user(username=f'feed{i}') for i in range(20)]
+        start = timezone.now() - timedelta(days=1)
+        for i, author in enumerate(cls.authors):
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                text=f'Пост {i}', author=author,
+                group=cls.group if i % 2 else None)
+            author.posts.filter(pk=post.pk).update(
+                pub_date=start + timedelta(minutes=i))
+        stranger = User.objects.create_user(username='stranger')
+        cls.group_post = Post.objects.create(
+            text='Пост в группе', author=stranger, group=cls.group)
+        GroupSubscription.objects.create(user=cls.reader, group=cls.group)
+        # UPDATE дат прошёл мимо сигналов
+        feed.refresh_heads([author.pk for author in cls.authors])
+
+    def setUp(self):
+        cache.clear()
+
+    def read_all(self, size):
+        texts, cursor = [], None
+        while True:
+            page = feed.read(self.reader, cursor, size)
+            texts.extend(post.text for post in page)
+            if page.next_cursor is None:
+                return texts
+            cursor = feed.decode_cursor(page.next_cursor)
+
+    def test_merges_authors_and_groups_without_duplicates(self):
+        """Посты авторов и сообществ идут одной лентой, каждый один раз."""
+        expected = ['Пост в группе'] + [f'Пост {i}' for i in range(19, -1, -1)]
+        for size in (3, 10, 50):
+            with self.subTest(size=size):
+                self.assertEqual(self.read_all(size), expected)
+
+    def count_queries(self, cursor=None):
+        with CaptureQueriesContext(connection) as queries:
+            feed.read(self.reader, cursor, size=3)
+        return len(queries)
+
+    def test_page_queries_do_not_depend_on_subscriptions(self):
+        first = self.count_queries()
+        cursor = feed.decode_cursor(
+            feed.read(self.reader, size=3).next_cursor)
+        second = self.count_queries(cursor)
+        # Пачка подписок каждого вида и по запросу на открытый источник
+        self.assertLessEqual(first, 2 + 3)
+        for i in range(40):
+            author = User.objects.create_user(username=f'quiet{i}')
+            Post.objects.create(text='Старый пост', author=author)
+            Follow.objects.create(user=self.reader, author=author)
+            author.posts.update(pub_date=timezone.now() - timedelta(days=30))
+        feed.refresh_heads(
+            Follow.objects.values_list('author_id', flat=True))
+        self.assertEqual(self.count_queries(), first)
+        self.assertEqual(self.count_queries(cursor), second)
+
+    def test_new_post_raises_heads(self):
+        author = self.authors[0]
+        self.assertEqual(
+            Follow.objects.get(user=self.reader, author=author).head,
+            author.posts.get().pub_date)
+        post = Post.objects.create(
+            text='Свежий пост', author=author, group=self.group)
+        self.assertEqual(
+            Follow.objects.get(user=self.reader, author=author).head,
+            post.pub_date)
+        self.assertEqual(
+            GroupSubscription.objects.get(user=self.reader).head,
+            post.pub_date)
+        self.assertEqual(self.read_all(3)[0], 'Свежий пост')
+
+    def test_follow_index_pages_by_cursor(self):
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('posts:follow_index'))
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 10)
+        response = client.get(
+            reverse('posts:follow_index'), {'before': page.next_cursor})
+        self.assertNotIn(
+            page.object_list[-1], response.context['page_obj'].object_list)
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_subscribe_to_group(self):
+        client = Client()
+        client.force_login(self.authors[0])
+        client.get(reverse('posts:group_subscribe', args=[self.group.slug]))
+        response = client.get(reverse('posts:follow_index'))
+        self.assertIn(self.group_post, response.context['page_obj'])
+        client.get(
+            reverse('posts:group_unsubscribe', args=[self.group.slug]))
+        response = client.get(reverse('posts:follow_index'))
+        self.assertNotIn(self.group_post, response.context['page_obj'])
@@ -8,8 +8,9 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
+from django.db.models.signals import post_save
 
-from ..models import Group, Post, Comment
+from ..models import Group, Post
 from posts.forms import PostForm
 
 
@@ -19,6 +20,8 @@ TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostFormTests(TestCase):
+    databases = '__all__'
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -53,7 +56,7 @@ class PostFormTests(TestCase):
 
     def test_authorized_user_create_post(self):
         """Проверка создания записи авторизированным пользователем."""
-        posts_count = Post.objects.count()
+        posts_count = self.post_author.posts.count()
         small_gif = (
             b'\x47\x49\x46\x38\x39\x61\x02\x00'
             b'\x01\x00\x80\x00\x00\x00\x00\x00'
@@ -83,8 +86,8 @@ class PostFormTests(TestCase):
                 'posts:profile',
                 kwargs={'username': self.post_author.username})
         )
-        self.assertEqual(Post.objects.count(), posts_count + 1)
-        post = Post.objects.latest('id')
+        self.assertEqual(self.post_author.posts.count(), posts_count + 1)
+        post = self.post_author.posts.latest('id')
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.author, self.post_author)
         self.assertEqual(post.group_id, form_data['group'])
@@ -106,18 +109,60 @@ class PostFormTests(TestCase):
         self.assertRedirects(
             response,
             reverse('posts:post_detail', kwargs={'post_id': post.id}))
-        post_one = Post.objects.latest('id')
+        post_one = self.post_author.posts.latest('id')
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertEqual(post_one.text, form_data['text'])
         self.assertEqual(post_one.author, self.post_author)
         self.assertEqual(post_one.group_id, form_data['group'])
 
+    def test_edit_saves_only_changed_fields(self):
+        """Правка пишет только изменённые поля и увеличивает версию."""
+        post = Post.objects.create(
+            text='Исходный текст', author=self.post_author,
+            group=self.group)
+        url = reverse('posts:edit', args=[post.id])
+        saved = []
+
+        def record(sender, update_fields, **kwargs):
+            saved.append(update_fields)
+
+        post_save.connect(record, sender=Post)
+        self.addCleanup(post_save.disconnect, record, sender=Post)
+        form_data = {
+            'text': 'Исправленный текст',
+            'group': self.group.id,
+            'version': post.version,
+        }
+        self.authorized_user.post(url, form_data)
+        form_data['version'] = 2
+        self.authorized_user.post(url, form_data)
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Исправленный текст')
+        self.assertEqual(post.version, 2)
+        self.assertEqual(saved, [frozenset({
+            'text', 'text_html', 'excerpt_html', 'has_more'})])
+
+    def test_concurrent_edit_is_rejected(self):
+        """Правка устаревшей версии не перезаписывает чужие изменения."""
+        post = Post.objects.create(
+            text='Исходный текст', author=self.post_author)
+        self.post_author.posts.filter(pk=post.pk).update(
+            text='Чужая правка', version=2)
+        response = self.authorized_user.post(
+            reverse('posts:edit', args=[post.id]),
+            {'text': 'Моя правка', 'version': 1})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.context['form'].non_field_errors())
+        self.assertContains(response, 'name="version" value="2"')
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Чужая правка')
+
     def test_authorized_user_create_comment(self):
         """Проверка комментирования авторизованным пользователем."""
-        comments_count = Comment.objects.count()
         post = Post.objects.create(
             text='Текст поста для комментирования',
             author=self.post_author)
+        comments_count = post.comments.count()
         form_data = {'text': 'Тестовый коментарий'}
         response = self.auth_user_comm.post(
             reverse(
@@ -125,8 +170,8 @@ class PostFormTests(TestCase):
                 kwargs={'post_id': post.id}),
             data=form_data,
             follow=True)
-        comment = Comment.objects.latest('id')
-        self.assertEqual(Comment.objects.count(), comments_count + 1)
+        comment = post.comments.latest('id')
+        self.assertEqual(post.comments.count(), comments_count + 1)
         self.assertEqual(comment.text, form_data['text'])
         self.assertEqual(comment.author, self.comm_author)
         self.assertEqual(comment.post_id, post.id)
@@ -1,12 +1,18 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.template.defaultfilters import linebreaks
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Group, Post
 
 User = get_user_model()
 
 
 class PostModelTest(TestCase):
+    databases = '__all__'
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -26,7 +32,45 @@ class PostModelTest(TestCase):
         self.assertEqual(self.post.text[:15], str(self.post))
 
 
+class RenderedTextTest(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    def test_html_is_rendered_on_save(self):
+        post = Post.objects.create(
+            author=self.user, text='<b>жирный</b>\nтекст')
+        self.assertEqual(
+            post.text_html, '&lt;b&gt;жирный&lt;/b&gt;<br>текст')
+        post.text = 'Новый\r\nтекст'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'Новый<br>текст')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='a & b')
+        self.assertEqual(comment.body, 'a &amp; b')
+
+    def test_paragraphs_match_linebreaks(self):
+        """Абзацы страницы поста совпадают с фильтром linebreaks."""
+        text = 'Первый <абзац>\nстрока\n\n\nВторой\r\n\r\nТретий\n'
+        post = Post.objects.create(author=self.user, text=text)
+        self.assertEqual(post.paragraphs, linebreaks(text, autoescape=True))
+
+    def test_backfill_renders_old_rows(self):
+        post = Post.objects.create(author=self.user, text='Старый\nпост')
+        self.user.posts.filter(pk=post.pk).update(text_html='')
+        post.refresh_from_db()
+        self.assertEqual(post.body, 'Старый<br>пост')
+        call_command('render_texts', '--workers', '2', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'Старый<br>пост')
+
+
 class GroupModelTest(TestCase):
+    databases = '__all__'
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
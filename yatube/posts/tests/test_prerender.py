@@ -0,0 +1,94 @@
+import gzip
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import prerender
+from core.models import StalePage
+from .. import counters
+from ..models import Comment, Group, Post, TrendingScore
+from ..prerender import hot_urls
+
+User = get_user_model()
+
+TEMP_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(PRERENDER_ROOT=TEMP_ROOT)
+class PrerenderTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Горячий пост', author=cls.author, group=cls.group)
+        TrendingScore(post=cls.post, hot=1).save()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        counters.flush()
+        prerender.publish_all(hot_urls())
+        self.client = Client()
+
+    def test_anonymous_gets_prerendered_pages(self):
+        """Анонимные запросы обслуживаются готовыми файлами."""
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIsNone(response.context)
+                self.assertContains(response, 'Горячий пост')
+
+    def test_gzip_variant(self):
+        response = self.client.get(
+            reverse('posts:index'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(
+            'Горячий пост', gzip.decompress(response.content).decode())
+
+    def test_logged_in_user_gets_dynamic_page(self):
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('posts:index'))
+        self.assertIsNotNone(response.context)
+
+    def test_comment_refreshes_post_page(self):
+        """Новый комментарий отмечает страницу, её перерисовывает команда."""
+        with mock.patch.object(
+                transaction, 'on_commit', lambda func, using=None: func()):
+            Comment.objects.create(
+                post=self.post, author=self.author, text='Свежий комментарий')
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertNotContains(response, 'Свежий комментарий')
+        call_command('prerender_pages', pending=True, stdout=StringIO())
+        self.assertFalse(StalePage.objects.exists())
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertIsNone(response.context)
+        self.assertContains(response, 'Свежий комментарий')
+
+    def test_served_post_counts_view(self):
+        self.client.get(reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertEqual(counters.flush(), {self.post.pk: 1})
@@ -0,0 +1,100 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import recommendations
+from ..models import Comment, Follow, Post, Recommendation
+
+User = get_user_model()
+
+
+PAIRS = [(1, 10), (1, 10), (1, 20), (2, 10), (2, 20), (3, 10), (3, 30)]
+
+
+class AdjacencyTests(TestCase):
+    def test_csr_rows_and_co_counts(self):
+        graph = recommendations.Adjacency(iter(PAIRS))
+        self.assertEqual(list(graph.rows), [1, 2, 3])
+        self.assertEqual(list(graph.indptr), [0, 2, 4, 6])
+        self.assertEqual(list(graph.row(2)), [10, 20])
+        self.assertEqual(list(graph.row(4)), [])
+        counts = graph.co_counts([10, 20])
+        self.assertEqual(counts[10], {10: 3, 20: 2, 30: 1})
+        self.assertEqual(counts[20], {10: 2, 20: 2})
+
+    def test_transposed_keeps_rows_ordered(self):
+        transposed = recommendations.Adjacency(PAIRS).transposed
+        self.assertEqual(list(transposed.rows), [10, 20, 30])
+        self.assertEqual(list(transposed.row(10)), [1, 2, 3])
+        self.assertEqual(list(transposed.row(30)), [3])
+
+    def test_unordered_pairs_are_rejected(self):
+        with self.assertRaises(ValueError):
+            recommendations.Adjacency([(2, 10), (1, 10)])
+
+    @skipUnless(recommendations.sparse, 'scipy не установлен')
+    def test_scipy_matches_pure_python(self):
+        graph = recommendations.ScipyAdjacency(PAIRS)
+        expected = recommendations.Adjacency(PAIRS).co_counts([10, 20, 30])
+        self.assertEqual(graph.co_counts([10, 20, 30]), expected)
+
+
+class RecommendationTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.writer, cls.twin, cls.loner, cls.talker = [
+            User.objects.create_user(username=name)
+            for name in ('writer', 'twin', 'loner', 'talker')]
+        cls.readers = [
+            User.objects.create_user(username=f'reader{i}') for i in range(3)]
+        for reader in cls.readers:
+            Follow.objects.create(user=reader, author=cls.writer)
+            Follow.objects.create(user=reader, author=cls.twin)
+        Follow.objects.create(user=cls.readers[0], author=cls.loner)
+        cls.newcomer = User.objects.create_user(username='newcomer')
+        for author in (cls.writer, cls.loner):
+            Follow.objects.create(user=cls.newcomer, author=author)
+        # talker близок к writer только по комментариям
+        commenter = cls.readers[2]
+        for author in (cls.writer, cls.talker):
+            post = Post.objects.create(text='Пост', author=author)
+            Comment.objects.create(post=post, author=commenter, text='Ок')
+
+    def setUp(self):
+        cache.clear()
+        call_command('update_recommendations', stdout=StringIO())
+
+    def test_similar_authors_by_follows_and_comments(self):
+        self.assertEqual(
+            recommendations.similar_authors(self.writer),
+            [self.twin, self.loner, self.talker])
+
+    def test_suggestions_skip_followed_authors(self):
+        self.assertEqual(
+            recommendations.suggested_authors(self.newcomer),
+            [self.twin, self.talker])
+        self.assertNotIn(
+            self.writer, recommendations.suggested_authors(self.readers[0]))
+        self.assertFalse(
+            Recommendation.objects.filter(pk=self.newcomer.pk).exclude(
+                similar='').exists())
+
+    def test_pages_show_recommendations(self):
+        client = Client()
+        client.force_login(self.newcomer)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            response.context['suggested_authors'][0], self.twin)
+        self.assertContains(response, 'Вам могут понравиться')
+        response = client.get(
+            reverse('posts:profile', args=[self.writer.username]))
+        self.assertContains(response, 'Похожие авторы')
+        self.assertContains(
+            response, reverse('posts:profile', args=[self.twin.username]))
@@ -0,0 +1,203 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import jobs
+from users import removal
+from .. import bulk, counters, sharding, trending
+from ..archive import archive_chunk
+from ..models import ArchivedPost, Comment, Follow, Group, MovedPost, Post
+
+User = get_user_model()
+
+SHARDS = ('default', 'shard_1', 'shard_2')
+
+
+@skipUnless(
+    set(SHARDS) <= set(settings.DATABASES),
+    'Шарды не объявлены: POST_SHARDS=default,shard_1,shard_2')
+@override_settings(POST_SHARDS=SHARDS)
+class ShardingTests(TestCase):
+    databases = set(SHARDS)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='shards', description='')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}')
+            for i in range(3)
+        ]
+        cls.reader = User.objects.create_user(username='reader')
+        for i in range(4):
+            for author in cls.authors:
+                Post.objects.create(
+                    text=f'Пост {i} {author}', author=author,
+                    group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_posts_live_in_author_shard(self):
+        """Посты лежат в шарде автора, id указывает на тот же шард."""
+        for author in self.authors:
+            alias = sharding.shard_for_author(author.pk)
+            with self.subTest(alias=alias):
+                posts = Post.objects.using(alias).filter(author=author)
+                self.assertEqual(posts.count(), 4)
+                for pk in posts.values_list('pk', flat=True):
+                    self.assertEqual(sharding.shard_for_id(pk), alias)
+        self.assertEqual(
+            len(set(Post.objects.using('shard_1').values_list(
+                'pk', flat=True)) & set(Post.objects.values_list(
+                    'pk', flat=True))),
+            0)
+
+    def test_users_and_groups_are_replicated(self):
+        for alias in SHARDS[1:]:
+            with self.subTest(alias=alias):
+                self.assertTrue(
+                    User.objects.using(alias).filter(
+                        username='reader').exists())
+                self.assertTrue(
+                    Group.objects.using(alias).filter(slug='shards').exists())
+
+    def test_index_merges_shards_by_date(self):
+        response = self.client.get(reverse('posts:index'))
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, 12)
+        dates = [post.pub_date for post in page]
+        self.assertEqual(len(dates), 10)
+        self.assertEqual(dates, sorted(dates, reverse=True))
+        response = self.client.get(reverse('posts:index'), {'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_follow_index_reads_followed_shards(self):
+        author = self.authors[1]
+        Follow.objects.create(user=self.reader, author=author)
+        response = self.client.get(reverse('posts:follow_index'))
+        posts = list(response.context['page_obj'])
+        self.assertEqual(len(posts), 4)
+        self.assertTrue(all(post.author == author for post in posts))
+
+    def test_profile_and_post_detail_use_one_shard(self):
+        author = self.authors[2]
+        post = Post.objects.using(
+            sharding.shard_for_author(author.pk)).filter(author=author)[0]
+        response = self.client.get(
+            reverse('posts:profile', args=[author.username]))
+        self.assertEqual(response.context['page_obj'].paginator.count, 4)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk]))
+        self.assertEqual(response.context['post'], post)
+
+    def test_comment_is_stored_with_post(self):
+        author = self.authors[1]
+        alias = sharding.shard_for_author(author.pk)
+        post = Post.objects.using(alias).filter(author=author)[0]
+        self.client.post(
+            reverse('posts:add_comment', args=[post.pk]),
+            {'text': 'Комментарий'})
+        comment = Comment.objects.using(alias).get(post=post)
+        self.assertEqual(comment.author, self.reader)
+        self.assertEqual(sharding.shard_for_id(comment.pk), alias)
+
+    def test_group_and_trending_read_every_shard(self):
+        response = self.client.get(
+            reverse('posts:group_list', args=[self.group.slug]))
+        self.assertEqual(response.context['page_obj'].paginator.count, 10)
+        posts = [
+            Post.objects.using(sharding.shard_for_author(author.pk)).filter(
+                author=author)[0]
+            for author in self.authors
+        ]
+        for post in posts:
+            counters.register_view(post.pk)
+        counters.flush()
+        for post in posts:
+            self.assertEqual(
+                Post.objects.using(sharding.shard_for_id(post.pk)).get(
+                    pk=post.pk).views, 1)
+        self.assertCountEqual(
+            trending.refresh(), [post.pk for post in posts])
+        response = self.client.get(reverse('posts:trending'))
+        self.assertCountEqual(response.context['page_obj'], posts)
+
+    def test_removal_deletes_from_every_shard(self):
+        author = self.authors[1]
+        alias = sharding.shard_for_author(author.pk)
+        for other in self.authors:
+            post = Post.objects.using(
+                sharding.shard_for_author(other.pk)).filter(author=other)[0]
+            Comment.objects.create(post=post, author=author, text='Ок')
+        job = removal.start_removal(author, background=False)
+        self.assertFalse(
+            User.objects.using(alias).get(pk=author.pk).is_active)
+        jobs.run(job)
+        for shard in SHARDS:
+            with self.subTest(alias=shard):
+                self.assertFalse(Comment.objects.using(shard).filter(
+                    author_id=author.pk).exists())
+                self.assertFalse(Post.objects.using(shard).filter(
+                    author_id=author.pk).exists())
+
+    def test_reassign_refuses_to_move_posts_between_shards(self):
+        source, target = self.authors[:2]
+        selection = {'filters': {'author': source.pk}}
+        with self.assertRaises(bulk.BulkError):
+            bulk.start_reassign(selection, target, background=False)
+        job = bulk.start_reassign(selection, source, background=False)
+        self.assertEqual(jobs.run(job).done, 4)
+
+    def test_rebalance_moves_posts_created_before_sharding(self):
+        """Посты из default переезжают в шард автора под новыми id."""
+        self.addCleanup(sharding._rebalanced.clear)
+        self.addCleanup(sharding.recheck_rebalanced)
+        author = next(
+            author for author in self.authors
+            if sharding.shard_for_author(author.pk) != 'default')
+        alias = sharding.shard_for_author(author.pk)
+        # id указывает на третий шард: пост находится только в default
+        pk = 3000 + next(
+            index for index, shard in enumerate(SHARDS)
+            if shard not in ('default', alias))
+        legacy = Post.objects.using('default').bulk_create([
+            Post(pk=pk, text='Старый пост', author=author),
+            Post(pk=pk + 3, text='Архивный пост', author=author),
+        ])[0]
+        Comment.objects.using('default').bulk_create([Comment(
+            pk=pk, post=legacy, author=self.reader, text='Старый отзыв')])
+        archive_chunk('default', [pk + 3])
+        profile = reverse('posts:profile', args=[author.username])
+        self.assertEqual(
+            self.client.get(profile).context['page_obj'].paginator.count, 6)
+        response = self.client.get(reverse('posts:post_detail', args=[pk]))
+        self.assertEqual(response.context['post'], legacy)
+
+        call_command('rebalance_shards', stdout=StringIO())
+        self.assertTrue(sharding.rebalanced())
+        moved = dict(MovedPost.objects.values_list('old_id', 'new_id'))
+        self.assertEqual(set(moved), {pk, pk + 3})
+        post = Post.objects.using(alias).get(pk=moved[pk])
+        self.assertEqual(sharding.shard_for_id(post.pk), alias)
+        self.assertEqual(post.comments.get().text, 'Старый отзыв')
+        self.assertTrue(ArchivedPost.objects.using(alias).filter(
+            pk=moved[pk + 3], comments__isnull=True).exists())
+        self.assertFalse(Post.objects.using('default').filter(
+            author=author).exists())
+        self.assertFalse(Comment.objects.using('default').filter(
+            post_id=pk).exists())
+        self.assertEqual(
+            self.client.get(profile).context['page_obj'].paginator.count, 6)
+        response = self.client.get(reverse('posts:post_detail', args=[pk]))
+        self.assertRedirects(
+            response, reverse('posts:post_detail', args=[post.pk]),
+            status_code=301)
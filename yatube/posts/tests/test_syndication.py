@@ -0,0 +1,130 @@
+import shutil
+import tempfile
+from http import HTTPStatus
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+
+from .. import syndication
+from ..models import Group, Post, SyndicationTarget
+
+User = get_user_model()
+
+TEMP_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(SYNDICATION_ROOT=TEMP_ROOT, SITEMAP_SHARD_SIZE=2)
+class SyndicationTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(3)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        syndication.publish_all()
+
+    def get(self, path, **headers):
+        return self.client.get(
+            reverse('posts:published', args=[path]), **headers)
+
+    def test_sitemap_is_sharded(self):
+        """Посты разложены по частям карты сайта, индекс ссылается на них."""
+        index = self.client.get(reverse('posts:sitemap')).getvalue().decode()
+        shards = syndication._shard_counts()['posts']
+        self.assertEqual(shards, self.author.posts.latest('pk').pk // 2 + 1)
+        for shard in range(shards):
+            self.assertIn(f'sitemaps/posts-{shard}.xml', index)
+        urls = ''.join(
+            self.get(f'sitemaps/posts-{shard}.xml').getvalue().decode()
+            for shard in range(shards)
+        )
+        for post in self.author.posts.all():
+            self.assertIn(
+                reverse('posts:post_detail', args=[post.pk]) + '<', urls)
+
+    def test_feeds_support_conditional_get(self):
+        """Ленты отдаются с ETag, повторный запрос получает 304."""
+        response = self.get('feeds/group/test-slug/atom.xml')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            response['Content-Type'], 'application/atom+xml; charset=utf-8')
+        self.assertIn('Пост 2', response.getvalue().decode())
+        response = self.get(
+            'feeds/group/test-slug/atom.xml',
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_saved_post_republishes_its_feeds(self):
+        """Ленты поста отмечаются после коммита и пересобираются командой."""
+        with mock.patch.object(
+                transaction, 'on_commit', lambda func, using=None: func()):
+            Post.objects.create(
+                text='Новый пост', author=self.author, group=self.group)
+        self.assertNotIn(
+            'Новый пост', self.get('feeds/rss.xml').getvalue().decode())
+        call_command('publish_feeds', pending=True, stdout=StringIO())
+        self.assertFalse(SyndicationTarget.objects.exists())
+        for path in (
+            'feeds/rss.xml',
+            'feeds/group/test-slug/rss.xml',
+            'feeds/profile/writer/rss.xml',
+        ):
+            with self.subTest(path=path):
+                self.assertIn('Новый пост', self.get(path).getvalue().decode())
+
+    def test_login_does_not_mark_files(self):
+        """Вход пользователя (сохранение last_login) ничего не отмечает."""
+        with mock.patch.object(
+                transaction, 'on_commit', lambda func, using=None: func()):
+            self.client.force_login(self.author)
+        self.assertFalse(SyndicationTarget.objects.exists())
+
+    def test_missing_file_is_not_found(self):
+        response = self.get('feeds/group/missing/atom.xml')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class ScheduleTests(TransactionTestCase):
+    databases = '__all__'
+
+    def test_rolled_back_marks_are_dropped(self):
+        """Отметки откаченной транзакции не попадают в следующую."""
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                syndication.schedule('index')
+                raise RuntimeError
+        with transaction.atomic():
+            with transaction.atomic():
+                syndication.schedule('author', 1)
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    syndication.schedule('group', 2)
+                    raise RuntimeError
+            syndication.schedule('author', 1)
+        self.assertEqual(
+            list(SyndicationTarget.objects.values_list('kind', 'key')),
+            [('author', '1')])
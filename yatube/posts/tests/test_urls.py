@@ -11,6 +11,8 @@ User = get_user_model()
 
 
 class StaticURLTests(TestCase):
+    databases = '__all__'
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -1,18 +1,24 @@
 
+import re
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django import forms
 from django.core.cache import cache
+from django.utils import timezone
 
 from http import HTTPStatus
 
-from ..models import Group, Post, Follow
+from .. import counters, follow_graph, sharding, trending
+from ..models import Comment, Group, Post, Follow, TrendingScore
 
 User = get_user_model()
 
 
 class PostPagesTests(TestCase):
+    databases = '__all__'
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -158,7 +164,8 @@ class PostPagesTests(TestCase):
     def test_guest_user_create_post(self):
         """Дополнительная проверка при создании записи
         не авторизированным пользователем."""
-        posts_count = Post.objects.count()
+        posts = sharding.per_shard(Post.objects.all())
+        posts_count = sum(part.count() for part in posts)
         form_fields = {
             'text': 'Тестовый текст',
             'group': self.group.id,
@@ -170,7 +177,7 @@ class PostPagesTests(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
         redirect = reverse('login') + '?next=' + reverse('posts:post_create')
         self.assertRedirects(response, redirect)
-        self.assertEqual(Post.objects.count(), posts_count)
+        self.assertEqual(sum(part.count() for part in posts), posts_count)
 
     def test_nonauthor_post_edit(self):
         """Дополнительная проверка при редактировании записи
@@ -196,7 +203,7 @@ class PostPagesTests(TestCase):
             reverse('posts:post_detail', kwargs={'post_id': post.id})
         )
         self.assertEqual(response.status_code, HTTPStatus.OK)
-        post = Post.objects.latest('id')
+        post.refresh_from_db()
         self.assertFalse(post.text == form_data['text'])
         self.assertFalse(post.author == self.post_author)
         self.assertTrue(post.group_id == form_data['group'])
@@ -219,6 +226,8 @@ class PostPagesTests(TestCase):
 
 
 class PaginatorViewsTest(TestCase):
+    databases = '__all__'
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -272,6 +281,8 @@ class PaginatorViewsTest(TestCase):
 
 
 class FollowViewsTest(TestCase):
+    databases = '__all__'
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -337,3 +348,226 @@ class FollowViewsTest(TestCase):
         response = self.author_client.get(
             reverse('posts:follow_index'))
         self.assertNotIn(post, response.context['page_obj'].object_list)
+
+
+class TrendingViewsTest(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        counters.flush()
+        cls.user = User.objects.create_user(username='trend_author')
+        cls.quiet_post = Post.objects.create(
+            text='Тихий пост',
+            author=cls.user,
+        )
+        cls.hot_post = Post.objects.create(
+            text='Популярный пост',
+            author=cls.user,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_views_are_flushed_in_batch(self):
+        """Просмотры копятся в памяти и пишутся в базу при сбросе."""
+        url = reverse('posts:post_detail', args=[self.hot_post.id])
+        for _ in range(3):
+            self.client.get(url)
+        self.hot_post.refresh_from_db()
+        self.assertEqual(self.hot_post.views, 0)
+        counters.flush()
+        self.hot_post.refresh_from_db()
+        self.assertEqual(self.hot_post.views, 3)
+
+    def test_events_add_up_in_database(self):
+        """Веса событий складываются выражением над текущим рейтингом."""
+        now = timezone.now()
+        trending.add_events({self.quiet_post.id: 1}, now=now)
+        trending.add_events({self.quiet_post.id: 3}, now=now)
+        score = TrendingScore.objects.using(
+            self.quiet_post._state.db).get(post=self.quiet_post)
+        self.assertAlmostEqual(score.hot, trending._exponent(now) + 2)
+
+    def test_trending_page_order(self):
+        """Лента популярного упорядочена по рейтингу."""
+        counters.register_view(self.quiet_post.id)
+        for _ in range(3):
+            counters.register_view(self.hot_post.id)
+        counters.flush()
+        self.assertEqual(sum(
+            scores.count()
+            for scores in sharding.per_shard(TrendingScore.objects.all())), 2)
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [self.hot_post, self.quiet_post],
+        )
+
+
+class FollowGraphTest(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author_{i}')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_batched_membership(self):
+        """Подписки на нескольких авторов проверяются одним вызовом."""
+        Follow.objects.create(user=self.reader, author=self.authors[1])
+        author_ids = [author.pk for author in self.authors]
+        with self.assertNumQueries(1):
+            follows = follow_graph.follows(self.reader, author_ids)
+        self.assertEqual(
+            follows, dict(zip(author_ids, (False, True, False))))
+        with self.assertNumQueries(0):
+            follow_graph.follows(self.reader, author_ids)
+
+    def test_invalidated_by_follow_signals(self):
+        """Подписка и отписка сбрасывают закешированный граф."""
+        author = self.authors[0]
+        self.assertFalse(follow_graph.follows(
+            self.reader, [author.pk])[author.pk])
+        self.assertEqual(follow_graph.follower_counts([author.pk]), {
+            author.pk: 0})
+        follow = Follow.objects.create(user=self.reader, author=author)
+        self.assertTrue(follow_graph.follows(
+            self.reader, [author.pk])[author.pk])
+        self.assertEqual(follow_graph.follower_counts([author.pk]), {
+            author.pk: 1})
+        follow.delete()
+        self.assertFalse(follow_graph.follows(
+            self.reader, [author.pk])[author.pk])
+
+
+class HoleCacheViewsTest(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='hole_author')
+        cls.post = Post.objects.create(
+            text='Пост с дырками',
+            author=cls.author,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.url = reverse('posts:post_detail', args=[self.post.id])
+
+    def test_viewer_fragments_on_cached_page(self):
+        """Общая часть берётся из кеша, кнопки рисуются для зрителя."""
+        edit_url = reverse('posts:edit', args=[self.post.id])
+        response = self.guest_client.get(self.url)
+        self.assertTemplateUsed(response, 'posts/post_detail.html')
+        self.assertNotContains(response, edit_url)
+        response = self.author_client.get(self.url)
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html')
+        self.assertContains(response, edit_url)
+        self.assertContains(response, 'hole_author')
+
+    def test_comment_invalidates_page(self):
+        """Новый комментарий сбрасывает закешированную страницу."""
+        self.guest_client.get(self.url)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Свежий комментарий')
+        response = self.guest_client.get(self.url)
+        self.assertContains(response, 'Свежий комментарий')
+
+
+CSRF_RE = re.compile(rb'name="csrfmiddlewaretoken" value="\w+"')
+
+
+class StreamingViewsTest(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='streamer')
+        cls.post = Post.objects.create(
+            text='Пост с длинным обсуждением', author=cls.author)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'Ответ {i}')
+            for i in range(5)
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author) for i in range(3))
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_streamed_pages_match_rendered(self):
+        """Потоковая страница совпадает с обычной и идёт частями."""
+        for url in (
+            reverse('posts:post_detail', args=[self.post.id]),
+            reverse('posts:profile', args=[self.author.username]),
+        ):
+            with self.subTest(url=url):
+                expected = self.client.get(url).content
+                with override_settings(
+                    STREAMING_TEMPLATES={
+                        'posts/post_detail.html', 'posts/profile.html'},
+                    STREAM_CHUNK_SIZE=2,
+                ):
+                    response = self.client.get(url)
+                    chunks = list(response.streaming_content)
+                self.assertTrue(response.streaming)
+                self.assertIn(b'<head>', chunks[0])
+                self.assertGreater(len(chunks), 3)
+                self.assertEqual(
+                    CSRF_RE.sub(b'', b''.join(chunks)),
+                    CSRF_RE.sub(b'', expected),
+                )
+
+
+@override_settings(POST_EXCERPT_LENGTH=20)
+class ExcerptViewsTest(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='excerpt')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Длинный пост ' + 'очень ' * 100)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_show_excerpt_without_full_text(self):
+        self.assertEqual(self.post.excerpt_html, 'Длинный пост очень…')
+        self.assertTrue(self.post.has_more)
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.user.username]),
+        ):
+            with self.subTest(url=url):
+                response = Client().get(url)
+                shown = response.context['page_obj'][0]
+                self.assertIn('text', shown.get_deferred_fields())
+                self.assertContains(response, 'Длинный пост очень…')
+                self.assertNotContains(response, 'очень очень очень')
+                self.assertContains(response, 'Читать дальше')
+
+    def test_preview_does_not_load_deferred_text(self):
+        self.user.posts.filter(pk=self.post.pk).update(excerpt_html='')
+        post = self.user.posts.previews().get(pk=self.post.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(post.preview, '')
+        post = self.user.posts.get(pk=self.post.pk)
+        self.assertEqual(post.preview, 'Длинный пост очень…')
@@ -0,0 +1,140 @@
+"""Готовый HTML текста постов и комментариев.
+
+Текст экранируется и получает <br> на месте переводов строк один раз —
+при сохранении записи — и хранится в поле text_html. Шаблоны выводят
+готовый post.body вместо фильтров linebreaks/linebreaksbr на каждый
+показ. У постов так же хранится начало текста (excerpt_html, не длиннее
+POST_EXCERPT_LENGTH символов) для лент: они не загружают полный текст
+(PostQuerySet.previews) и ведут на страницу поста ссылкой «Читать
+дальше». Начала старых постов заполнила миграция; полный HTML записей,
+сохранённых до появления полей, рендерится на лету, пока команда
+render_texts не заполнит его. Отложенный текст при этом не загружается:
+у поста из ленты без начала preview пуст, а не делает запрос на пост.
+
+Страница поста выводит текст абзацами, как фильтр linebreaks
+(paragraphs): их не нужно хранить отдельно, они получаются из text_html
+разбиением по пустым строкам — двум и более <br> подряд.
+"""
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.text import normalize_newlines
+
+
+PARAGRAPH_BREAK_RE = re.compile(r'(?:<br>){2,}')
+
+
+def render(text):
+    """Безопасный HTML текста: то же, что фильтр linebreaksbr."""
+    return escape(normalize_newlines(text)).replace('\n', '<br>')
+
+
+def paragraphs(html):
+    """Абзацы из HTML render(): то же, что фильтр linebreaks."""
+    return '\n\n'.join(
+        f'<p>{part}</p>' for part in PARAGRAPH_BREAK_RE.split(html))
+
+
+def has_more(text):
+    return len(text) > settings.POST_EXCERPT_LENGTH
+
+
+def excerpt(text):
+    """HTML начала текста, обрезанного по границе слова."""
+    if not has_more(text):
+        return render(text)
+    cut = text[:settings.POST_EXCERPT_LENGTH]
+    if ' ' in cut.strip():
+        cut = cut.rstrip().rsplit(maxsplit=1)[0]
+    return render(cut.rstrip()) + '…'
+
+
+RENDERERS = {
+    'text_html': render,
+    'excerpt_html': excerpt,
+    'has_more': has_more,
+}
+
+
+class RenderedText:
+    """Примесь моделей с полем text и полями rendered_fields из него."""
+    rendered_fields = ('text_html',)
+
+    @property
+    def body(self):
+        return mark_safe(self.text_html or render(self.text))
+
+    @property
+    def paragraphs(self):
+        return mark_safe(paragraphs(self.body))
+
+    @property
+    def preview(self):
+        if self.excerpt_html or 'text' in self.get_deferred_fields():
+            return mark_safe(self.excerpt_html)
+        return mark_safe(excerpt(self.text))
+
+    def render_text(self):
+        for field, value in render_fields(
+                self.rendered_fields, self.text).items():
+            setattr(self, field, value)
+
+    def save(self, *args, **kwargs):
+        self.render_text()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, *self.rendered_fields}
+        super().save(*args, **kwargs)
+
+
+def render_fields(fields, text):
+    return {field: RENDERERS[field](text) for field in fields}
+
+
+def _render_rows(fields, rows):
+    return [(pk, render_fields(fields, text)) for pk, text in rows]
+
+
+def _chunks(queryset, size):
+    last = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last).order_by('pk').values_list(
+            'pk', 'text')[:size])
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield rows
+
+
+def backfill(queryset, workers=None, chunk_size=500):
+    """Заполняет rendered_fields записей queryset, рендеря в процессах.
+
+    Процессы только рендерят, читает и пишет в базу текущий процесс,
+    поэтому соединения с базой процессам не нужны. В очереди держится
+    не больше workers + 1 пачек. Возвращает число обновлённых записей.
+    """
+    model, alias = queryset.model, queryset.db
+    fields = model.rendered_fields
+    workers = workers or os.cpu_count() or 1
+    done = 0
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for rows in _chunks(queryset, chunk_size):
+            pending.append(executor.submit(_render_rows, fields, rows))
+            if len(pending) > workers:
+                done += _save(
+                    model, alias, fields, pending.popleft().result())
+        while pending:
+            done += _save(model, alias, fields, pending.popleft().result())
+    return done
+
+
+def _save(model, alias, fields, rendered):
+    model.objects.using(alias).bulk_update(
+        [model(pk=pk, **values) for pk, values in rendered], fields)
+    return len(rendered)
@@ -0,0 +1,103 @@
+"""Лента популярных постов.
+
+Рейтинг поста — сумма весов просмотров и комментариев, каждый из
+которых затухает вдвое за TRENDING_HALF_LIFE секунд. Рейтинг хранится
+в логарифмической шкале относительно фиксированной эпохи: новые события
+просто прибавляются к нему, а старые не нужно пересчитывать.
+
+Сложение выполняет сама база выражением над текущим значением hot,
+поэтому события, которые одновременно сбрасывают несколько процессов,
+не затирают друг друга. Рейтинг лежит в шарде своего поста, а общий
+список популярного сливается из лучших рейтингов каждого шарда.
+"""
+import heapq
+import math
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Greatest, Least, Log, Power
+from django.utils import timezone
+
+from . import sharding
+from .models import Post, TrendingScore
+
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+RANKING_KEY = 'trending:ranking'
+# Рейтинг поста без событий: 2 ** EMPTY неотличимо от нуля
+EMPTY = -1e6
+# Слагаемые, меньшие в 2 ** MAX_GAP раз, на сумму не влияют; ограничение
+# не даёт POWER уйти в исчезновение порядка
+MAX_GAP = 64
+
+
+def _exponent(now=None):
+    now = now or timezone.now()
+    return (now - EPOCH).total_seconds() / settings.TRENDING_HALF_LIFE
+
+
+def _log2_add(value):
+    """Выражение log2(2 ** hot + 2 ** value) для UPDATE."""
+    value = Value(value, output_field=FloatField())
+    high = Greatest(F('hot'), value)
+    low = Least(F('hot'), value)
+    return high + Log(2, 1 + Power(2, Greatest(low - high, -MAX_GAP)))
+
+
+def add_events(weights, now=None):
+    """Добавляет к рейтингам постов веса событий {post_id: вес}.
+
+    Недостающие строки сначала создаются пустыми, затем веса
+    прибавляются одним UPDATE на каждое различное значение веса —
+    в каждом шарде, где лежат посты.
+    """
+    base = _exponent(now)
+    for alias, ids in sharding.by_shard(weights).items():
+        existing = Post.objects.using(alias).filter(pk__in=ids).values_list(
+            'pk', flat=True)
+        scores = TrendingScore.objects.using(alias)
+        scores.bulk_create(
+            [TrendingScore(post_id=pk, hot=EMPTY) for pk in existing],
+            ignore_conflicts=True,
+        )
+        by_weight = defaultdict(list)
+        for post_id in ids:
+            by_weight[weights[post_id]].append(post_id)
+        for weight, post_ids in by_weight.items():
+            scores.filter(post_id__in=post_ids).update(
+                hot=_log2_add(base + math.log2(weight)))
+
+
+def ranking():
+    """Возвращает id популярных постов из заранее посчитанного рейтинга.
+
+    Рейтинг перечитывается по индексу не чаще раза в TRENDING_REFRESH
+    секунд, таблица постов при этом не сортируется.
+    """
+    post_ids = cache.get(RANKING_KEY)
+    if post_ids is None:
+        post_ids = refresh()
+    return post_ids
+
+
+def refresh():
+    size = settings.TRENDING_SIZE
+    tops = [
+        scores.order_by('-hot').values_list('hot', 'post_id')[:size]
+        for scores in sharding.per_shard(TrendingScore.objects.all())
+    ]
+    merged = heapq.merge(*tops, key=lambda row: row[0], reverse=True)
+    post_ids = [post_id for _, post_id in islice(merged, size)]
+    cache.set(RANKING_KEY, post_ids, settings.TRENDING_REFRESH)
+    return post_ids
+
+
+def prune(now=None):
+    """Удаляет рейтинги, затухшие ниже TRENDING_MIN_SCORE."""
+    threshold = _exponent(now) + math.log2(settings.TRENDING_MIN_SCORE)
+    return sum(
+        scores.filter(hot__lt=threshold).delete()[0]
+        for scores in sharding.per_shard(TrendingScore.objects.all()))
@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 
 from . import views
 
@@ -14,6 +14,7 @@ urlpatterns = [
     path('posts/<int:post_id>/comment/',
          views.add_comment, name='add_comment'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('trending/', views.trending_index, name='trending'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -24,5 +25,20 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
-
+    path(
+        'group/<slug:slug>/subscribe/',
+        views.group_subscribe,
+        name='group_subscribe'
+    ),
+    path(
+        'group/<slug:slug>/unsubscribe/',
+        views.group_unsubscribe,
+        name='group_unsubscribe'
+    ),
+    path('sitemap.xml', views.published, {'path': 'sitemap.xml'},
+         name='sitemap'),
+    path('robots.txt', views.published, {'path': 'robots.txt'},
+         name='robots'),
+    re_path(r'^(?P<path>(?:sitemaps|feeds)/[\w@.+/-]+\.xml)$',
+            views.published, name='published'),
 ]
@@ -1,10 +1,26 @@
+import os
+from datetime import datetime, timezone
+
 from django.shortcuts import render, get_object_or_404, redirect
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
 from django.core.paginator import Paginator
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.http import Http404
+from django.utils._os import safe_join
 from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
+from django.views.static import serve
 
-from .models import Post, Group, Follow
+from core import holes, streaming
+from core.ratelimit import rate_limit
+from core.rendering import engine_for
+from . import (
+    archive, counters, editing, feed, follow_graph, recommendations,
+    sharding, trending,
+)
+from .models import Post, Group, Follow, GroupSubscription, MovedPost
 from .forms import PostForm, CommentForm
 
 QUANTITY_POSTS = 10
@@ -20,102 +36,181 @@ def paginator(request, post_list):
 
 @cache_page(20, key_prefix="index_page")
 def index(request):
-    post_list = Post.objects.all()
+    post_list = sharding.scatter(
+        Post.objects.visible().previews().select_related('author', 'group'))
+    template = 'posts/index.html'
     context = {
         'page_obj': paginator(request, post_list),
     }
-    return render(request, 'posts/index.html', context)
+    return render(request, template, context, using=engine_for(template))
 
 
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related('author')[:QUANTITY_POSTS]
+    post_list = sharding.scatter(
+        group.posts.visible().previews().select_related('author')
+    )[:QUANTITY_POSTS]
+    subscribed = request.user.is_authenticated and (
+        GroupSubscription.objects.filter(
+            user=request.user, group=group).exists())
     context = {
         'page_obj': paginator(request, post_list),
         'group': group,
         'posts': post_list,
+        'subscribed': subscribed,
     }
     return render(request, template, context)
 
 
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    following = request.user.is_authenticated
-    if following:
-        following = author.following.filter(user=request.user).exists()
+    author = get_object_or_404(
+        User, username=username, pending_removal__isnull=True)
+    page_number = request.GET.get('page', '')
+    if not page_number.isdigit():
+        page_number = '1'
+    key = 'holes:profile:{}:{}:{}'.format(
+        author.pk, page_number, holes.versions(f'author:{author.pk}'))
+
+    def get_context():
+        post_list = archive.posts_of(author)
+        return {
+            'page_obj': paginator(request, post_list),
+            'similar_authors': recommendations.similar_authors(author),
+        }
+
+    following = follow_graph.follows(request.user, [author.pk])[author.pk]
+    followers = follow_graph.follower_counts([author.pk])
     context = {
-        'page_obj': paginator(request, post_list),
         'author': author,
-        'following': following
+        'following': following,
+        'followers_count': followers[author.pk],
     }
-    return render(request, 'posts/profile.html', context)
+    template = 'posts/profile.html'
+    if streaming.is_streaming(template):
+        return streaming.render(
+            request, template, {**get_context(), **context})
+    return holes.render_cached(
+        request, template, key, get_context, context,
+        using=engine_for(template))
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = archive.find_post(post_id)
+    if post is None:
+        moved = MovedPost.objects.filter(old_id=post_id).first()
+        if moved is None:
+            raise Http404
+        return redirect('posts:post_detail', moved.new_id, permanent=True)
     template = 'posts/post_detail.html'
-    comments = post.comments.all()
+    prerendering = getattr(request, 'prerendering', False)
+    if not prerendering and not getattr(post, 'is_archived', False):
+        counters.register_view(post.id)
+    key = 'holes:post_detail:{}:{}'.format(post.pk, holes.versions(
+        f'post:{post.pk}', f'author:{post.author_id}'))
+
+    def get_context():
+        comments = post.comments.filter(
+            author__pending_removal__isnull=True).select_related('author')
+        return {'comments': comments}
+
     form = CommentForm()
     context = {
         'post': post,
-        'comments': comments,
         'form': form,
     }
-    return render(request, template, context)
+    if streaming.is_streaming(template):
+        return streaming.render(
+            request, template, {**get_context(), **context})
+    return holes.render_cached(request, template, key, get_context, context)
+
+
+def trending_index(request):
+    page_obj = paginator(request, trending.ranking())
+    posts = {}
+    for alias, ids in sharding.by_shard(page_obj.object_list).items():
+        queryset = Post.objects.using(alias).visible().previews()
+        posts.update(queryset.select_related('author', 'group').in_bulk(ids))
+    page_obj.object_list = [
+        posts[pk] for pk in page_obj.object_list if pk in posts]
+    context = {'page_obj': page_obj}
+    return render(request, 'posts/trending.html', context)
 
 
 @login_required
+@rate_limit('posts:post_create')
 def post_create(request):
-    form = PostForm(request.POST or None, files=request.FILES or None)
+    form = PostForm(
+        request.POST or None, files=request.FILES or None,
+        user=request.user)
     if form.is_valid():
         create_post = form.save(commit=False)
         create_post.author = request.user
         create_post.save()
+        form.release_upload()
         return redirect('posts:profile', create_post.author)
+    # Загрузка пригодится для повторной отправки формы, а файл — нет
+    form.close_upload()
     template = 'posts/create_post.html'
     context = {'form': form}
     return render(request, template, context)
 
 
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    if request.user != post.author:
+    post = get_object_or_404(sharding.posts_by_id(post_id), id=post_id)
+    if request.user.pk != post.author_id:
         return redirect('posts:post_detail', post_id)
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post)
+        instance=post,
+        user=request.user)
     if form.is_valid():
-        form.save()
-        return redirect('posts:post_detail', post_id)
+        version = request.POST.get('version', '')
+        version = int(version) if version.isdigit() else post.version
+        try:
+            editing.save_changes(form, version)
+        except editing.EditConflict:
+            form.add_error(None, (
+                'Пост изменили, пока вы его редактировали. Проверьте '
+                'текущую версию и сохраните ещё раз.'))
+            post.refresh_from_db(fields=['version'])
+        else:
+            form.release_upload()
+            return redirect('posts:post_detail', post_id)
+    form.close_upload()
     template = 'posts/create_post.html'
     context = {'form': form, 'post': post, 'is_edit': True}
     return render(request, template, context)
 
 
 @login_required
+@rate_limit('posts:add_comment')
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(sharding.posts_by_id(post_id), id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
         comment.save()
+        counters.register_comment(post.id)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user)
-    context = {'page_obj': paginator(request, posts)}
+    cursor = feed.decode_cursor(request.GET.get('before'))
+    page_obj = feed.read(request.user, cursor, QUANTITY_POSTS)
+    context = {
+        'page_obj': page_obj,
+        'suggested_authors': recommendations.suggested_authors(request.user),
+    }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@rate_limit('posts:profile_follow', methods=('GET', 'POST'))
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -132,3 +227,51 @@ def profile_unfollow(request, username):
     )
     user_follower.delete()
     return redirect('posts:profile', username)
+
+
+@login_required
+@rate_limit('posts:group_subscribe', methods=('GET', 'POST'))
+def group_subscribe(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    GroupSubscription.objects.get_or_create(user=request.user, group=group)
+    return redirect('posts:group_list', slug)
+
+
+@login_required
+def group_unsubscribe(request, slug):
+    GroupSubscription.objects.filter(
+        user=request.user, group__slug=slug).delete()
+    return redirect('posts:group_list', slug)
+
+
+FEED_CONTENT_TYPES = {
+    'atom.xml': 'application/atom+xml; charset=utf-8',
+    'rss.xml': 'application/rss+xml; charset=utf-8',
+}
+
+
+def _published_stat(path):
+    try:
+        return os.stat(safe_join(settings.SYNDICATION_ROOT, path))
+    except (OSError, SuspiciousFileOperation):
+        return None
+
+
+def _published_etag(request, path):
+    stat = _published_stat(path)
+    return stat and f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+
+def _published_modified(request, path):
+    stat = _published_stat(path)
+    return stat and datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+
+
+@condition(etag_func=_published_etag, last_modified_func=_published_modified)
+def published(request, path):
+    """Готовые карты сайта и ленты из posts.syndication."""
+    response = serve(request, path, document_root=settings.SYNDICATION_ROOT)
+    content_type = FEED_CONTENT_TYPES.get(path.rsplit('/', 1)[-1])
+    if content_type:
+        response['Content-Type'] = content_type
+    return response
@@ -0,0 +1,53 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin
+
+from posts import sharding
+from .removal import start_removal
+
+User = get_user_model()
+
+
+class RemovableUserAdmin(UserAdmin):
+    actions = ('remove_accounts',)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def delete_model(self, request, obj):
+        start_removal(obj)
+
+    def get_deleted_objects(self, objs, request):
+        """Сводка для подтверждения удаления без обхода связанных строк.
+
+        Стандартная сводка загружает в память все зависимые записи, а
+        удаляет их всё равно фоновая задача, поэтому здесь только числа.
+        """
+        users = list(objs)
+        pks = [user.pk for user in users]
+        model_count = {
+            label: sum(
+                queryset.count()
+                for model in models
+                for queryset in sharding.per_shard(
+                    model.objects.filter(author_id__in=pks))
+            )
+            for label, models in (
+                ('посты', sharding.POST_MODELS),
+                ('комментарии', sharding.COMMENT_MODELS),
+            )
+        }
+        return [str(user) for user in users], model_count, set(), []
+
+    def remove_accounts(self, request, queryset):
+        for user in queryset:
+            start_removal(user)
+        self.message_user(
+            request, f'Аккаунтов поставлено на удаление: {len(queryset)}.')
+    remove_accounts.short_description = 'Удалить аккаунты с контентом'
+
+
+admin.site.unregister(User)
+admin.site.register(User, RemovableUserAdmin)
@@ -0,0 +1,127 @@
+"""Выгрузка данных пользователя одним zip-архивом.
+
+Архив собирается на лету, пока отдаётся ответ. ZipFile пишет в буфер
+без seek — размеры записей он дописывает после их данных, — а генератор
+сразу забирает из буфера готовые байты. Посты и комментарии (вместе с
+архивными, со всех шардов) читаются пачками по EXPORT_CHUNK_SIZE и
+пишутся строками JSON Lines, картинки копируются из хранилища кусками
+по EXPORT_READ_SIZE байт без временных копий. Поэтому память не
+зависит от того, сколько у пользователя постов.
+"""
+import json
+import logging
+import zipfile
+from itertools import chain
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+from posts import sharding
+from posts.models import ArchivedComment, ArchivedPost, Comment, Post
+
+logger = logging.getLogger(__name__)
+
+POST_FIELDS = ('id', 'text', 'pub_date', 'group__slug', 'image')
+COMMENT_FIELDS = ('id', 'post_id', 'text', 'created')
+
+
+class _Buffer:
+    """Поток для ZipFile: копит записанное, пока его не заберут."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _rows(queryset, fields):
+    """Строки queryset пачками по EXPORT_CHUNK_SIZE с продолжением по id."""
+    last = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last).order_by('pk').values(
+            *fields)[:settings.EXPORT_CHUNK_SIZE])
+        if not rows:
+            return
+        last = rows[-1]['id']
+        yield from rows
+
+
+def _posts(user):
+    for alias in sharding.author_shards(user.pk):
+        for model in (Post, ArchivedPost):
+            yield from _rows(
+                model.objects.using(alias).filter(author_id=user.pk),
+                POST_FIELDS)
+
+
+def _comments(user):
+    for alias in sharding.shards():
+        for model in (Comment, ArchivedComment):
+            yield from _rows(
+                model.objects.using(alias).filter(author_id=user.pk),
+                COMMENT_FIELDS)
+
+
+def _images(user):
+    for post in _posts(user):
+        if post['image']:
+            yield post['image']
+
+
+def _write_records(archive, buffer, name, records):
+    with archive.open(name, 'w', force_zip64=True) as entry:
+        for record in records:
+            entry.write(json.dumps(
+                record, cls=DjangoJSONEncoder, ensure_ascii=False
+            ).encode() + b'\n')
+            yield buffer.take()
+
+
+def _write_image(archive, buffer, name):
+    try:
+        source = default_storage.open(name, 'rb')
+    except (OSError, SuspiciousFileOperation):
+        logger.warning('Картинка %s не найдена, пропускаем', name)
+        return
+    # Картинки уже сжаты, поэтому кладутся в архив как есть
+    info = zipfile.ZipInfo(f'images/{name}')
+    info.compress_type = zipfile.ZIP_STORED
+    with source, archive.open(info, 'w', force_zip64=True) as entry:
+        while True:
+            data = source.read(settings.EXPORT_READ_SIZE)
+            if not data:
+                break
+            entry.write(data)
+            yield buffer.take()
+
+
+def stream(user):
+    """Части zip-архива с постами, комментариями и картинками user."""
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        parts = chain(
+            [
+                _write_records(
+                    archive, buffer, 'posts.jsonl', _posts(user)),
+                _write_records(
+                    archive, buffer, 'comments.jsonl', _comments(user)),
+            ],
+            (_write_image(archive, buffer, name) for name in _images(user)),
+        )
+        for part in parts:
+            for data in part:
+                if data:
+                    yield data
+    yield buffer.take()
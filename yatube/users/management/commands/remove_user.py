@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import jobs
+from users.removal import start_removal
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Удаляет пользователя и весь его контент пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+
+    def handle(self, *args, username, **options):
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {username} не найден.')
+        job = jobs.run(
+            start_removal(user, background=False), report=self.report)
+        self.stdout.write(f'{job}: {job.get_status_display()}')
+
+    def report(self, job):
+        self.stdout.write(f'{job}: {job.done}/{job.total}')
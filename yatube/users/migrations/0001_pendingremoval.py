@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRemoval',
+            fields=[
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pending_removal', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Аккаунт на удалении',
+                'verbose_name_plural': 'Аккаунты на удалении',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:35
+
+import json
+
+from django.db import migrations
+
+
+def mark_pending_removals(apps, schema_editor):
+    """Аккаунты, которые раньше ждали удаления с одним is_active=False."""
+    alias = schema_editor.connection.alias
+    Job = apps.get_model('core', 'Job')
+    User = apps.get_model('auth', 'User')
+    PendingRemoval = apps.get_model('users', 'PendingRemoval')
+    jobs = Job.objects.using(alias).filter(name='users.delete').exclude(
+        status='done')
+    user_ids = {json.loads(params)['user_id'] for params in jobs.values_list(
+        'params', flat=True)}
+    PendingRemoval.objects.using(alias).bulk_create(
+        [
+            PendingRemoval(user_id=pk)
+            for pk in User.objects.using(alias).filter(
+                pk__in=user_ids).values_list('pk', flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_stalepage'),
+        ('users', '0001_pendingremoval'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_pending_removals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db import models
+
+from core.models import CreatedModel
+
+
+class PendingRemoval(CreatedModel):
+    """Аккаунт, поставленный на удаление (см. users.removal).
+
+    Посты и комментарии такого аккаунта скрываются сразу, пока фоновая
+    задача удаляет строки. Обычная деактивация (is_active=False) их не
+    скрывает.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='pending_removal',
+        verbose_name='Пользователь',
+    )
+
+    class Meta:
+        verbose_name = 'Аккаунт на удалении'
+        verbose_name_plural = 'Аккаунты на удалении'
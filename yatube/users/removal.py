@@ -0,0 +1,130 @@
+"""Удаление аккаунта вместе с его контентом.
+
+Аккаунт сразу отмечается (PendingRemoval) и деактивируется — его посты
+и комментарии пропадают из выдачи, а закешированные страницы с ними
+сбрасываются, — а зависимые строки удаляет фоновая задача пачками по
+BULK_CHUNK_SIZE, каждая пачка в своей короткой транзакции.
+Незавершённые загрузки (core.uploads) удаляются вместе с файлами. Посты
+и комментарии — и горячие, и архивные (posts.archive), вместе с
+картинками — удаляются в тех шардах, где лежат (см. posts.sharding).
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from core import holes, jobs, prerender, uploads
+from core.models import Upload
+from posts import sharding, syndication, trending
+from posts.bulk import delete_files
+from posts.models import Follow
+from .models import PendingRemoval
+
+User = get_user_model()
+
+
+def _everywhere(models, **filters):
+    """Запросы к каждой из models во всех шардах."""
+    return [
+        queryset
+        for model in models
+        for queryset in sharding.per_shard(model.objects.filter(**filters))
+    ]
+
+
+def _dependents(user_id):
+    aliases = sharding.author_shards(user_id)
+    return (
+        *_everywhere(sharding.COMMENT_MODELS, author_id=user_id),
+        *(
+            model.objects.using(alias).filter(post__author_id=user_id)
+            for alias in aliases
+            for model in sharding.COMMENT_MODELS
+        ),
+        Follow.objects.filter(user_id=user_id),
+        Follow.objects.filter(author_id=user_id),
+        *(
+            model.objects.using(alias).filter(author_id=user_id)
+            for alias in aliases
+            for model in sharding.POST_MODELS
+        ),
+    )
+
+
+def _delete_chunk(queryset, size):
+    model, alias = queryset.model, queryset.db
+    with transaction.atomic(using=alias):
+        pks = list(queryset.values_list('pk', flat=True)[:size])
+        chunk = model.objects.using(alias).filter(pk__in=pks)
+        images = []
+        if model in sharding.POST_MODELS:
+            images = list(
+                chunk.exclude(image='').values_list('image', flat=True))
+        chunk.delete()
+        transaction.on_commit(lambda: delete_files(images), using=alias)
+    return len(pks)
+
+
+@jobs.register('users.delete')
+def delete_account(job, user_id):
+    querysets = _dependents(user_id)
+    job.start(sum(queryset.count() for queryset in querysets))
+    for queryset in querysets:
+        while True:
+            deleted = _delete_chunk(queryset, settings.BULK_CHUNK_SIZE)
+            if not deleted:
+                break
+            job.advance(deleted)
+    # Каскад удалил бы строки загрузок, но не их файлы
+    for upload in Upload.objects.filter(user_id=user_id):
+        uploads.discard(upload)
+    User.objects.filter(pk=user_id).delete()
+    invalidate()
+
+
+def invalidate():
+    """Пересобирает популярное и файлы posts.syndication без аккаунта."""
+    trending.refresh()
+    syndication.publish_all()
+    prerender.clear()
+
+
+def _commented_posts(user_id, size):
+    """id постов с комментариями пользователя, пачками по size."""
+    for comments in _everywhere(sharding.COMMENT_MODELS, author_id=user_id):
+        post_ids = comments.order_by('post_id').values_list(
+            'post_id', flat=True).distinct()
+        last = 0
+        while True:
+            chunk = list(post_ids.filter(post_id__gt=last)[:size])
+            if not chunk:
+                break
+            last = chunk[-1]
+            yield chunk
+
+
+def forget(user_id):
+    """Сбрасывает закешированные страницы с постами и комментариями.
+
+    update(is_active=False) не вызывает сигналов, поэтому версии профиля
+    и постов с комментариями пользователя поднимаются здесь.
+    """
+    holes.bump(f'author:{user_id}')
+    for post_ids in _commented_posts(user_id, settings.BULK_CHUNK_SIZE):
+        holes.bump(*(f'post:{pk}' for pk in post_ids))
+    prerender.clear()
+
+
+def start_removal(user, background=True):
+    """Скрывает пользователя и ставит задачу на удаление его данных.
+
+    Скрывает посты и комментарии отметка PendingRemoval, а is_active=False
+    только не даёт войти в удаляемый аккаунт.
+    """
+    PendingRemoval.objects.get_or_create(user_id=user.pk)
+    User.objects.filter(pk=user.pk).update(is_active=False)
+    # update() не вызывает сигналов, которые копируют пользователя в шарды
+    if sharding.is_sharded():
+        sharding.replicate(User.objects.get(pk=user.pk))
+    forget(user.pk)
+    create = jobs.enqueue if background else jobs.create
+    return create('users.delete', user_id=user.pk)
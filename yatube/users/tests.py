@@ -0,0 +1,210 @@
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from http import HTTPStatus
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from core import uploads
+from core.models import Job, Upload
+from posts import sharding
+from posts.archive import archive_chunk
+from posts.models import ArchivedComment, Comment, Follow, Post
+from .removal import start_removal
+
+User = get_user_model()
+
+
+@override_settings(JOBS_ASYNC=False, BULK_CHUNK_SIZE=2)
+class AccountRemovalTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            UPLOAD_TEMP_DIR=os.path.join(cls.media_root, 'uploads'))
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='leaving')
+        self.reader = User.objects.create_user(username='reader')
+        self.posts = Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.user) for i in range(3))
+        self.reader_post = Post.objects.create(
+            text='Пост читателя', author=self.reader)
+        Comment.objects.create(
+            post=self.reader_post, author=self.user, text='Комментарий')
+        Comment.objects.create(
+            post=self.user.posts.first(),
+            author=self.reader,
+            text='Ответ',
+        )
+        Follow.objects.create(user=self.reader, author=self.user)
+        Follow.objects.create(user=self.user, author=self.reader)
+
+    def test_removal_deletes_content_in_chunks(self):
+        """Задача удаляет аккаунт и все зависимые записи."""
+        start_removal(self.user)
+        self.assertFalse(User.objects.filter(username='leaving').exists())
+        self.assertFalse(self.user.posts.exists())
+        self.assertEqual(list(self.reader.posts.all()), [self.reader_post])
+        self.assertFalse(any(
+            comments.exists()
+            for comments in sharding.per_shard(Comment.objects.all())))
+        self.assertFalse(Follow.objects.exists())
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.done, 7)
+
+    def test_removal_deletes_archived_content_and_images(self):
+        """Архивные посты, комментарии и картинки удаляются тоже."""
+        content = BytesIO()
+        Image.new('RGB', (8, 8), (20, 40, 60)).save(content, 'GIF')
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user,
+            image=SimpleUploadedFile('old.gif', content.getvalue()))
+        path = post.image.path
+        for archived in (post, self.reader_post):
+            archive_chunk(archived._state.db, [archived.pk])
+        self.assertTrue(self.user.archived_comments.using(
+            self.reader_post._state.db).exists())
+        # TestCase не фиксирует транзакции: колбэки выполняются сразу
+        with mock.patch.object(
+                transaction, 'on_commit',
+                lambda func, using=None: func()):
+            start_removal(self.user)
+        self.assertFalse(self.user.archived_posts.exists())
+        self.assertFalse(any(
+            comments.exists()
+            for comments in sharding.per_shard(ArchivedComment.objects.all())))
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(self.reader.archived_posts.filter(
+            pk=self.reader_post.pk).exists())
+
+    def test_removal_discards_uploads(self):
+        upload = uploads.start(self.user, 'unfinished.png', 10)
+        start_removal(self.user)
+        self.assertFalse(Upload.objects.exists())
+        self.assertFalse(os.path.exists(upload.path))
+
+    @override_settings(JOBS_ASYNC=True)
+    def test_user_hidden_before_job_runs(self):
+        """Профиль скрыт сразу, ещё до выполнения задачи."""
+        start_removal(self.user)
+        response = Client().get(
+            reverse('posts:profile', args=[self.user.username]))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_deactivated_user_content_stays_visible(self):
+        """Обычная деактивация не скрывает профиль, посты и комментарии."""
+        self.user.is_active = False
+        self.user.save()
+        client = Client()
+        response = client.get(
+            reverse('posts:profile', args=[self.user.username]))
+        self.assertContains(response, 'Пост 0')
+        response = client.get(
+            reverse('posts:post_detail', args=[self.reader_post.pk]))
+        self.assertContains(response, 'Комментарий')
+
+    @override_settings(JOBS_ASYNC=True)
+    def test_cached_comments_hidden_before_job_runs(self):
+        """Закешированная страница поста сразу теряет комментарий."""
+        url = reverse('posts:post_detail', args=[self.reader_post.pk])
+        client = Client()
+        self.assertContains(client.get(url), 'Комментарий')
+        start_removal(self.user)
+        self.assertNotContains(client.get(url), 'Комментарий')
+
+    @override_settings(JOBS_ASYNC=True)
+    def test_admin_delete_confirmation_counts_content(self):
+        """Подтверждение удаления в админке показывает только числа."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@yatube.ru', password='pass')
+        client = Client()
+        client.force_login(admin)
+        url = reverse('admin:auth_user_delete', args=[self.user.pk])
+        response = client.get(url)
+        self.assertEqual(response.context['deleted_objects'], ['leaving'])
+        self.assertEqual(
+            dict(response.context['model_count']),
+            {'посты': 3, 'комментарии': 1})
+        client.post(url, {'post': 'yes'})
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(Job.objects.get().status, Job.PENDING)
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ExportTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter')
+        content = BytesIO()
+        Image.new('RGB', (32, 32), (20, 40, 60)).save(content, 'GIF')
+        self.image = content.getvalue()
+        Post.objects.create(
+            text='Пост с картинкой', author=self.user,
+            image=SimpleUploadedFile('pic.gif', self.image))
+        for i in range(4):
+            Post.objects.create(text=f'Пост {i}', author=self.user)
+        other = Post.objects.create(
+            text='Чужой пост', author=User.objects.create_user(
+                username='neighbour'))
+        Comment.objects.create(post=other, author=self.user, text='Мой')
+        Comment.objects.create(post=other, author=other.author, text='Чужой')
+
+    def test_export_streams_zip_with_posts_comments_and_images(self):
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('users:export'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(BytesIO(b''.join(
+            response.streaming_content)))
+        posts = [
+            json.loads(line)
+            for line in archive.read('posts.jsonl').splitlines()]
+        self.assertEqual(len(posts), 5)
+        self.assertEqual(posts[0]['text'], 'Пост с картинкой')
+        comments = archive.read('comments.jsonl').splitlines()
+        self.assertEqual(
+            [json.loads(line)['text'] for line in comments], ['Мой'])
+        self.assertEqual(
+            archive.read(f'images/{posts[0]["image"]}'), self.image)
+
+    def test_export_requires_login(self):
+        response = Client().get(reverse('users:export'))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
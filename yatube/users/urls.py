@@ -24,4 +24,5 @@ urlpatterns = [
         'password_change/', PasswordChangeView.as_view(
             template_name='users/password_change.html'),
         name='password_change'),
+    path('export/', views.export_data, name='export'),
 ]
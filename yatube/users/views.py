@@ -1,6 +1,10 @@
+from django.contrib.auth.decorators import login_required
+from django.http import StreamingHttpResponse
 from django.views.generic import CreateView
 from django.urls import reverse_lazy
 
+from core.ratelimit import rate_limit
+from . import export
 from .forms import CreationForm
 
 
@@ -8,3 +12,14 @@ class SignUp(CreateView):
     form_class = CreationForm
     success_url = reverse_lazy('posts:index')
     template_name = 'users/signup.html'
+
+
+@login_required
+@rate_limit('users:export', methods=('GET',))
+def export_data(request):
+    """Zip-архив с данными пользователя, собираемый на лету."""
+    response = StreamingHttpResponse(
+        export.stream(request.user), content_type='application/zip')
+    response['Content-Disposition'] = (
+        f'attachment; filename="yatube-{request.user.username}.zip"')
+    return response
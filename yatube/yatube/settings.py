@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import importlib.util
 import os
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -61,34 +62,56 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.compression.CompressionMiddleware',
+    'core.prerender.PrerenderMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.ratelimit.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.querycheck.QueryCheckMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
 
+CONTEXT_PROCESSORS = [
+    'django.template.context_processors.debug',
+    'django.template.context_processors.request',
+    'django.contrib.auth.context_processors.auth',
+    'django.contrib.messages.context_processors.messages',
+    'core.context_processors.year.year',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.debug',
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-                'core.context_processors.year.year',
-            ],
+            'context_processors': CONTEXT_PROCESSORS,
         },
     },
 ]
 
+# Необязательный движок Jinja2 для горячих шаблонов. Шаблоны из
+# JINJA2_TEMPLATES рендерятся им, если пакет jinja2 установлен.
+if importlib.util.find_spec('jinja2') is not None:
+    TEMPLATES.append({
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'NAME': 'jinja2',
+        'DIRS': [os.path.join(BASE_DIR, 'templates', 'jinja2')],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            'environment': 'core.jinja2.environment',
+            'context_processors': CONTEXT_PROCESSORS,
+        },
+    })
+
+JINJA2_TEMPLATES = set()
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
@@ -99,9 +122,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
 }
 
+DATABASE_ROUTERS = ['posts.sharding.ShardRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -153,3 +178,170 @@ CACHES = {
 }
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Просмотры постов копятся в памяти и пишутся в базу пачками
+POST_VIEWS_FLUSH_SIZE = 100
+POST_VIEWS_FLUSH_INTERVAL = 10
+
+# Лента популярного: период полураспада рейтинга в секундах,
+# вес комментария относительно просмотра, размер и время жизни
+# закешированного рейтинга, порог удаления затухших записей
+TRENDING_HALF_LIFE = 60 * 60 * 12
+TRENDING_COMMENT_WEIGHT = 5
+TRENDING_SIZE = 100
+TRENDING_REFRESH = 60
+TRENDING_MIN_SCORE = 0.5
+
+# Админка: начиная с этого числа строк вместо COUNT(*) по таблице
+# используется оценка из статистики СУБД
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+# Фоновые задачи core.jobs: выполнять в потоке после коммита или сразу
+JOBS_ASYNC = True
+# Аренда задачи: если задача столько секунд не сообщает о прогрессе,
+# её обработчик считается погибшим и run_jobs перезапускает её
+JOBS_LEASE = 600
+
+# Размер пачки для массовых операций над постами
+BULK_CHUNK_SIZE = 1000
+
+# Граф подписок: сколько пользователей держать в памяти процесса и
+# класть ли сами массивы подписок в общий кеш
+FOLLOW_GRAPH_SIZE = 10000
+FOLLOW_GRAPH_SHARED = False
+
+# Время жизни общей части страниц профиля и поста в кеше
+HOLE_CACHE_TIMEOUT = 60 * 5
+
+# Прогрев процесса при загрузке yatube.wsgi: сколько групп и профилей
+# открыть заранее, помимо главной и ленты популярного
+WARMUP_ON_START = not DEBUG
+WARMUP_TOP_GROUPS = 5
+WARMUP_TOP_PROFILES = 10
+
+# Адрес сайта для ссылок в письмах
+SITE_URL = 'http://localhost:8000'
+
+# Дайджест новых постов: период рассылки в секундах (окно первой
+# рассылки, следующие начинаются с конца предыдущей), размер пачки
+# подписчиков, число процессов рендеринга, писем на одну отправку и
+# постов в одном письме
+DIGEST_PERIOD = 60 * 60 * 24
+DIGEST_CHUNK_SIZE = 500
+DIGEST_WORKERS = 4
+DIGEST_BATCH_SIZE = 100
+DIGEST_MAX_POSTS = 20
+DIGEST_SUBJECT = 'Новые записи на Yatube'
+
+# Ограничение частоты запросов core.ratelimit: для области (имени URL)
+# сколько запросов допускается за период в секундах, отдельно для
+# пользователя и IP-адреса
+RATELIMITS = {
+    'posts:post_create': {'user': (10, 60 * 10), 'ip': (30, 60 * 10)},
+    'posts:add_comment': {'user': (20, 60), 'ip': (60, 60)},
+    'posts:profile_follow': {'user': (30, 60), 'ip': (100, 60)},
+    'posts:group_subscribe': {'user': (30, 60), 'ip': (100, 60)},
+    'users:signup': {'ip': (5, 60 * 60)},
+    'users:export': {'user': (5, 60 * 60)},
+}
+# Адреса прокси, которым можно верить в X-Forwarded-For, например
+# RATELIMIT_TRUSTED_PROXIES=127.0.0.1. Без них лимит по IP считается по
+# REMOTE_ADDR, и за прокси все клиенты делят один лимит
+RATELIMIT_TRUSTED_PROXIES = tuple(filter(None, os.environ.get(
+    'RATELIMIT_TRUSTED_PROXIES', '').split(',')))
+RATELIMIT_VIEW = 'core.views.too_many_requests'
+
+# Карты сайта и ленты Atom/RSS (posts.syndication): каталог готовых
+# файлов, адресов в одной части карты сайта и постов в ленте
+SYNDICATION_ROOT = os.path.join(BASE_DIR, 'published')
+SITEMAP_SHARD_SIZE = 50000
+FEED_SIZE = 50
+
+# Готовые страницы для анонимных посетителей (core.prerender): каталог
+# файлов, сколько страниц главной, групп и популярных постов готовить
+PRERENDER_ROOT = os.path.join(BASE_DIR, 'prerendered')
+PRERENDER_INDEX_PAGES = 3
+PRERENDER_GROUPS = 10
+PRERENDER_POSTS = 100
+
+# Шаблоны, которые отдаются потоком (core.streaming), например
+# {'posts/post_detail.html', 'posts/profile.html'}, и сколько элементов
+# длинного списка рендерится и отправляется за раз
+STREAMING_TEMPLATES = set()
+STREAM_CHUNK_SIZE = 50
+
+# Сжатие ответов (core.compression): минифицировать ли HTML, уровень
+# gzip/deflate для ответов на лету и для готовых страниц на диске,
+# минимальный размер ответа для сжатия и сколько сжатых кешируемых
+# ответов держать в памяти процесса. Замеры: manage.py bench_compression
+MINIFY_HTML = True
+COMPRESSION_LEVEL = 5
+PRERENDER_COMPRESSION_LEVEL = 9
+COMPRESSION_MIN_LENGTH = 200
+COMPRESSION_CACHE_SIZE = 256
+
+# Поиск N+1 (core.querycheck): 'off', 'log' — проверять долю
+# QUERYCHECK_SAMPLE_RATE запросов и писать в лог, 'strict' — падать.
+# Тесты запускаются в строгом режиме. Форма запроса, повторённая больше
+# QUERYCHECK_THRESHOLD раз за запрос, считается N+1
+QUERYCHECK_MODE = 'log'
+QUERYCHECK_SAMPLE_RATE = 0.01
+QUERYCHECK_THRESHOLD = 5
+QUERYCHECK_IGNORED_TABLES = ('thumbnail_kvstore',)
+# Виджеты админки достают подпись каждого связанного объекта отдельным
+# запросом, и повторы там не исправить своим кодом
+QUERYCHECK_IGNORED_PATHS = ('/admin/',)
+TEST_RUNNER = 'core.runner.QueryCheckRunner'
+
+# Шардирование постов и комментариев по автору (posts.sharding): базы,
+# по которым раскладываются посты, например
+# POST_SHARDS=default,shard_1,shard_2. Перед добавлением шарда выполните
+# migrate --database=<alias>
+POST_SHARDS = tuple(os.environ.get('POST_SHARDS', 'default').split(','))
+# Локальные базы объявляются только для шардов из POST_SHARDS
+DATABASES.update({
+    alias: {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(
+            BASE_DIR, 'db-{}.sqlite3'.format(alias.replace('_', '-'))),
+    }
+    for alias in POST_SHARDS if alias not in DATABASES
+})
+# Сколько id шард резервирует за одно обращение к своей последовательности
+SHARD_ID_BLOCK = 100
+
+# Архив (posts.archive): посты старше ARCHIVE_AFTER_DAYS дней переносятся
+# из горячей таблицы пачками по ARCHIVE_CHUNK_SIZE
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_CHUNK_SIZE = 500
+
+# Рекомендации авторов (posts.recommendations): сколько авторов хранить
+# для пользователя, по сколько авторов считать похожесть за раз и вес
+# общих комментаторов относительно общих подписчиков. Пересчёт:
+# manage.py update_recommendations
+RECOMMENDATIONS_TOP_K = 5
+RECOMMENDATIONS_CHUNK_SIZE = 1000
+RECOMMENDATIONS_COMMENT_WEIGHT = 0.5
+
+# Сколько символов начала поста показывают ленты (posts.text.excerpt)
+POST_EXCERPT_LENGTH = 300
+
+# Адаптивные картинки (core.images): ширины вариантов для srcset, их
+# пропорции и атрибут sizes — картинка занимает колонку до 960px
+IMAGE_WIDTHS = (320, 640, 960)
+IMAGE_GEOMETRY = '960x339'
+IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'
+
+# Загрузка файлов частями (core.uploads): куда складываются части, размер
+# файла и одной части, сколько байт читать из запроса за раз и через
+# сколько часов удаляются брошенные загрузки
+UPLOAD_TEMP_DIR = os.path.join(BASE_DIR, 'uploads')
+UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+UPLOAD_CHUNK_MAX_SIZE = 5 * 1024 * 1024
+UPLOAD_READ_SIZE = 64 * 1024
+UPLOAD_EXPIRE_HOURS = 24
+
+# Выгрузка данных пользователя (users.export): сколько записей читать
+# из базы за раз и каким куском копировать картинки в архив
+EXPORT_CHUNK_SIZE = 500
+EXPORT_READ_SIZE = 64 * 1024
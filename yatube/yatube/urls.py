@@ -24,6 +24,7 @@ urlpatterns = [
     path('auth/', include('django.contrib.auth.urls')),
     path('', include('posts.urls', namespace='posts')),
     path('about/', include('about.urls', namespace='about')),
+    path('uploads/', include('core.urls', namespace='core')),
 ]
 
 if settings.DEBUG:
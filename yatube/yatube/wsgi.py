@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# С gunicorn --preload вызывайте core.warmup.warm_up из хука post_fork,
+# чтобы рабочие процессы после fork не делили соединения с базой.
+if settings.WARMUP_ON_START:
+    from core.warmup import warm_up
+    warm_up(application)